@@ -1,4 +1,16 @@
+import math
+
+import numpy as np
+from PIL import Image, ImageTk
+
 import interpreter.imageFunctions as imageWrapper
+import interpreter.lexer as lexer
+from interpreter.dataStructures import lazyList
+
+# Width and height of the tiles the image is drawn in, in canvas pixels
+tileSize = 512
+# Width of the outline of the highlighted codel, in canvas pixels
+highlightWidth = 2
 
 
 class canvasManager():
@@ -8,6 +20,14 @@ class canvasManager():
         self.programState = programState
         self.previousProgramState = None
         self.scaleSize = scaleSize
+        # The tiles that are drawn, as (column, row) -> PhotoImage. Tk doesn't keep the images alive by itself
+        self.tiles = {}
+        # The outline of every codel of the graph that is shown, traced when the codel is first highlighted
+        self.graph = None
+        self.outlines = None
+        # The canvas items that outline the current codel, one per boundary (the outer one and one per hole). They are
+        # moved from codel to codel, and the items that aren't needed are hidden
+        self.highlights = []
 
 
     def updateImage(self, newImage):
@@ -21,6 +41,9 @@ class canvasManager():
     def updateProgramState(self, newProgramState):
         self.previousProgramState = self.programState
         self.programState = newProgramState
+        if newProgramState is not None and newProgramState.graph is not self.graph:
+            self.graph = newProgramState.graph
+            self.outlines = lazyList(len(self.graph.codels), lambda codelId: imageWrapper.getCodelOutline(self.graph.codels[codelId]))
 
 
     def pixelToHexString(self, pixel) -> str:
@@ -34,7 +57,7 @@ class canvasManager():
 
     def updateCanvas(self):
         """
-        Draws the canvas, then highlights the current codel. If a previous game state exists, it only reverses the highlight, instead of redrawing the entire canvas
+        Draws the canvas, then highlights the current codel. If a previous game state exists, it only moves the highlight, instead of redrawing the entire canvas
         :return:
         """
         if self.image is None or self.canvas is None or self.programState is None or self.scaleSize is None:
@@ -43,60 +66,100 @@ class canvasManager():
 
         if self.previousProgramState is None:
             self.drawImage()
-        else:
-            self.unHighlightCodel()
         self.highlightCodel()
         return True
 
 
     def drawImage(self):
         """
-        Draw the image pixel for pixel, upscaled to the scaleSize.
+        Removes everything from the canvas, and draws the image again at the current scaleSize. Only the tiles that are
+        visible are drawn, the others are drawn when they are scrolled into view (see drawVisibleTiles)
         :return:
         """
         self.clearCanvas()
-        for raw_y, row in enumerate(self.image):
-            for raw_x, pixel in enumerate(row):
-                x = raw_x * self.scaleSize
-                y = raw_y * self.scaleSize
-                color = self.pixelToHexString(pixel)
-                self.canvas.create_rectangle(x,y, x+self.scaleSize, y+self.scaleSize, fill=color, outline=color)
+        self.canvas.configure(scrollregion=(0, 0, self.image.shape[1] * self.scaleSize, self.image.shape[0] * self.scaleSize))
+        self.drawVisibleTiles()
 
 
-    def clearCanvas(self):
+    def getTilePixels(self) -> int:
         """
-        Draws a white rectangle over the canvas
-        :return:
+        :return: The width and height of a tile in pixels of the image
         """
-        width = len(self.image[0]) * self.scaleSize
-        height = len(self.image) * self.scaleSize
-        self.canvas.create_rectangle(0,0, width, height, fill="#FFFFFF")
+        return max(1, tileSize // self.scaleSize)
 
 
-    def highlightCodel(self):
+    def drawVisibleTiles(self):
+        """
+        Draws the tiles in the visible part of the canvas that haven't been drawn yet
+        :return:
+        """
+        if self.image is None or self.scaleSize is None:
+            return
+        # Before the canvas is shown, its size is only known from its configuration
+        width = self.canvas.winfo_width() if self.canvas.winfo_width() > 1 else int(self.canvas.cget("width"))
+        height = self.canvas.winfo_height() if self.canvas.winfo_height() > 1 else int(self.canvas.cget("height"))
+        tileWidth = self.getTilePixels() * self.scaleSize
+
+        columns = math.ceil(self.image.shape[1] / self.getTilePixels())
+        rows = math.ceil(self.image.shape[0] / self.getTilePixels())
+        firstColumn = max(0, int(self.canvas.canvasx(0)) // tileWidth)
+        firstRow = max(0, int(self.canvas.canvasy(0)) // tileWidth)
+        lastColumn = min(columns - 1, int(self.canvas.canvasx(width)) // tileWidth)
+        lastRow = min(rows - 1, int(self.canvas.canvasy(height)) // tileWidth)
+        for row in range(firstRow, lastRow + 1):
+            for column in range(firstColumn, lastColumn + 1):
+                if (column, row) not in self.tiles:
+                    self.drawTile(column, row)
+
+
+    def drawTile(self, column: int, row: int):
         """
-        Outlines the current codel with complemented colors
+        Draws a tile of the image as a single bitmap, upscaled to the scaleSize
+        :param column: Column of the tile
+        :param row: Row of the tile
         :return:
         """
-        codel = imageWrapper.getCodel(self.image, self.programState.position)
-        pixel = imageWrapper.getPixel(self.image, self.programState.position)
-        color = self.pixelToHexString(pixel)
-        outline = self.pixelToHexString(self.complement(int(pixel[0]), int(pixel[1]), int(pixel[2])))
-        self.colorCodel(codel, color, outline)
+        tilePixels = self.getTilePixels()
+        pixels = np.ascontiguousarray(self.image[row * tilePixels:(row + 1) * tilePixels, column * tilePixels:(column + 1) * tilePixels, :3], dtype=np.uint8)
+        tile = Image.fromarray(pixels).resize((pixels.shape[1] * self.scaleSize, pixels.shape[0] * self.scaleSize), Image.NEAREST)
+        self.tiles[(column, row)] = ImageTk.PhotoImage(tile)
+        tileItem = self.canvas.create_image(column * tilePixels * self.scaleSize, row * tilePixels * self.scaleSize, image=self.tiles[(column, row)], anchor="nw", tags="tile")
+        # Tiles go below the highlighted codel
+        self.canvas.tag_lower(tileItem)
 
 
-    def unHighlightCodel(self):
-        codel = imageWrapper.getCodel(self.image, self.previousProgramState.position)
-        pixel = imageWrapper.getPixel(self.image, self.previousProgramState.position)
-        color = self.pixelToHexString(pixel)
-        self.colorCodel(codel, color, color)
+    def clearCanvas(self):
+        """
+        Removes all tiles and highlights from the canvas
+        :return:
+        """
+        self.canvas.delete("all")
+        self.tiles = {}
+        self.highlights = []
 
 
-    def colorCodel(self, codel, fill, outline):
-        for position in codel.codel:
-            x = position.coords[0] * self.scaleSize
-            y = position.coords[1] * self.scaleSize
-            self.canvas.create_rectangle(x,y, x+self.scaleSize - 1, y+self.scaleSize - 1, fill=fill, outline=outline)
+    def highlightCodel(self):
+        """
+        Outlines the current codel with the complement of its color, drawing every boundary as a closed line. The same
+        canvas items are reshaped for every codel, so highlighting costs the same however long the program runs
+        :return:
+        """
+        codelId = lexer.getCodelId(self.programState.graph, self.programState.position)
+        loops = self.outlines[codelId] if codelId != -1 else []
+
+        if len(loops) > 0:
+            pixel = imageWrapper.getPixel(self.image, self.programState.position)
+            color = self.pixelToHexString(self.complement(int(pixel[0]), int(pixel[1]), int(pixel[2])))
+        for index, loop in enumerate(loops):
+            coords = [coordinate * self.scaleSize for corner in loop for coordinate in corner]
+            if index == len(self.highlights):
+                self.highlights.append(self.canvas.create_line(*coords, fill=color, width=highlightWidth, capstyle="projecting", tags="highlight"))
+            else:
+                self.canvas.coords(self.highlights[index], *coords)
+                self.canvas.itemconfigure(self.highlights[index], fill=color, state="normal")
+        for highlight in self.highlights[len(loops):]:
+            self.canvas.itemconfigure(highlight, state="hidden")
+        self.canvas.tag_raise("highlight")
 
 
     def hilo(self, a, b, c):
@@ -1,5 +1,4 @@
-import interpreter.imageFunctions as imageWrapper
-import interpreter.colors as colors
+import interpreter.lexer as lexer
 import interpreter.tokens as lexerTokens
 import interpreter.movementFunctions as movement
 from interpreter.dataStructures import direction
@@ -25,14 +24,13 @@ class infoManager():
     def updateEdgesInfo(self, image, inputGraph, programState):
         edgesInfo = self.builder.get_object('codelEdgesMessage', self.generalInfo)
 
-        if colors.isBlack(imageWrapper.getPixel(image, programState.position)):
+        if lexer.getCodelId(inputGraph, programState.position) == -1:
             edgesInfo.configure(text = "Black pixels are no codel, and have no edges")
             return None
 
-        codel = imageWrapper.getCodel(image, programState.position)
         baseString = "Next step will be:\n"
 
-        graphNode = inputGraph.graph[codel]
+        graphNode = lexer.getGraphNode(inputGraph, programState.position)
 
         edge = graphNode.graphNode[programState.direction]
         baseString += self.getEdgeDescription(edge, programState.direction)
@@ -2,7 +2,8 @@ import pygubu
 import os
 
 from interpreter import imageFunctions as imageWrapper
-from interpreter import lexer as lexer
+from interpreter import colors as colors
+from interpreter import cacheFunctions as cache
 from interpreter import executeFunctions as main
 from interpreter.dataStructures import programState, direction, position
 
@@ -20,6 +21,9 @@ class GUI:
         # In seconds
         self.maxWait = 5
 
+        # In pixels per codel, or None to detect it from the image
+        self.codelSize = None
+
         self.image = None
         self.graph = None
         self.programState = None
@@ -58,10 +62,21 @@ class GUI:
 
         horizontalBar = self.builder.get_object("canvasHorizontalScroll", self.canvasFrame)
         verticalBar = self.builder.get_object("canvasVerticalScroll", self.canvasFrame)
-        horizontalBar.config(command = self.canvas.xview)
-        verticalBar.config(command = self.canvas.yview)
+        horizontalBar.config(command = self.scrollHorizontal)
+        verticalBar.config(command = self.scrollVertical)
         self.canvas.config(xscrollcommand=horizontalBar.set, yscrollcommand=verticalBar.set)
-        self.canvas.configure(scrollregion=self.canvas.bbox("all"))
+        # Tiles of the image are drawn when they come into view
+        self.canvas.bind("<Configure>", lambda event: self.canvasManager.drawVisibleTiles())
+
+
+    def scrollHorizontal(self, *args):
+        self.canvas.xview(*args)
+        self.canvasManager.drawVisibleTiles()
+
+
+    def scrollVertical(self, *args):
+        self.canvas.yview(*args)
+        self.canvasManager.drawVisibleTiles()
 
 
     def initializeFrames(self):
@@ -80,7 +95,6 @@ class GUI:
         self.canvasManager.updateImage(self.image)
         self.canvasManager.updateProgramState(self.programState)
         self.canvasManager.updateCanvas()
-        self.canvas.configure(scrollregion=self.canvas.bbox("all"))
 
 
     def takeStep(self):
@@ -113,11 +127,11 @@ class GUI:
     def setScale(self):
         scaleValue = int(self.builder.get_object('scaleEntry', self.optionBar).get())
         if 0 < scaleValue < 100:
-            self.canvasManager.clearCanvas()
             self.scaleSize = int(scaleValue)
+            # Without a previous state, the canvas manager draws the image again at the new scale
+            self.canvasManager.previousProgramState = None
+            self.canvasManager.programState = None
             self.update()
-            self.canvasManager.drawImage()
-            self.canvasManager.updateCanvas()
 
 
     def loadFile(self):
@@ -125,19 +139,20 @@ class GUI:
         if len(fileName) < 1:
             return None
         try:
-            tmpImage = imageWrapper.getImage(fileName)
+            tmpImage = imageWrapper.downsampleImage(imageWrapper.getImage(fileName), self.codelSize)
         except FileNotFoundError:
             edgeInfo = self.infoManager.builder.get_object('codelEdgesMessage', self.infoManager.generalInfo)
             edgeInfo.configure(text="The file '{}' could not be found".format(fileName))
             return False
 
-        tmpResult = lexer.graphImage(tmpImage)
-        if len(tmpResult[1]) != 0:
+        tmpResult = cache.getCompiledProgram(tmpImage)
+        if isinstance(tmpResult, list):
             edgeInfo = self.infoManager.builder.get_object('codelEdgesMessage', self.infoManager.generalInfo)
-            edgeInfo.configure(text="The following exceptions occured while making the graph:\n{}".format("".join(list(map(lambda x: "\t{}\n".format(x), tmpResult[1])))))
+            edgeInfo.configure(text="The following exceptions occured while making the graph:\n{}".format("".join(list(map(lambda x: "\t{}\n".format(x), tmpResult)))))
             return False
 
-        self.image = tmpImage
+        # Color index arrays are shown in the colors they stand for
+        self.image = colors.getRGBImage(tmpImage)
         self.graph = tmpResult[0]
         self.programState = programState(self.graph, position((0,0)), direction((0,0)))
         # Reset previous state
@@ -0,0 +1,21 @@
+import argparse
+
+from interpreter import batchFunctions as batch
+
+parser = argparse.ArgumentParser(description='Runs a directory or manifest of piet images in parallel')
+parser.add_argument("source", type=str, help="directory of images, or a manifest file with one image path per line")
+parser.add_argument("-o", "--output", type=str, default="report.json", help="Report file, written as CSV if it ends with .csv and as JSON otherwise")
+parser.add_argument("-s", "--max-steps", type=int, help="Maximum number of steps per image")
+parser.add_argument("-t", "--time-limit", type=float, help="Maximum running time per image in seconds")
+parser.add_argument("-w", "--workers", type=int, help="Number of processes. Defaults to the number of cores")
+parser.add_argument("-c", "--codel-size", type=int, help="Size of a codel in pixels. Detected from each image if not given")
+parser.add_argument("--no-cache", action="store_true", help="Always lexes the images, instead of using the compile cache")
+parser.add_argument("-d", "--detect-cycles", action="store_true", help="Stops images that repeat a state, as they would never terminate")
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    results = batch.runBatch(batch.getImagePaths(args.source), args.max_steps, args.time_limit, args.codel_size, not args.no_cache, args.workers, args.detect_cycles)
+    batch.writeReport(results, args.output)
+
+    for result in results:
+        print("{}: {}, {} steps, lexed in {:.3f}s, ran in {:.3f}s".format(result["file"], result["status"], result["steps"], result["lexTime"], result["runTime"]))
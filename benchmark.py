@@ -0,0 +1,25 @@
+import argparse
+import sys
+
+from benchmarks import benchmarkFunctions as benchmark
+
+parser = argparse.ArgumentParser(description='Measures the interpreter on generated piet images')
+parser.add_argument("-w", "--workloads", nargs="+", choices=list(benchmark.workloads), default=list(benchmark.workloads), help="Workloads to run. Runs all workloads by default")
+parser.add_argument("-s", "--sizes", type=int, nargs="+", help="Sizes to run every workload at, instead of the default sizes of each workload")
+parser.add_argument("-m", "--max-steps", type=int, default=200000, help="Maximum number of steps to run each workload")
+parser.add_argument("-o", "--output", type=str, default="benchmark.json", help="JSON file to write the results to")
+parser.add_argument("-c", "--compare", type=str, help="JSON file with earlier results, to compare the results with")
+parser.add_argument("--check-guards", action="store_true", help="Fails if large images take longer to label than benchmarkFunctions.maxLabelTimePerPixel seconds per pixel. The limit depends on the machine, so it is off by default")
+parser.add_argument("--no-memory", action="store_true", help="Skips measuring the peak memory use, which runs every workload a second time")
+
+if __name__ == "__main__":
+    args = parser.parse_args()
+    results = benchmark.runBenchmarks(args.workloads, args.sizes, args.max_steps, not args.no_memory)
+    benchmark.writeResults(results, args.output)
+    print(benchmark.formatResults(results, benchmark.readResults(args.compare) if args.compare is not None else None))
+    if args.check_guards:
+        failures = benchmark.checkGuards(results)
+        for failure in failures:
+            print(failure)
+        if len(failures) > 0:
+            sys.exit(1)
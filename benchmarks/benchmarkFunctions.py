@@ -0,0 +1,193 @@
+import io
+import json
+import platform
+import subprocess
+import time
+import tracemalloc
+from typing import List, Dict, Callable, Union
+
+import numpy as np
+
+from benchmarks import generatorFunctions as generators
+from interpreter import colors as colors
+from interpreter import imageFunctions as imageWrapper
+from interpreter import lexer as lexer
+from interpreter import compiler as compiler
+from interpreter import optimizer as optimizer
+from interpreter import engine as engine
+from interpreter.streams import ioStreams
+
+# Generator of every workload, taking the size of the workload
+workloads: Dict[str, Callable[[int], np.ndarray]] = {
+    "blocks": generators.makeBlocks,
+    "lanes": generators.makeLanes,
+    "checkerboard": generators.makeCheckerboard,
+    "stripes": generators.makeStripes,
+    "roll": generators.makeRollLoop,
+    "counting": generators.makeCountingLoop,
+}
+
+# The sizes every workload is run at by default: the width and height of the image, the depth of the rolls, or the
+# length of the loop
+defaultSizes = {
+    "blocks": [128, 512, 1024],
+    "lanes": [64, 128, 256],
+    "checkerboard": [32, 64, 128],
+    "stripes": [256, 1024, 2048],
+    "roll": [10, 100, 1000],
+    "counting": [16, 64, 256],
+}
+
+# Labeling has to stay linear in the number of pixels, so with --check-guards, images of at least guardPixels pixels
+# fail the benchmark if labeling takes longer than maxLabelTimePerPixel seconds per pixel
+guardPixels = 1024 * 1024
+maxLabelTimePerPixel = 2.5e-7
+
+
+def getCommit() -> Union[str, None]:
+    """
+    Finds the commit the interpreter is at, so results can be told apart
+    :return: The hash of the commit, or None if it can't be found
+    """
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def runWorkload(image: np.ndarray, maxSteps: int) -> Dict:
+    """
+    Lexes, compiles and runs an image once, timing each part
+    :param image: Input image
+    :param maxSteps: Maximum number of steps to run
+    :return: A dictionary with the number of codels, lexTime, compileTime, steps and runTime
+    """
+    startTime = time.perf_counter()
+    newGraph = lexer.graphImage(image)
+    lexTime = time.perf_counter() - startTime
+    if len(newGraph[1]) > 0:
+        raise ValueError("Generated image could not be lexed: {}".format(newGraph[1][0]))
+
+    startTime = time.perf_counter()
+    program = compiler.compileGraph(newGraph[0])
+    program.blocks = optimizer.optimizeProgram(program)
+    compileTime = time.perf_counter() - startTime
+
+    state = engine.initialState(program)
+    startTime = time.perf_counter()
+    result = engine.runProgram(program, state, maxSteps, ioStreams("", io.StringIO(), False))
+    runTime = time.perf_counter() - startTime
+    if isinstance(result, BaseException):
+        raise ValueError("Generated image stopped with an error: {}".format(result))
+    return {"codels": len(newGraph[0].nodes), "lexTime": lexTime, "compileTime": compileTime, "steps": state.steps, "runTime": runTime}
+
+
+def measureWorkload(name: str, size: int, maxSteps: int, measureMemory: bool = True) -> Dict:
+    """
+    Generates a workload and measures it. Memory is measured in a second run, as tracing allocations slows it down.
+    :param name: Name of the workload, see workloads
+    :param size: Size of the workload
+    :param maxSteps: Maximum number of steps to run
+    :param measureMemory: Whether to measure the peak memory use
+    :return: A dictionary with the workload, size, image shape, the fields of runWorkload, labelTime (the part of
+    the lexing spent in imageFunctions.labelImage, measured separately), stepsPerSecond and peakMemory (in bytes, or
+    None if it wasn't measured)
+    """
+    image = workloads[name](size)
+    result = {"workload": name, "size": size, "width": image.shape[1], "height": image.shape[0]}
+    result.update(runWorkload(image, maxSteps))
+    colorMap = colors.classifyImage(image)
+    startTime = time.perf_counter()
+    imageWrapper.labelImage(colorMap, colors.BLACK)
+    result["labelTime"] = time.perf_counter() - startTime
+    result["stepsPerSecond"] = result["steps"] / result["runTime"] if result["runTime"] > 0 else None
+
+    result["peakMemory"] = None
+    if measureMemory:
+        tracemalloc.start()
+        try:
+            runWorkload(image, maxSteps)
+            result["peakMemory"] = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return result
+
+
+def runBenchmarks(names: List[str], sizes: List[int] = None, maxSteps: int = 200000, measureMemory: bool = True) -> Dict:
+    """
+    Measures every workload at every size
+    :param names: Names of the workloads
+    :param sizes: Sizes to run every workload at, or None to use the defaultSizes of each workload
+    :param maxSteps: Maximum number of steps to run each workload
+    :param measureMemory: Whether to measure the peak memory use
+    :return: A dictionary with the commit, python version, date and the results of measureWorkload
+    """
+    results = []
+    for name in names:
+        for size in (defaultSizes[name] if sizes is None else sizes):
+            results.append(measureWorkload(name, size, maxSteps, measureMemory))
+    return {"commit": getCommit(), "python": platform.python_version(), "numpy": np.__version__,
+            "date": time.strftime("%Y-%m-%dT%H:%M:%S"), "maxSteps": maxSteps, "results": results}
+
+
+def checkGuards(benchmark: Dict) -> List[str]:
+    """
+    Checks that large images were labeled within maxLabelTimePerPixel seconds per pixel
+    :param benchmark: Results of runBenchmarks
+    :return: A message for every result that failed the check
+    """
+    failures = []
+    for result in benchmark["results"]:
+        pixels = result["width"] * result["height"]
+        if pixels >= guardPixels and result.get("labelTime", 0) > maxLabelTimePerPixel * pixels:
+            failures.append("{} {}: labeling {} pixels took {:.3f}s, more than the {:.3f}s allowed".format(
+                result["workload"], result["size"], pixels, result["labelTime"], maxLabelTimePerPixel * pixels))
+    return failures
+
+
+def writeResults(benchmark: Dict, fileName: str):
+    """
+    Writes the results of runBenchmarks to a JSON file
+    :param benchmark: Results of runBenchmarks
+    :param fileName: Path of the file
+    """
+    with open(fileName, "w") as resultFile:
+        json.dump(benchmark, resultFile, indent=4)
+
+
+def readResults(fileName: str) -> Dict:
+    """
+    Reads results written by writeResults
+    :param fileName: Path of the file
+    :return: Results of runBenchmarks
+    """
+    with open(fileName) as resultFile:
+        return json.load(resultFile)
+
+
+def formatResults(benchmark: Dict, baseline: Dict = None) -> str:
+    """
+    Formats results as a table. If a baseline is given, every measurement is followed by its ratio to the same
+    workload and size in the baseline
+    :param benchmark: Results of runBenchmarks
+    :param baseline: Earlier results of runBenchmarks, or None
+    :return: The table
+    """
+    fields = ["lexTime", "labelTime", "compileTime", "stepsPerSecond", "peakMemory"]
+    baselineResults = {} if baseline is None else {(result["workload"], result["size"]): result for result in baseline["results"]}
+
+    lines = ["{:<14} {:>6} {:>8} {:>18} {:>18} {:>18} {:>18} {:>18}".format("Workload", "Size", "Codels", *fields)]
+    for result in benchmark["results"]:
+        previous = baselineResults.get((result["workload"], result["size"]))
+        columns = []
+        for field in fields:
+            value = result.get(field)
+            if value is None:
+                text = "-"
+            else:
+                text = "{:.0f}".format(value) if field == "stepsPerSecond" else ("{:.4f}".format(value) if isinstance(value, float) else str(value))
+            if previous is not None and value is not None and previous.get(field):
+                text += " ({:.2f}x)".format(value / previous[field])
+            columns.append(text)
+        lines.append("{:<14} {:>6} {:>8} {:>18} {:>18} {:>18} {:>18} {:>18}".format(result["workload"], result["size"], result["codels"], *columns))
+    return "\n".join(lines)
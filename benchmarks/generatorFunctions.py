@@ -0,0 +1,177 @@
+from collections import deque
+from typing import List, Dict, Tuple
+
+import numpy as np
+
+from interpreter import colors as colors
+from interpreter.compiler import PUSH, POP, ADD, SUBTRACT, MULTIPLY, NOT, GREATER, DUPLICATE, ROLL
+
+# RGB values of color indices 0-17, white and black (see colors.classifyImage)
+palette = np.array(colors.possiblePixels().colors + [colors.possiblePixels().white, colors.possiblePixels().black], dtype=np.uint8)
+
+# Commands that only use values pushed by the same sequence, as (opcode, values needed on the stack, change in height).
+# Pointer, input, output, division and modulo are left out, so sequences of these never leave the ring or fail
+neutralCommands = [(PUSH, 0, 1), (POP, 1, -1), (ADD, 2, -1), (SUBTRACT, 2, -1), (MULTIPLY, 2, -1), (NOT, 1, 0),
+                   (GREATER, 2, -1), (DUPLICATE, 1, 1)]
+
+
+def getNextColor(colorIndex: int, opcode: int) -> int:
+    """
+    Finds the color that executes an opcode when moving to it from another color
+    :param colorIndex: Index of the current color (0-17)
+    :param opcode: Opcode (0-17), which is hueChange * 3 + lightChange
+    :return: Index of the next color
+    """
+    return ((colorIndex // 3 + opcode // 3) % 6) * 3 + (colorIndex % 3 + opcode % 3) % 3
+
+
+def getColorChange(opcodes: List[int]) -> Tuple[int, int]:
+    """
+    Sums the hue and lightness changes of a sequence of opcodes
+    :param opcodes: Opcodes (0-17)
+    :return: Tuple of the hue change (modulo 6) and the lightness change (modulo 3)
+    """
+    return sum(map(lambda opcode: opcode // 3, opcodes)) % 6, sum(map(lambda opcode: opcode % 3, opcodes)) % 3
+
+
+def findNeutralSequences() -> Dict[Tuple[int, int, int], List[int]]:
+    """
+    Finds the shortest sequences of neutral commands that leave the stack as it was, for every color change and
+    parity of the length, with a breadth first search over the color change, the parity and the stack height
+    :return: A dictionary from (hue change, lightness change, length % 2) to a list of opcodes
+    """
+    sequences = {(0, 0, 0, 0): []}
+    worklist = deque([(0, 0, 0, 0)])
+    while len(worklist) > 0:
+        hueChange, lightChange, parity, height = worklist.popleft()
+        sequence = sequences[(hueChange, lightChange, parity, height)]
+        # Sequences are only needed up to a handful of commands, so the stack never has to grow high
+        if height >= 3:
+            continue
+        for opcode, needed, heightChange in neutralCommands:
+            if height < needed:
+                continue
+            state = ((hueChange + opcode // 3) % 6, (lightChange + opcode % 3) % 3, 1 - parity, height + heightChange)
+            if state not in sequences:
+                sequences[state] = sequence + [opcode]
+                worklist.append(state)
+    return {key[:3]: sequence for key, sequence in sequences.items() if key[3] == 0}
+
+
+neutralSequences = findNeutralSequences()
+
+
+def getNumberCommands(number: int) -> List[int]:
+    """
+    Makes a sequence of opcodes that pushes a positive number, when every push pushes 1 (so from codels of one pixel).
+    The number is built from its binary digits by doubling and adding one.
+    :param number: Number to push, at least 1
+    :return: List of opcodes
+    """
+    opcodes = [PUSH]
+    for digit in bin(number)[3:]:
+        opcodes.extend([DUPLICATE, ADD])
+        if digit == "1":
+            opcodes.extend([PUSH, ADD])
+    return opcodes
+
+
+def getRingPositions(width: int) -> List[Tuple[int, int]]:
+    """
+    Lists the pixels of a ring in an image of three rows: right along the top row, down the right column, left along
+    the bottom row and up the left column. The program travels around the ring clockwise, turning at every corner by
+    bumping into the edge of the image.
+    :param width: Width of the image, at least 3
+    :return: List of (x, y) positions, starting at the top left pixel
+    """
+    return list(map(lambda x: (x, 0), range(width))) + [(width - 1, 1)] + \
+        list(map(lambda x: (x, 2), reversed(range(width)))) + [(0, 1)]
+
+
+def makeRing(opcodes: List[int], width: int = None) -> np.ndarray:
+    """
+    Makes an image of a loop that executes the opcodes forever. Every codel is a single pixel, so every push pushes 1.
+    The ring is filled up with commands that leave the stack as it was, so the colors match up again at the start.
+    :param opcodes: Opcodes that are executed every time around the ring, which must not change the direction pointer
+    :param width: Width of the image, made larger if the opcodes don't fit
+    :return: RGB image
+    """
+    hueChange, lightChange = getColorChange(opcodes)
+    # Every ring has an even number of pixels
+    filler = neutralSequences[((6 - hueChange) % 6, (3 - lightChange) % 3, len(opcodes) % 2)]
+    commands = opcodes + filler
+    width = max(3, (len(commands) - 1) // 2, 0 if width is None else width)
+    # Pushing and popping again leaves the stack and the color as they were
+    commands += [PUSH, POP] * ((2 * width + 2 - len(commands)) // 2)
+
+    indices = np.full((3, width), colors.BLACK, dtype=np.uint8)
+    colorIndex = 0
+    for (x, y), opcode in zip(getRingPositions(width), commands):
+        indices[y, x] = colorIndex
+        colorIndex = getNextColor(colorIndex, opcode)
+    return palette[indices]
+
+
+def makeBlocks(size: int, blockSize: int = 16) -> np.ndarray:
+    """
+    Makes a square image of large single colored blocks, which takes the lexer many pixels but few codels
+    :param size: Width and height of the image
+    :param blockSize: Width and height of a block
+    :return: RGB image
+    """
+    rows, columns = np.indices((size, size)) // blockSize
+    # Neighbouring blocks differ one step in lightness, so moving between them pushes or pops
+    return palette[(rows + columns) % 3]
+
+
+def makeLanes(size: int, laneWidth: int = 8) -> np.ndarray:
+    """
+    Makes a square image of single pixel codels, separated by lanes of white that the program has to slide through
+    :param size: Width and height of the image
+    :param laneWidth: Width of the white lanes
+    :return: RGB image
+    """
+    rows, columns = np.indices((size, size))
+    indices = np.where((rows % (laneWidth + 1) == 0) & (columns % (laneWidth + 1) == 0), (rows + columns) % 3, colors.WHITE)
+    return palette[indices]
+
+
+def makeCheckerboard(size: int) -> np.ndarray:
+    """
+    Makes a square checkerboard of two colors, so that every pixel is a codel of its own
+    :param size: Width and height of the image
+    :return: RGB image
+    """
+    rows, columns = np.indices((size, size))
+    return palette[(rows + columns) % 2]
+
+
+def makeStripes(size: int) -> np.ndarray:
+    """
+    Makes a square image of single pixel wide vertical stripes of two colors, so that every column is a codel of its
+    own, reaching from the top to the bottom of the image
+    :param size: Width and height of the image
+    :return: RGB image
+    """
+    columns = np.indices((size, size))[1]
+    return palette[columns % 2]
+
+
+def makeRollLoop(depth: int, rolls: int = 3) -> np.ndarray:
+    """
+    Makes a loop that pushes a value and rolls the stack to a fixed depth, every time around. Rolls are ignored until
+    the stack is deep enough, after which every roll moves depth values.
+    :param depth: Depth of the rolls
+    :param rolls: Number of rolls
+    :return: RGB image
+    """
+    return makeRing([PUSH] + getNumberCommands(depth) + getNumberCommands(rolls) + [ROLL])
+
+
+def makeCountingLoop(length: int) -> np.ndarray:
+    """
+    Makes a loop that adds one to a counter over and over, around a ring of about the given number of codels
+    :param length: Number of codels in the ring
+    :return: RGB image
+    """
+    return makeRing([PUSH, ADD] * max(1, length // 2))
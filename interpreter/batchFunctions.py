@@ -0,0 +1,171 @@
+import contextlib
+import csv
+import io
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Dict, Union
+
+from interpreter import imageFunctions as imageWrapper
+from interpreter import cacheFunctions as cache
+from interpreter import optimizer as optimizer
+from interpreter import engine as engine
+from interpreter.streams import ioStreams
+from interpreter.cycleFunctions import cycleDetector
+
+imageExtensions = (".png", ".gif", ".bmp", ".ppm", ".pgm", ".pnm", ".npy", ".jpg", ".jpeg")
+
+# Steps taken between two checks of the time limit
+stepsPerCheck = 100000
+
+reportFields = ["file", "status", "steps", "lexTime", "runTime", "cycleLength", "cycleEntry", "error", "stdout"]
+
+
+def getImagePaths(source: str) -> List[str]:
+    """
+    Finds the images to run. The source is either a directory, of which all images are used, or a manifest file with
+    one path per line (relative to the manifest). Empty lines and lines starting with # are skipped in manifests.
+    :param source: Path to a directory or a manifest
+    :return: A list of paths to images
+    """
+    if os.path.isdir(source):
+        return sorted(map(lambda name: os.path.join(source, name),
+                          filter(lambda name: name.lower().endswith(imageExtensions), os.listdir(source))))
+
+    with open(source) as manifest:
+        lines = list(filter(lambda line: len(line) > 0 and not line.startswith("#"), map(str.strip, manifest)))
+    return list(map(lambda line: os.path.join(os.path.dirname(source), line), lines))
+
+
+def runImage(fileName: str, maxSteps: Union[int, None], timeLimit: Union[float, None], codelSize: Union[int, None] = None, useCache: bool = True, detectCycles: bool = False) -> Dict:
+    """
+    Runs a single image, capturing its output. The input of the program is read from the file with the name of the
+    image and the extension .in, if there is one. The time limit is checked every stepsPerCheck steps, so it doesn't
+    include the time to lex the image.
+    :param fileName: Path to the image
+    :param maxSteps: Maximum number of steps to take, or None
+    :param timeLimit: Maximum running time in seconds, or None
+    :param codelSize: Size of a codel in pixels, or None to detect it
+    :param useCache: Whether to use the compile cache
+    :param detectCycles: Whether to stop programs that repeat a state, as they would never terminate
+    :return: A dictionary with the fields of reportFields. The status is one of terminated, stepLimit, timeLimit,
+    cycle, lexError, runtimeError or crash. The cycle fields are only filled in for the cycle status
+    """
+    result = {"file": fileName, "status": "crash", "steps": 0, "lexTime": 0.0, "runTime": 0.0, "cycleLength": None,
+              "cycleEntry": None, "error": "", "stdout": ""}
+    if not useCache:
+        cache.cacheDirectory = None
+
+    output = io.StringIO()
+    startTime = time.perf_counter()
+    try:
+        with contextlib.redirect_stdout(output):
+            image = imageWrapper.downsampleImage(imageWrapper.getImage(fileName), codelSize)
+            compiled = cache.getCompiledProgram(image)
+            result["lexTime"] = time.perf_counter() - startTime
+            if isinstance(compiled, list):
+                result["status"] = "lexError"
+                result["error"] = "; ".join(map(str, compiled))
+                return result
+
+            program = compiled[1]
+            program.blocks = optimizer.optimizeProgram(program)
+            result["lexTime"] = time.perf_counter() - startTime
+
+            inputName = os.path.splitext(fileName)[0] + ".in"
+            inputData = b""
+            if os.path.isfile(inputName):
+                with open(inputName, "rb") as inputFile:
+                    inputData = inputFile.read()
+            streams = ioStreams(inputData, output)
+
+            startTime = time.perf_counter()
+            state = engine.initialState(program)
+            if isinstance(state, BaseException):
+                result["status"] = "runtimeError"
+                result["error"] = str(state)
+                return result
+
+            cycles = cycleDetector() if detectCycles else None
+            while not state.terminated:
+                if maxSteps is not None and state.steps >= maxSteps:
+                    result["status"] = "stepLimit"
+                    break
+                if timeLimit is not None and time.perf_counter() - startTime >= timeLimit:
+                    result["status"] = "timeLimit"
+                    break
+                chunk = stepsPerCheck if maxSteps is None else min(stepsPerCheck, maxSteps - state.steps)
+                newState = engine.runProgram(program, state, chunk, streams, cycles=cycles)
+                if isinstance(newState, BaseException):
+                    result["status"] = "runtimeError"
+                    result["error"] = str(newState)
+                    break
+                if state.cycleLength is not None:
+                    result["status"] = "cycle"
+                    result["cycleLength"] = state.cycleLength
+                    result["cycleEntry"] = state.cycleEntry
+                    break
+            else:
+                result["status"] = "terminated"
+            result["steps"] = state.steps
+            result["runTime"] = time.perf_counter() - startTime
+    except Exception as exception:
+        # Anything else (like an unreadable file) is reported, instead of stopping the batch
+        result["error"] = "{}: {}".format(type(exception).__name__, exception)
+    finally:
+        result["stdout"] = output.getvalue()
+    return result
+
+
+def runBatch(fileNames: List[str], maxSteps: Union[int, None], timeLimit: Union[float, None], codelSize: Union[int, None] = None, useCache: bool = True, workers: int = None, detectCycles: bool = False) -> List[Dict]:
+    """
+    Runs images in parallel over a pool of processes
+    :param fileNames: Paths to the images
+    :param maxSteps: Maximum number of steps per image, or None
+    :param timeLimit: Maximum running time per image in seconds, or None
+    :param codelSize: Size of a codel in pixels, or None to detect it
+    :param useCache: Whether to use the compile cache
+    :param workers: Number of processes, or None to use one per core
+    :param detectCycles: Whether to stop programs that repeat a state, as they would never terminate
+    :return: The results of runImage, in the same order as the images
+    """
+    arguments = (maxSteps, timeLimit, codelSize, useCache, detectCycles)
+    results = [None] * len(fileNames)
+    # A worker that dies (killed for running out of memory, or a crash in native code) breaks the whole pool, which
+    # fails the futures of every image that hadn't finished yet
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = list(map(lambda fileName: executor.submit(runImage, fileName, *arguments), fileNames))
+        for index, future in enumerate(futures):
+            try:
+                results[index] = future.result()
+            except Exception:
+                pass
+
+    # Images that didn't finish are run again, each in a pool of its own, so only the image that kills its worker
+    # gets the crash status
+    for index, fileName in enumerate(fileNames):
+        if results[index] is None:
+            with ProcessPoolExecutor(max_workers=1) as executor:
+                try:
+                    results[index] = executor.submit(runImage, fileName, *arguments).result()
+                except Exception as exception:
+                    results[index] = {"file": fileName, "status": "crash", "steps": 0, "lexTime": 0.0, "runTime": 0.0,
+                                      "cycleLength": None, "cycleEntry": None, "stdout": "",
+                                      "error": "{}: {}".format(type(exception).__name__, exception)}
+    return results
+
+
+def writeReport(results: List[Dict], fileName: str):
+    """
+    Writes the results of a batch to a CSV file if the filename ends with .csv, and to a JSON file otherwise
+    :param results: Results of runBatch
+    :param fileName: Path of the report
+    """
+    with open(fileName, "w", newline="") as reportFile:
+        if fileName.lower().endswith(".csv"):
+            writer = csv.DictWriter(reportFile, fieldnames=reportFields)
+            writer.writeheader()
+            writer.writerows(results)
+        else:
+            json.dump(results, reportFile, indent=4)
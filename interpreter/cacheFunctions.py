@@ -0,0 +1,145 @@
+import hashlib
+import os
+import zipfile
+from typing import List, Tuple, Union
+
+import numpy as np
+
+from interpreter import colors as colors
+from interpreter import lexer as lexer
+from interpreter import compiler as compiler
+from interpreter import helperFunctions as helperFunctions
+from interpreter import imageFunctions as imageWrapper
+from interpreter import movementFunctions as movement
+from interpreter import tokens as tokens
+from interpreter import dataStructures as dataStructures
+from interpreter.dataStructures import compiledProgram, graph
+
+# Version of the archives written by saveProgram. Bump this whenever saveProgram and loadProgram store different
+# arrays, or store them differently. Changes to the lexer or the compiler don't need a bump, see tableModules
+formatVersion = "2"
+
+# Modules whose code decides the tables of a compiled program. Their source is part of the interpreter version, so
+# programs compiled by any other version of these modules are never loaded
+tableModules = [colors, imageWrapper, lexer, compiler, helperFunctions, movement, tokens, dataStructures]
+
+
+def getInterpreterVersion() -> str:
+    """
+    Derives the interpreter version from the archive format and the source of the modules that make the tables
+    :return: Hexadecimal digest
+    """
+    digest = hashlib.sha256(formatVersion.encode())
+    for module in tableModules:
+        with open(module.__file__, "rb") as sourceFile:
+            digest.update(sourceFile.read())
+    return digest.hexdigest()[:16]
+
+
+# Part of every cache key
+interpreterVersion = getInterpreterVersion()
+
+# Directory holding the cached programs, or None to disable the cache
+cacheDirectory = os.environ.get("PIET_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "piet_interpreter"))
+
+# In bytes. When the cache grows larger, the least recently used programs are removed
+maxCacheSize = 256 * 1024 * 1024
+
+
+def getCacheKey(image: np.ndarray) -> str:
+    """
+    Makes the key under which the program of an image is cached
+    :param image: Input image
+    :return: The hash of the image, together with the interpreter version
+    """
+    return "{}-{}".format(imageWrapper.getImageHash(image), interpreterVersion)
+
+
+def saveProgram(fileName: str, program: compiledProgram):
+    """
+    Writes the tables of a compiled program to a compressed numpy archive. The file is written under a temporary name
+    first, so other processes never read a partially written program.
+    :param fileName: Complete filename of the archive
+    :param program: Compiled program
+    """
+    temporaryName = "{}.{}.tmp".format(fileName, os.getpid())
+    with open(temporaryName, "wb") as programFile:
+        np.savez_compressed(programFile,
+                            labels=program.labels,
+                            nextCodels=np.array(program.nextCodels, dtype=np.int32),
+                            opcodes=np.array(program.opcodes, dtype=np.uint8),
+                            operands=np.array(program.operands, dtype=np.int64),
+                            edgePositions=np.array(program.edgePositions, dtype=np.int32).reshape(-1, 2),
+                            entryPositions=np.array(program.entryPositions, dtype=np.int32).reshape(-1, 2))
+    os.replace(temporaryName, fileName)
+
+
+def loadProgram(fileName: str) -> compiledProgram:
+    """
+    Reads the tables of a compiled program from a numpy archive made by saveProgram
+    :param fileName: Complete filename of the archive
+    :return: The compiled program
+    """
+    with np.load(fileName) as tables:
+        return compiledProgram(tables["nextCodels"].tolist(),
+                               tables["opcodes"].tolist(),
+                               tables["operands"].tolist(),
+                               list(map(tuple, tables["edgePositions"].tolist())),
+                               list(map(tuple, tables["entryPositions"].tolist())),
+                               tables["labels"])
+
+
+def evictPrograms(directory: str, maxSize: int):
+    """
+    Removes the least recently used programs from the cache directory, until its total size is at most maxSize
+    :param directory: Cache directory
+    :param maxSize: Maximum total size in bytes
+    """
+    entries = list(map(lambda entry: (entry.stat().st_mtime, entry.stat().st_size, entry.path),
+                       filter(lambda entry: entry.name.endswith(".npz"), os.scandir(directory))))
+    totalSize = sum(map(lambda entry: entry[1], entries))
+    for _, size, path in sorted(entries):
+        if totalSize <= maxSize:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        totalSize -= size
+
+
+def getCompiledProgram(image: np.ndarray) -> Union[Tuple[graph, compiledProgram], List[BaseException]]:
+    """
+    Lexes and compiles an image, or loads its program from the cache if the same image has been compiled before
+    :param image: Input image
+    :return: Either a tuple of the graph and the compiled program, or a list of exceptions that occurred while lexing
+    """
+    if cacheDirectory is None:
+        newGraph = lexer.graphImage(image)
+        if len(newGraph[1]) > 0:
+            return newGraph[1]
+        return newGraph[0], compiler.compileGraph(newGraph[0])
+
+    fileName = os.path.join(cacheDirectory, "{}.npz".format(getCacheKey(image)))
+    try:
+        program = loadProgram(fileName)
+        # Mark the program as recently used
+        os.utime(fileName)
+        return compiler.decompileProgram(program), program
+    except (OSError, ValueError, KeyError, zipfile.BadZipFile):
+        # Not cached yet, or the cached file is unreadable and will be replaced
+        pass
+
+    newGraph = lexer.graphImage(image)
+    if len(newGraph[1]) > 0:
+        return newGraph[1]
+    program = compiler.compileGraph(newGraph[0])
+
+    # A cache that can't be written to only costs the time to compile again
+    try:
+        os.makedirs(cacheDirectory, exist_ok=True)
+        saveProgram(fileName, program)
+        evictPrograms(cacheDirectory, maxCacheSize)
+    except OSError:
+        pass
+    return newGraph[0], program
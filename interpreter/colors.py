@@ -30,6 +30,121 @@ class possiblePixels:
         self.black = [0, 0, 0]
 
 
+# Color indices as produced by classifyImage. Indices 0-17 follow the order of possiblePixels().colors, so that
+# index // 3 is the hue and index % 3 is the lightness of a color
+WHITE = 18
+BLACK = 19
+UNKNOWN = 20
+
+
+def makeChannelLookup() -> np.ndarray:
+    """
+    Makes a lookup table that maps a channel value to 0 (0), 1 (192), 2 (255), or 3 (any other value)
+    :return: np.ndarray with 256 entries
+    """
+    channelLookup = np.full(256, 3, dtype=np.uint8)
+    channelLookup[[0, 192, 255]] = [0, 1, 2]
+    return channelLookup
+
+
+def makeColorLookup(channelLookup: np.ndarray) -> np.ndarray:
+    """
+    Makes a lookup table from combined channel codes (red * 16 + green * 4 + blue) to color indices
+    :param channelLookup: Lookup table for single channel values
+    :return: np.ndarray with 64 entries
+    """
+    pixelColors = possiblePixels()
+    colorLookup = np.full(64, UNKNOWN, dtype=np.uint8)
+    knownColors = pixelColors.colors + [pixelColors.white, pixelColors.black]
+    for colorIndex, color in enumerate(knownColors):
+        codes = channelLookup[color]
+        colorLookup[codes[0] * 16 + codes[1] * 4 + codes[2]] = colorIndex
+    return colorLookup
+
+
+channelLookup = makeChannelLookup()
+colorLookup = makeColorLookup(channelLookup)
+
+
+def classifyImage(image: np.ndarray) -> np.ndarray:
+    """
+    Classifies every pixel of an RGB(A) image in a single vectorized pass
+    :param image: np.ndarray of the image, with shape (height, width, channels), or a color index array of shape
+    (height, width) as loaded by imageFunctions.getImage, which is already classified
+    :return: np.ndarray of shape (height, width) with a uint8 color index per pixel (0-17, WHITE, BLACK or UNKNOWN)
+    """
+    if image.ndim == 2:
+        return np.asarray(image, dtype=np.uint8)
+    codes = channelLookup[image[..., 0]] * 16 + channelLookup[image[..., 1]] * 4 + channelLookup[image[..., 2]]
+    return colorLookup[codes]
+
+
+def makePaletteLookup(palette: np.ndarray) -> np.ndarray:
+    """
+    Classifies the colors of a palette, so that an image of palette indices is classified with a single lookup
+    :param palette: np.ndarray of shape (colors, 3) with the RGB values of at most 256 colors
+    :return: np.ndarray with 256 color indices, UNKNOWN for the entries the palette doesn't have
+    """
+    paletteLookup = np.full(256, UNKNOWN, dtype=np.uint8)
+    paletteLookup[:len(palette)] = classifyImage(np.asarray(palette, dtype=np.uint8).reshape(-1, 1, 3))[:, 0]
+    return paletteLookup
+
+
+# Color indices of the 256 shades of gray
+grayLookup = makePaletteLookup(np.repeat(np.arange(256, dtype=np.uint8)[:, np.newaxis], 3, axis=1))
+
+# RGB value of every color index, used to show color index arrays. Unknown colors are shown as gray
+indexColors = np.array(possiblePixels().colors + [possiblePixels().white, possiblePixels().black, [128, 128, 128]], dtype=np.uint8)
+
+
+def getRGBImage(image: np.ndarray) -> np.ndarray:
+    """
+    Makes an RGB image to show
+    :param image: np.ndarray of the image, or a color index array (see classifyImage)
+    :return: np.ndarray of shape (height, width, 3)
+    """
+    if image.ndim == 2:
+        return indexColors[image]
+    return image[..., :3]
+
+
+def classifyPixel(testColor: np.ndarray) -> int:
+    """
+    Classifies a single pixel
+    :param testColor: Input color, with at least three values
+    :return: The color index of the pixel (0-17, WHITE, BLACK or UNKNOWN)
+    """
+    codes = channelLookup[np.asarray(testColor[:3], dtype=np.uint8)]
+    return int(colorLookup[codes[0] * 16 + codes[1] * 4 + codes[2]])
+
+
+def getColorChange(colorStart: int, colorEnd: int) -> Union[Dict[str, int], BaseException]:
+    """
+    Gets the Hue change and the light change from two color indices
+    :param colorStart: Index of the starting color
+    :param colorEnd: Index of the final color
+    :return: Either a dictionary {'hueChange': int, 'lightChange': int}, or an Exception
+    """
+    # Indices read from the color map are uint8, which would wrap around when subtracted
+    colorStart = int(colorStart)
+    colorEnd = int(colorEnd)
+
+    # If either the starting or leaving color is white, there is no change (It is considered a noop)
+    if colorStart == WHITE or colorEnd == WHITE:
+        return {"hueChange": 0, "lightChange": 0}
+
+    if colorStart > 17:
+        return errors.UnknownColorError("Color index {} is not recognized as a correct color".format(colorStart))
+    if colorEnd > 17:
+        return errors.UnknownColorError("Color index {} is not recognized as a correct color".format(colorEnd))
+
+    # Calculating hue and lightness changes
+    hueChange = (int(colorEnd / 3) - int(colorStart / 3)) % 6
+    lightChange = (colorEnd - colorStart) % 3
+
+    return {"hueChange": hueChange, "lightChange": lightChange}
+
+
 def getPixelChange(colorStart: np.ndarray, colorEnd: np.ndarray) -> Union[Dict[str, int], BaseException]:
     """
     Gets the Hue change and the light change from two different colors
@@ -46,29 +161,17 @@ def getPixelChange(colorStart: np.ndarray, colorEnd: np.ndarray) -> Union[Dict[s
     if len(colorEnd) < 3:
         return ValueError("Start color does contain at least 3 values, but {}".format(colorEnd))
 
+    indexStart = classifyPixel(colorStart)
+    indexEnd = classifyPixel(colorEnd)
 
-    # If either the starting or leaving color is white, there is no change (It is considered a noop)
-    if isWhite(colorStart) or isWhite(colorEnd):
-        return {"hueChange": 0, "lightChange": 0}
+    # Report unknown colors with their RGB values, rather than their color index
+    if WHITE not in (indexStart, indexEnd):
+        if indexStart > 17:
+            return errors.UnknownColorError("Color {} is not recognized as a correct color".format(list(map(int, colorStart[:3]))))
+        if indexEnd > 17:
+            return errors.UnknownColorError("Color {} is not recognized as a correct color".format(list(map(int, colorEnd[:3]))))
 
-    pixelsColors = possiblePixels()
-    # Converting np arrays to normal lists
-    colorStart = list(colorStart)[:3]
-    colorEnd = list(colorEnd)[:3]
-
-    if colorStart not in pixelsColors.colors:
-        return errors.UnknownColorError("Color {} is not recognized as a correct color".format(colorStart))
-    if colorEnd not in pixelsColors.colors:
-        return errors.UnknownColorError("Color {} is not recognized as a correct color".format(colorEnd))
-
-    indexStart = pixelsColors.colors.index(colorStart)
-    indexEnd = pixelsColors.colors.index(colorEnd)
-
-    # Calculating hue and lightness changes
-    hueChange = (int(indexEnd / 3) - int(indexStart / 3)) % 6
-    lightChange = (indexEnd - indexStart) % 3
-
-    return {"hueChange": hueChange, "lightChange": lightChange}
+    return getColorChange(indexStart, indexEnd)
 
 
 def isWhite(testColor: np.ndarray) -> bool:
@@ -77,9 +180,7 @@ def isWhite(testColor: np.ndarray) -> bool:
     :param testColor: Input color
     :return: Boolean whether the input color is white (255, 255, 255)
     """
-    colors = possiblePixels()
-    testColor = list(testColor)[:3]
-    return testColor == colors.white
+    return classifyPixel(testColor) == WHITE
 
 
 def isBlack(testColor: np.ndarray) -> bool:
@@ -88,9 +189,7 @@ def isBlack(testColor: np.ndarray) -> bool:
     :param testColor: Input color
     :return: Boolean whether the input color is black (0, 0, 0)
     """
-    colors = possiblePixels()
-    testColor = list(testColor)[:3]
-    return testColor == colors.black
+    return classifyPixel(testColor) == BLACK
 
 
 def isColor(testColor: np.ndarray) -> bool:
@@ -99,6 +198,4 @@ def isColor(testColor: np.ndarray) -> bool:
     :param testColor: Input color
     :return: Boolean whether the input color is a Piet-color
     """
-    colors = possiblePixels()
-    testColor = list(testColor)[:3]
-    return testColor in colors.colors
+    return classifyPixel(testColor) < WHITE
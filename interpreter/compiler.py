@@ -0,0 +1,407 @@
+import sys
+from typing import List, Tuple, Union, Callable
+
+from interpreter import tokens as tokens
+from interpreter import lexer as lexer
+from interpreter import movementFunctions as movement
+from interpreter import tokenFunctions as runner
+from interpreter.dataStructures import graph, graphNode, compiledProgram, direction, position, basicBlock, lazyList
+
+# Opcodes 0-17 follow the order of tokens.getTokenType, so that opcode = hueChange * 3 + lightChange
+opcodeNames = [
+    "noop", "push", "pop",
+    "add", "subtract", "multiply",
+    "divide", "mod", "not",
+    "greater", "pointer", "switch",
+    "duplicate", "roll", "inN",
+    "inC", "outN", "outC",
+    "toWhite", "toBlack", "exit",
+    "uncompiled"
+]
+
+NOOP, PUSH, POP = 0, 1, 2
+ADD, SUBTRACT, MULTIPLY = 3, 4, 5
+DIVIDE, MOD, NOT = 6, 7, 8
+GREATER, POINTER, SWITCH = 9, 10, 11
+DUPLICATE, ROLL, IN_N = 12, 13, 14
+IN_C, OUT_N, OUT_C = 15, 16, 17
+TO_WHITE, TO_BLACK, TERMINATE = 18, 19, 20
+# The transitions of a codel that has not been compiled yet, in a lazily compiled program
+UNCOMPILED = 21
+
+# The operand of a TO_BLACK transition is the index of its token type in this list
+blackTokenTypes = ["toBlack", "edge", "Unknown color"]
+
+# Number of values an operation takes from the top of the stack. Roll can reach any depth, so it is not in here
+stackPops = {NOOP: 0, PUSH: 0, POP: 1, ADD: 2, SUBTRACT: 2, MULTIPLY: 2, DIVIDE: 2, MOD: 2, NOT: 1, GREATER: 2,
+             POINTER: 1, SWITCH: 1, DUPLICATE: 1, IN_N: 0, IN_C: 0, OUT_N: 1, OUT_C: 1, TO_WHITE: 0, TO_BLACK: 0,
+             TERMINATE: 0, UNCOMPILED: 0}
+# Number of values an operation puts on the stack
+stackPushes = {NOOP: 0, PUSH: 1, POP: 0, ADD: 1, SUBTRACT: 1, MULTIPLY: 1, DIVIDE: 1, MOD: 1, NOT: 1, GREATER: 1,
+               POINTER: 0, SWITCH: 0, DUPLICATE: 2, IN_N: 1, IN_C: 1, OUT_N: 0, OUT_C: 0, TO_WHITE: 0, TO_BLACK: 0,
+               TERMINATE: 0, UNCOMPILED: 0}
+
+
+def getOpcode(token: tokens.baseLexerToken) -> int:
+    """
+    Finds the opcode belonging to a token
+    :param token: Input token
+    :return: The opcode of the token
+    """
+    if isinstance(token, tokens.toBlackToken):
+        return TO_BLACK
+    if isinstance(token, tokens.toWhiteToken):
+        return TO_WHITE
+    if isinstance(token, tokens.terminateToken):
+        return TERMINATE
+    return opcodeNames.index(token.tokenType)
+
+
+def compileGraph(inputGraph: graph, lazy: bool = False) -> compiledProgram:
+    """
+    Compiles a graph into flat transition tables, indexed by codelId * 8 + DP * 2 + CC
+    :param inputGraph: Lexed graph without errors
+    :param lazy: If True, the tables are filled with UNCOMPILED, and every codel is compiled by the engine when it is
+    first reached (see compileNode). This only looks up the nodes that are needed in the graph
+    :return: The compiled program
+    """
+    tableSize = len(inputGraph.nodes) * 8
+    program = compiledProgram([0] * tableSize, [UNCOMPILED if lazy else TERMINATE] * tableSize, [0] * tableSize, [(0, 0)] * tableSize, [(0, 0)] * tableSize, inputGraph.labels)
+    if lazy:
+        program.graph = inputGraph
+        return program
+
+    for codelId in range(len(inputGraph.nodes)):
+        compileNode(program, inputGraph, codelId)
+    return program
+
+
+def compileNode(program: compiledProgram, inputGraph: graph, codelId: int) -> Union[BaseException, None]:
+    """
+    Fills in the tables of a compiled program for the 8 transitions of a codel
+    :param program: Compiled program, which is changed in place
+    :param inputGraph: Lexed graph
+    :param codelId: Id of the codel
+    :return: None, or the first exception in the node of the codel (in which case the transitions of that exception are
+    not compiled)
+    """
+    error = None
+    for pointers, (token, edgePosition) in inputGraph.nodes[codelId].graphNode.items():
+        index = codelId * 8 + pointers.pointers[0] * 2 + pointers.pointers[1]
+        program.edgePositions[index] = edgePosition.coords
+        if isinstance(token, BaseException):
+            error = token if error is None else error
+            continue
+
+        program.opcodes[index] = getOpcode(token)
+        entryPosition = edgePosition.coords
+        if isinstance(token, tokens.toColorToken):
+            entryPosition = movement.getNextPosition(edgePosition, pointers.pointers[0]).coords
+            program.operands[index] = token.codelSize
+        if isinstance(token, tokens.toWhiteToken):
+            entryPosition = token.exitCoords
+            program.operands[index] = token.exitPointers[0] * 2 + token.exitPointers[1]
+        if isinstance(token, tokens.toBlackToken):
+            program.operands[index] = blackTokenTypes.index(token.tokenType)
+        program.entryPositions[index] = entryPosition
+        program.nextCodels[index] = int(inputGraph.labels[entryPosition[1], entryPosition[0]])
+    return error
+
+
+def getToken(program: compiledProgram, index: int) -> tokens.baseLexerToken:
+    """
+    Recreates the token of a transition from the tables of a compiled program
+    :param program: Compiled program
+    :param index: Table index of the transition
+    :return: The token the transition was compiled from
+    """
+    opcode = program.opcodes[index]
+    operand = program.operands[index]
+    if opcode == TO_WHITE:
+        return tokens.toWhiteToken(tuple(program.entryPositions[index]), (operand // 2, operand % 2))
+    if opcode == TO_BLACK:
+        return tokens.toBlackToken(blackTokenTypes[operand])
+    if opcode == TERMINATE:
+        return tokens.terminateToken()
+    return tokens.toColorToken(opcodeNames[opcode], operand)
+
+
+def decompileNode(program: compiledProgram, codelId: int) -> graphNode:
+    """
+    Recreates the graph node of a codel from the tables of a compiled program
+    :param program: Compiled program
+    :param codelId: Id of the codel
+    :return: The graph node, with a token and edge position for each of the 8 pointers
+    """
+    edges = {}
+    for pointers in range(8):
+        index = codelId * 8 + pointers
+        edges[direction((pointers // 2, pointers % 2))] = (getToken(program, index), position(tuple(program.edgePositions[index])))
+    return graphNode(edges)
+
+
+def decompileProgram(program: compiledProgram) -> graph:
+    """
+    Recreates the graph a program was compiled from, using its label map and tables
+    :param program: Compiled program
+    :return: The graph, with the codels in the order of their ids. The codels and nodes are lazy lists, as the graph
+    is usually only needed for the codels the program reaches
+    """
+    codelCount = len(program.opcodes) // 8
+    return graph(lexer.getLazyCodels(program.labels, codelCount), lazyList(codelCount, lambda codelId: decompileNode(program, codelId)), program.labels)
+
+
+def getFlipTable() -> List[int]:
+    """
+    Makes a table with the pointers (DP * 2 + CC) that follow after bumping into a black pixel or edge, see movement.flip
+    :return: List of 8 pointers
+    """
+    flippedDirections = map(lambda pointers: movement.flip(direction((pointers // 2, pointers % 2))), range(8))
+    return list(map(lambda flipped: flipped.pointers[0] * 2 + flipped.pointers[1], flippedDirections))
+
+
+# Opcodes that end a basic block: the next transition depends on the stack or on input, or the program stops
+branchOpcodes = {POINTER, SWITCH, TO_BLACK, IN_N, IN_C, TERMINATE}
+# Blocks are cut at this many transitions, so that loops without any branches still get compiled
+maxBlockLength = 256
+
+
+def getBlockLeaders(program: compiledProgram) -> List[int]:
+    """
+    Finds the table indices at which execution can continue after a branch, and the start of the program
+    :param program: Compiled program
+    :return: List of table indices
+    """
+    leaders = set()
+    startCodel = int(program.labels[0, 0])
+    if startCodel != -1:
+        leaders.add(startCodel * 8)
+
+    flipTable = getFlipTable()
+    for index, opcode in enumerate(program.opcodes):
+        pointers = index % 8
+        nextBase = program.nextCodels[index] * 8
+        if opcode == POINTER:
+            leaders.update(map(lambda dp: nextBase + dp * 2 + pointers % 2, range(4)))
+        elif opcode == SWITCH:
+            leaders.update((nextBase + pointers // 2 * 2, nextBase + pointers // 2 * 2 + 1))
+        elif opcode == TO_BLACK:
+            leaders.add(index - pointers + flipTable[pointers])
+        elif opcode in (IN_N, IN_C):
+            leaders.add(nextBase + pointers)
+
+    return sorted(leaders)
+
+
+def traceBlock(program: compiledProgram, startIndex: int) -> basicBlock:
+    """
+    Follows the transitions from the start index until a branch, a transition already in the block, or the maximum
+    block length is reached
+    :param program: Compiled program
+    :param startIndex: Table index to start from
+    :return: The basic block starting at the start index
+    """
+    instructions = []
+    visited = set()
+    index = startIndex
+    while program.opcodes[index] not in branchOpcodes and index not in visited and len(instructions) < maxBlockLength:
+        visited.add(index)
+        instructions.append((index, program.opcodes[index], program.operands[index]))
+        nextPointers = program.operands[index] if program.opcodes[index] == TO_WHITE else index % 8
+        index = program.nextCodels[index] * 8 + nextPointers
+
+    # Noops and white transitions only take a step, so they need no code
+    operations = list(filter(lambda operation: operation[1] not in (NOOP, TO_WHITE), map(lambda offset: (offset, instructions[offset][1], instructions[offset][2]), range(len(instructions)))))
+    return basicBlock(startIndex, instructions, index, operations)
+
+
+def findBasicBlocks(program: compiledProgram) -> List[basicBlock]:
+    """
+    Finds the maximal basic blocks of the program, starting from every block leader
+    :param program: Compiled program
+    :return: List of basic blocks with at least two transitions
+    """
+    worklist = getBlockLeaders(program)
+    traced = set()
+    blocks = []
+    while len(worklist) > 0:
+        startIndex = worklist.pop()
+        if startIndex in traced:
+            continue
+        traced.add(startIndex)
+
+        block = traceBlock(program, startIndex)
+        # A block that was cut short continues in a new block
+        if program.opcodes[block.exitIndex] not in branchOpcodes:
+            worklist.append(block.exitIndex)
+        if block.steps >= 2:
+            blocks.append(block)
+    return blocks
+
+
+def generatePushInstruction(opcode: int, value: int) -> List[str]:
+    """
+    Generates a superinstruction for a push, followed by the given opcode
+    :param opcode: The opcode following the push
+    :param value: The pushed value
+    :return: Lines of python source, or an empty list if there is no superinstruction for the opcode
+    """
+    if opcode in (ADD, SUBTRACT, MULTIPLY):
+        operator = {ADD: "+=", SUBTRACT: "-=", MULTIPLY: "*="}[opcode]
+        return ["if stack:", "    stack[-1] {} {}".format(operator, value), "else:", "    stack.append({})".format(value)]
+    if opcode == GREATER:
+        return ["if stack:", "    stack[-1] = int(stack[-1] > {})".format(value), "else:", "    stack.append({})".format(value)]
+    if opcode == DUPLICATE:
+        return ["stack.extend(({0}, {0}))".format(value)]
+    if opcode == OUT_N:
+        return ["streams.write({!r})".format(str(value))]
+    if opcode == OUT_C and 0 <= value <= sys.maxunicode:
+        return ["streams.write({!r})".format(chr(value))]
+    return []
+
+
+def generateFailure(offset: int, error: str) -> str:
+    """
+    Generates the statement with which a block function reports a runtime error
+    :param offset: Offset of the failing instruction within its block
+    :param error: Python expression creating the exception
+    :return: A line of python source
+    """
+    return "return ({}, {})".format(offset, error)
+
+
+def generateInstruction(offset: int, opcode: int, failure: Callable[[int, str], str] = generateFailure) -> List[str]:
+    """
+    Generates python source for a single instruction, operating on a list named stack and an ioStreams named streams
+    :param offset: Offset of the instruction within its block, passed to the failure function
+    :param opcode: The opcode of the instruction
+    :param failure: Function generating the statement that reports a runtime error
+    :return: Lines of python source
+    """
+    if opcode == POP:
+        return ["if stack:", "    stack.pop()"]
+    if opcode in (ADD, SUBTRACT, MULTIPLY):
+        operator = {ADD: "+=", SUBTRACT: "-=", MULTIPLY: "*="}[opcode]
+        return ["if len(stack) >= 2:", "    first = stack.pop()", "    stack[-1] {} first".format(operator)]
+    if opcode == DIVIDE:
+        # Mirrors tokenFunctions.divideOperator, which ignores division by zero
+        return ["if len(stack) >= 2 and stack[-1] != 0:", "    first = stack.pop()", "    stack[-1] = int(stack[-1] / first)"]
+    if opcode == MOD:
+        # Mirrors tokenFunctions.modOperator, which ignores modulo by zero
+        return ["if len(stack) >= 2 and stack[-1] != 0:", "    first = stack.pop()", "    stack[-1] %= first"]
+    if opcode == NOT:
+        return ["if stack:", "    stack[-1] = int(stack[-1] == 0)"]
+    if opcode == GREATER:
+        return ["if len(stack) >= 2:", "    first = stack.pop()", "    stack[-1] = int(stack[-1] > first)"]
+    if opcode == DUPLICATE:
+        return ["if stack:", "    stack.append(stack[-1])"]
+    if opcode == ROLL:
+        return ["rollStack(stack)"]
+    if opcode == OUT_N:
+        return ["if stack:", "    streams.outN(stack.pop())"]
+    if opcode == OUT_C:
+        return ["if stack and 0 <= stack[-1] <= {}:".format(sys.maxunicode), "    streams.outC(stack.pop())"]
+    return []
+
+
+def generateInstructions(operations: List[Tuple[int, int, int]], failure: Callable[[int, str], str] = generateFailure) -> List[str]:
+    """
+    Generates python source for a list of straight-line operations, fusing pushes with the operation that follows
+    :param operations: List of (offset, opcode, operand)
+    :param failure: Function generating the statement that reports a runtime error
+    :return: Lines of python source
+    """
+    lines = []
+    i = 0
+    while i < len(operations):
+        offset, opcode, operand = operations[i]
+        if opcode == PUSH:
+            following = operations[i + 1][1] if i + 1 < len(operations) else None
+            fused = generatePushInstruction(following, operand)
+            if len(fused) > 0:
+                lines.extend(fused)
+                i += 2
+                continue
+
+            # Gather a run of pushes into a single extend, leaving the last push to be fused if possible
+            values = [operand]
+            while i + len(values) < len(operations) and operations[i + len(values)][1] == PUSH:
+                values.append(operations[i + len(values)][2])
+            afterRun = operations[i + len(values)][1] if i + len(values) < len(operations) else None
+            if len(values) > 1 and len(generatePushInstruction(afterRun, values[-1])) > 0:
+                values.pop()
+            lines.append("stack.append({})".format(values[0]) if len(values) == 1 else "stack.extend(({}))".format(", ".join(map(str, values))))
+            i += len(values)
+            continue
+
+        lines.extend(generateInstruction(offset, opcode, failure))
+        i += 1
+    return lines
+
+
+def generateBlockSource(block: basicBlock) -> str:
+    """
+    Generates the source of the function executing a block. The function returns None, or a tuple of the offset of the
+    failing instruction and the exception that occurred.
+    :param block: Basic block
+    :return: Python source of a function named block<startIndex>
+    """
+    lines = ["def block{}(stack, streams):".format(block.startIndex)]
+    lines.extend(map(lambda line: "    " + line, generateInstructions(block.operations)))
+    lines.append("    return None")
+    return "\n".join(lines)
+
+
+def getLastMove(instructions: List[Tuple[int, int, int]]) -> int:
+    """
+    Finds the last transition that moved to another codel, so that wasn't a bounce off black
+    :param instructions: Instructions of a block
+    :return: Table index of the last move, or -1 if there is none
+    """
+    return next((index for index, opcode, _ in reversed(instructions) if opcode != TO_BLACK), -1)
+
+
+def getStackReach(operations: List[Tuple[int, int, int]]) -> int:
+    """
+    Finds how many values below the height of the stack at the start of a block the block can change. If the stack
+    is too small for an operation the reach is at least the height of the stack, so the whole stack counts as changed.
+    :param operations: Operations of a block
+    :return: Number of values, or sys.maxsize if the block rolls the stack
+    """
+    height = 0
+    reach = 0
+    for _, opcode, _ in operations:
+        if opcode == ROLL:
+            return sys.maxsize
+        height -= stackPops[opcode]
+        reach = max(reach, -height)
+        height += stackPushes[opcode]
+    return reach
+
+
+def compileBlockFunctions(blocks: List[basicBlock], tableSize: int) -> List[Union[basicBlock, None]]:
+    """
+    Compiles each block into a python function
+    :param blocks: List of basic blocks
+    :param tableSize: Size of the tables of the compiled program
+    :return: A list with the block starting at each table index, or None if no block starts there
+    """
+    namespace = {"rollStack": runner.rollStack}
+    exec(compile("\n\n".join(map(generateBlockSource, blocks)), "<piet blocks>", "exec"), namespace)
+
+    blockTable = [None] * tableSize
+    for block in blocks:
+        block.function = namespace["block{}".format(block.startIndex)]
+        block.lastMove = getLastMove(block.instructions)
+        block.stackReach = getStackReach(block.operations)
+        blockTable[block.startIndex] = block
+    return blockTable
+
+
+def compileBlocks(program: compiledProgram) -> List[Union[basicBlock, None]]:
+    """
+    Finds the basic blocks of the program, and compiles each of them into a python function
+    :param program: Compiled program
+    :return: A list with the block starting at each table index, or None if no block starts there
+    """
+    return compileBlockFunctions(findBasicBlocks(program), len(program.opcodes))
@@ -0,0 +1,78 @@
+from typing import List, Tuple, Union
+
+# The stack is hashed as a polynomial in hashBase, modulo the Mersenne prime hashModulus
+hashBase = 1000003
+hashModulus = (1 << 61) - 1
+
+
+class cycleDetector():
+    """
+    Detects that a program returns to a state (codel, pointers and stack) it was in before, with Brent's algorithm.
+    States are compared by a fingerprint first, which includes a hash of the stack. The hashes of all prefixes of the
+    stack are kept, so only the part of the stack above the deepest changed value has to be hashed again. Input breaks
+    the determinism of a program, so reading input starts the detection over.
+    """
+    def __init__(self):
+        # prefixHashes[i] is the hash of the bottom i values of the stack
+        self.prefixHashes: List[int] = [0]
+        # The state the detection started from, as (codelId, pointers, stack, steps)
+        self.origin: Union[Tuple[int, int, List[int], int], None] = None
+        self.savedFingerprint = None
+        self.savedStack: List[int] = []
+        self.savedSteps = 0
+        self.power = 1
+        self.distance = 0
+        # Set when a cycle is found
+        self.cycleLength: Union[int, None] = None
+
+    def reset(self):
+        """
+        Starts the detection over from the next checked state
+        """
+        self.origin = None
+
+    def updateHashes(self, stack: List[int], unchanged: int):
+        """
+        Hashes the changed part of the stack
+        :param stack: Data stack
+        :param unchanged: Number of values at the bottom of the stack that didn't change since the previous update
+        """
+        prefixHashes = self.prefixHashes
+        unchanged = max(0, min(unchanged, len(stack), len(prefixHashes) - 1))
+        del prefixHashes[unchanged + 1:]
+        current = prefixHashes[unchanged]
+        for value in stack[unchanged:]:
+            current = (current * hashBase + value) % hashModulus
+            prefixHashes.append(current)
+
+    def check(self, codelId: int, pointers: int, stack: List[int], steps: int, unchanged: int) -> bool:
+        """
+        Checks whether the program is in a state it was in before
+        :param codelId: Current codel
+        :param pointers: Current pointers (DP * 2 + CC)
+        :param stack: Data stack
+        :param steps: Number of steps taken so far
+        :param unchanged: Number of values at the bottom of the stack that didn't change since the previous check
+        :return: True if a cycle is found, in which case cycleLength is set to its length in steps
+        """
+        self.updateHashes(stack, unchanged)
+        fingerprint = (codelId, pointers, len(stack), self.prefixHashes[-1])
+
+        if self.origin is None:
+            self.origin = (codelId, pointers, list(stack), steps)
+            self.power = 1
+            self.distance = 0
+        elif fingerprint == self.savedFingerprint and stack == self.savedStack:
+            self.cycleLength = steps - self.savedSteps
+            return True
+        else:
+            self.distance += 1
+            if self.distance < self.power:
+                return False
+            self.power *= 2
+            self.distance = 0
+
+        self.savedFingerprint = fingerprint
+        self.savedStack = list(stack)
+        self.savedSteps = steps
+        return False
@@ -1,12 +1,16 @@
-from typing import Set, Tuple, Dict, List
+from typing import Set, Tuple, Dict, List, Callable, Iterator, Any
 import copy
 
+import numpy as np
+
 from interpreter import tokens as tokens
 
 class position():
     """
     A coords is a tuple of x and y coordinates
     """
+    __slots__ = ("coords",)
+
     def __init__(self, newPosition: Tuple[int, int]):
         self.coords = newPosition
 
@@ -30,12 +34,24 @@ class position():
         return not self == other
 
 
+# The 8 directions, by their pointers. Making a direction returns one of these, so they are only stored once
+directions: Dict[Tuple[int, int], "direction"] = {}
+
+
 class direction():
     """
     A direction is made up of a Direction Pointer (DP) at .pointers[0] and a Codel Chooser (CC) at .pointers[1].
+    Directions can't be changed, and the 8 valid directions are interned (see directions).
     """
-    def __init__(self, newPointers: Tuple[int, int]):
-        self.pointers = newPointers
+    __slots__ = ("pointers",)
+
+    def __new__(cls, newPointers: Tuple[int, int]):
+        interned = directions.get(newPointers)
+        if interned is not None:
+            return interned
+        newDirection = super().__new__(cls)
+        newDirection.pointers = newPointers
+        return newDirection
 
     def __str__(self):
         return "{}".format(self.pointers)
@@ -44,7 +60,10 @@ class direction():
         return "{}".format(self.pointers)
 
     def __deepcopy__(self, memodict):
-        return direction(copy.deepcopy(self.pointers))
+        return self
+
+    def __reduce__(self):
+        return (direction, (self.pointers,))
 
     # Functions to allow this datatype to behave in sets
     def __eq__(self, other):
@@ -56,29 +75,63 @@ class direction():
     def __hash__(self):
         return hash(self.pointers)
 
+
+for directionPointer in range(4):
+    for codelChooser in range(2):
+        directions[(directionPointer, codelChooser)] = direction((directionPointer, codelChooser))
+
+
 class codel():
     """
-    A codel is a set of positions adjacent to each other and with the same color as each other
+    A codel is an area of adjacent pixels with the same color. Instead of its pixels, it stores the label map of the
+    image (which is shared by all codels), its id in that map, its bounding box as (minX, minY, maxX, maxY), and its
+    number of pixels. The pixels are listed from the label map when they are needed.
     """
-    def __init__(self, newCodel: Set[position]):
-        self.codel = newCodel
+    __slots__ = ("labels", "labelId", "bounds", "size")
+
+    def __init__(self, labels: np.ndarray, labelId: int, bounds: Tuple[int, int, int, int], size: int):
+        self.labels = labels
+        self.labelId = labelId
+        self.bounds = bounds
+        self.size = size
+
+    def getMask(self) -> np.ndarray:
+        """
+        :return: A boolean array over the bounding box, which is True for the pixels of the codel
+        """
+        minX, minY, maxX, maxY = self.bounds
+        return self.labels[minY:maxY + 1, minX:maxX + 1] == self.labelId
+
+    def getFirstPosition(self) -> position:
+        """
+        :return: The first pixel of the codel in reading order
+        """
+        minX, minY, maxX, maxY = self.bounds
+        return position((minX + int(np.argmax(self.labels[minY, minX:maxX + 1] == self.labelId)), minY))
+
+    @property
+    def codel(self) -> Set[position]:
+        """
+        :return: The set of positions of the pixels of the codel
+        """
+        ys, xs = np.nonzero(self.getMask())
+        return set(map(lambda x, y: position((x + self.bounds[0], y + self.bounds[1])), xs.tolist(), ys.tolist()))
 
     def __str__(self):
-        return "{}".format(self.codel)
+        return "Codel {} in {}, {} pixels".format(self.labelId, self.bounds, self.size)
 
     def __repr__(self):
         return str(self)
 
     def __copy__(self):
-        return codel(copy.copy(self.codel))
+        return codel(self.labels, self.labelId, self.bounds, self.size)
 
     # Functions to allow this datatype to behave in sets
     def __hash__(self):
-        # Return a hash of a frozenset, because a normal set can't be hashed
-        return hash(frozenset(self.codel))
+        return hash((self.bounds, self.size))
 
     def __eq__(self, other):
-        return other.codel == self.codel
+        return other.bounds == self.bounds and other.size == self.size and np.array_equal(other.getMask(), self.getMask())
 
     def __ne__(self, other):
         return not self == other
@@ -87,6 +140,8 @@ class edge():
     """
     The edge contains a position and direction (DP and CC)
     """
+    __slots__ = ("edge",)
+
     def __init__(self, newEdge: Tuple[position, direction]):
         self.edge = newEdge
 
@@ -101,6 +156,8 @@ class graphNode():
     """
     The key to the token and coords is a direction
     """
+    __slots__ = ("graphNode",)
+
     def __init__(self, newNode: Dict[direction, Tuple[tokens.baseLexerToken, position]]):
         self.graphNode = newNode
 
@@ -111,15 +168,49 @@ class graphNode():
         return str(self)
 
 
+class lazyList():
+    """
+    A list of which each item is made the first time it is looked up, and kept after that. Used for the codels and
+    nodes of a graph, so that only the parts of a large image that are reached have to be lexed.
+    """
+    def __init__(self, length: int, makeItem: Callable[[int], Any]):
+        self.makeItem = makeItem
+        self.items: List[Any] = [None] * length
+
+    def __getitem__(self, index: int) -> Any:
+        item = self.items[index]
+        if item is None:
+            item = self.makeItem(index % len(self.items))
+            self.items[index] = item
+        return item
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def __iter__(self) -> Iterator[Any]:
+        return map(self.__getitem__, range(len(self.items)))
+
+    def __str__(self):
+        return "Lazy list of {} items, {} made".format(len(self.items), len(self.items) - self.items.count(None))
+
+    def __repr__(self):
+        return str(self)
+
+
 class graph():
     """
     Each codel has a node of directions and tokens associated with those directions (and where the edge will start)
+
+    Codels are identified by an integer id. The label map holds the id of the codel each pixel belongs to (-1 for black
+    pixels), and the id indexes both the list of codels and the list of nodes. Either list can be a lazyList.
     """
-    def __init__(self, newGraph: Dict[codel, graphNode]):
-        self.graph = newGraph
+    def __init__(self, newCodels: List[codel], newNodes: List[graphNode], newLabels: np.ndarray):
+        self.codels = newCodels
+        self.nodes = newNodes
+        self.labels = newLabels
 
     def __str__(self):
-        return "{}".format(self.graph)
+        return "{}".format(dict(zip(self.codels, self.nodes)))
 
     def __repr__(self):
         return str(self)
@@ -145,4 +236,86 @@ class programState():
 
     def __deepcopy__(self, memodict):
         # Don't copy the graph, because it is not intended to be edited, and it is a slow process
-        return programState(self.graph, copy.deepcopy(self.position), copy.deepcopy(self.direction), copy.deepcopy(self.dataStack))
+        return programState(self.graph, copy.deepcopy(self.position), copy.deepcopy(self.direction), list(self.dataStack))
+
+
+class compiledProgram():
+    """
+    A graph compiled into flat tables, which are indexed by codelId * 8 + DP * 2 + CC. For every edge the tables hold the
+    id of the codel the edge leads to, the opcode to execute, the operand of the opcode (the value to push, or the
+    pointers after sliding through white), the position (x, y) of the edge and the position (x, y) at which the next
+    codel is entered.
+    """
+    def __init__(self, nextCodels: List[int], opcodes: List[int], operands: List[int], edgePositions: List[Tuple[int, int]], entryPositions: List[Tuple[int, int]], labels: np.ndarray):
+        self.nextCodels = nextCodels
+        self.opcodes = opcodes
+        self.operands = operands
+        self.edgePositions = edgePositions
+        self.entryPositions = entryPositions
+        self.labels = labels
+        # Basic blocks per table index, filled in by compiler.compileBlocks
+        self.blocks = None
+        # The graph of a lazily compiled program, of which the codels are compiled when they are reached
+        self.graph = None
+
+    def __str__(self):
+        return "Compiled program with {} codels".format(len(self.opcodes) // 8)
+
+    def __repr__(self):
+        return str(self)
+
+
+class basicBlock():
+    """
+    A straight-line run of transitions without branches, starting at a table index. Each instruction is a tuple of
+    (table index, opcode, operand), one per transition. The operations are the (offset, opcode, operand) tuples that
+    actually need to be executed, where offset is the index of the transition within the instructions. The block is
+    executed as a whole by a single generated function, after which the program continues at the exit index.
+    """
+    def __init__(self, startIndex: int, instructions: List[Tuple[int, int, int]], exitIndex: int, operations: List[Tuple[int, int, int]]):
+        self.startIndex = startIndex
+        self.instructions = instructions
+        self.exitIndex = exitIndex
+        self.operations = operations
+        self.steps = len(instructions)
+        # Table index of the last transition that moved to another codel (so not a bounce off black), or -1 if none
+        self.lastMove = -1
+        # How deep below its starting height the block can change the stack, set by the compiler
+        self.stackReach = 0
+        self.function = None
+        # Number of times the engine ran this block
+        self.executions = 0
+
+    def __str__(self):
+        return "Block {} -> {}, {} steps".format(self.startIndex, self.exitIndex, self.steps)
+
+    def __repr__(self):
+        return str(self)
+
+
+class machineState():
+    """
+    The mutable state of the compiled engine. The pointers are stored as a single int (DP * 2 + CC), and the position
+    is the pixel at which the current codel was entered.
+    """
+    def __init__(self, codelId: int, pointers: int, newPosition: Tuple[int, int], dataStack: List[int] = None):
+        if dataStack is None:
+            dataStack = []
+
+        self.codelId = codelId
+        self.pointers = pointers
+        self.position = newPosition
+        self.dataStack = dataStack
+        self.steps = 0
+        self.terminated = False
+        # Set when the engine stopped before reading input, because there was none (see engine.runProgram)
+        self.waitingForInput = False
+        # Set when the engine found that the program repeats a cycle forever (see cycleFunctions.cycleDetector)
+        self.cycleLength = None
+        self.cycleEntry = None
+
+    def __str__(self):
+        return "Codel:{codel} / {pointers}. Stack: {stack}".format(codel=self.codelId, pointers=(self.pointers // 2, self.pointers % 2), stack=self.dataStack)
+
+    def __repr__(self):
+        return str(self)
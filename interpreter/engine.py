@@ -0,0 +1,288 @@
+import io
+import sys
+from typing import Union
+
+from interpreter import compiler as compiler
+from interpreter import tokenFunctions as runner
+from interpreter import errors as errors
+from interpreter.compiler import NOOP, PUSH, POP, ADD, SUBTRACT, MULTIPLY, DIVIDE, MOD, NOT, GREATER, POINTER, SWITCH, \
+    DUPLICATE, ROLL, IN_N, IN_C, OUT_N, OUT_C, TO_WHITE, TO_BLACK, TERMINATE, UNCOMPILED
+from interpreter.streams import ioStreams
+from interpreter.cycleFunctions import cycleDetector
+from interpreter.profileFunctions import executionProfile
+from interpreter.dataStructures import compiledProgram, machineState, graph, programState, position, direction
+
+# Number of steps findCycleEntry takes at once
+cycleEntryChunk = 1024
+
+
+def initialState(program: compiledProgram) -> Union[machineState, BaseException]:
+    """
+    Makes the default starting state: the top left codel, with DP right and CC left
+    :param program: Compiled program
+    :return: Either a new machine state, or an exception if the program starts in a black pixel
+    """
+    codelId = int(program.labels[0, 0])
+    if codelId == -1:
+        return errors.inBlackPixelError("Programstate starts in black pixel at {}".format(position((0, 0))))
+    return machineState(codelId, 0, (0, 0))
+
+
+def runProgram(program: compiledProgram, state: machineState, maxSteps: int = None, streams: ioStreams = None, stopForInput: bool = False, cycles: cycleDetector = None, profile: executionProfile = None, countExecutions: bool = True) -> Union[machineState, BaseException]:
+    """
+    Executes the compiled program by dispatching on the opcodes of the flat tables. If the program has compiled basic
+    blocks, those are run as a whole. The state is updated in place.
+    :param program: Compiled program
+    :param state: State to continue from
+    :param maxSteps: Maximum number of steps to take, or None to run until the program terminates
+    :param streams: Input and output of the program. Defaults to interactive input and output on the console
+    :param stopForInput: If True, stop before reading input when the streams have no input left (state.waitingForInput
+    is set), instead of reading the end of the input
+    :param cycles: If given, used to check whether the program repeats a state. When it does, the program never
+    terminates: the engine stops, and sets state.cycleLength and state.cycleEntry. The same detector should be passed
+    to every call that continues the same run
+    :param profile: If given, every dispatch is counted and timed in it. Blocks are timed as a whole, so the program is
+    usually profiled without blocks
+    :param countExecutions: Whether to count the executions of blocks, which optimizer.getRemovedSteps reports. Runs
+    that repeat steps the program already took, like the replays of findCycleEntry, are not counted
+    :return: Either the updated state (state.terminated tells whether the program finished), or a runtime exception
+    """
+    nextCodels = program.nextCodels
+    opcodes = program.opcodes
+    operands = program.operands
+    flipTable = compiler.getFlipTable()
+    blocks = program.blocks if program.blocks is not None else [None] * len(opcodes)
+    if streams is None:
+        streams = ioStreams()
+
+    stack = state.dataStack
+    codelId = state.codelId
+    pointers = state.pointers
+    lastMove = -1
+    steps = 0
+    stepLimit = sys.maxsize if maxSteps is None else maxSteps
+    error = None
+    state.waitingForInput = False
+    # Number of values at the bottom of the stack that did not change since the last check for a cycle
+    unchanged = 0
+
+    # Output that was written before an unexpected exception is still flushed
+    try:
+        while steps < stepLimit:
+            index = codelId * 8 + pointers
+
+            if profile is not None:
+                profile.enter(index)
+            if cycles is not None:
+                if cycles.check(codelId, pointers, stack, state.steps + steps, unchanged):
+                    break
+                unchanged = len(stack)
+
+            # Run a whole basic block at once, if it fits within the step limit
+            block = blocks[index]
+            if block is not None and steps + block.steps <= stepLimit:
+                if cycles is not None:
+                    unchanged = len(stack) - block.stackReach
+                failure = block.function(stack, streams)
+                if failure is not None:
+                    offset, error = failure
+                    steps += offset + 1
+                    index = block.instructions[offset][0]
+                    codelId = index // 8
+                    pointers = index % 8
+                    if compiler.getLastMove(block.instructions[:offset]) != -1:
+                        lastMove = compiler.getLastMove(block.instructions[:offset])
+                    break
+                steps += block.steps
+                if countExecutions:
+                    block.executions += 1
+                if block.lastMove != -1:
+                    lastMove = block.lastMove
+                codelId = block.exitIndex // 8
+                pointers = block.exitIndex % 8
+                continue
+
+            opcode = opcodes[index]
+
+            if opcode >= TERMINATE:
+                if opcode == UNCOMPILED:
+                    # Lazily compiled programs compile a codel when it is first reached. A transition stays uncompiled
+                    # if its token is an exception
+                    error = compiler.compileNode(program, program.graph, codelId)
+                    opcode = opcodes[index]
+                    if opcode == UNCOMPILED:
+                        break
+                    error = None
+                if opcode == TERMINATE:
+                    state.terminated = True
+                    break
+            if stopForInput and (opcode == IN_N or opcode == IN_C) and not streams.hasInput():
+                state.waitingForInput = True
+                break
+            steps += 1
+
+            if cycles is not None:
+                if opcode == IN_N or opcode == IN_C:
+                    # Input makes the rest of the run depend on more than the state
+                    cycles.reset()
+                elif opcode == ROLL:
+                    unchanged = len(stack) - 2 - stack[-2] if len(stack) >= 2 and stack[-2] >= 0 else 0
+                else:
+                    unchanged = len(stack) - compiler.stackPops[opcode]
+
+            if opcode == TO_BLACK:
+                pointers = flipTable[pointers]
+                continue
+
+            if opcode == PUSH:
+                stack.append(operands[index])
+            elif opcode == NOOP:
+                pass
+            elif opcode == TO_WHITE:
+                pointers = operands[index]
+            elif opcode <= DIVIDE:
+                # POP, ADD, SUBTRACT, MULTIPLY and DIVIDE
+                if opcode == POP:
+                    if stack:
+                        stack.pop()
+                elif len(stack) >= 2:
+                    first = stack.pop()
+                    second = stack.pop()
+                    if opcode == ADD:
+                        stack.append(second + first)
+                    elif opcode == SUBTRACT:
+                        stack.append(second - first)
+                    elif opcode == MULTIPLY:
+                        stack.append(second * first)
+                    elif first == 0:
+                        # Mirrors tokenFunctions.divideOperator, which ignores division by zero
+                        stack += (second, first)
+                    else:
+                        stack.append(int(second / first))
+            elif opcode == DUPLICATE:
+                if stack:
+                    stack.append(stack[-1])
+            elif opcode == POINTER:
+                if stack:
+                    pointers = ((pointers // 2 + stack.pop()) % 4) * 2 + pointers % 2
+            elif opcode == SWITCH:
+                if stack:
+                    pointers = pointers ^ (abs(stack.pop()) % 2)
+            elif opcode == GREATER:
+                if len(stack) >= 2:
+                    first = stack.pop()
+                    stack.append(int(stack.pop() > first))
+            elif opcode == NOT:
+                if stack:
+                    stack.append(1 if stack.pop() == 0 else 0)
+            elif opcode == MOD:
+                if len(stack) >= 2:
+                    first = stack.pop()
+                    second = stack.pop()
+                    # Mirrors tokenFunctions.modOperator, which ignores modulo by zero
+                    if first == 0:
+                        stack += (second, first)
+                    else:
+                        stack.append(second % first)
+            elif opcode == ROLL:
+                runner.rollStack(stack)
+            elif opcode == OUT_N:
+                if stack:
+                    streams.outN(stack.pop())
+            elif opcode == OUT_C:
+                # Values that aren't characters are not printed, and stay on the stack
+                if stack and 0 <= stack[-1] <= sys.maxunicode:
+                    streams.outC(stack.pop())
+            elif opcode == IN_N:
+                newVal = streams.inN()
+                if newVal is not None:
+                    stack.append(newVal)
+            elif opcode == IN_C:
+                newVal = streams.inC()
+                if newVal is not None:
+                    stack.append(newVal)
+            else:
+                error = errors.UnknownTokenError("Opcode {} not found".format(opcode))
+                break
+
+            # Pointer and switch change the direction only after moving along the old direction
+            lastMove = index
+            codelId = nextCodels[index]
+    finally:
+        if profile is not None:
+            profile.leave()
+        streams.flush()
+
+    state.steps += steps
+    state.codelId = codelId
+    state.pointers = pointers
+    if lastMove != -1:
+        state.position = program.entryPositions[lastMove]
+    if cycles is not None and cycles.cycleLength is not None:
+        state.cycleLength = cycles.cycleLength
+        state.cycleEntry = findCycleEntry(program, cycles)
+
+    if error is not None:
+        index = codelId * 8 + pointers
+        return type(error)("{}, at position {}, direction {}".format(error.args[0], position(program.edgePositions[index]), direction((pointers // 2, pointers % 2))))
+    return state
+
+
+def copyState(state: machineState) -> machineState:
+    """
+    Copies a machine state, including its data stack
+    :param state: Machine state
+    :return: A new machine state
+    """
+    newState = machineState(state.codelId, state.pointers, state.position, list(state.dataStack))
+    newState.steps = state.steps
+    return newState
+
+
+def isSameState(first: machineState, second: machineState) -> bool:
+    """
+    Compares the codels, pointers and stacks of two machine states
+    :return: True if running on from either state gives the same steps
+    """
+    return first.codelId == second.codelId and first.pointers == second.pointers and first.dataStack == second.dataStack
+
+
+def findCycleEntry(program: compiledProgram, cycles: cycleDetector) -> int:
+    """
+    Finds the first step of a cycle found by a cycle detector. The run is replayed from the state the detection
+    started from, with one replay a cycle length ahead of the other, until both are in the same state. The replays
+    take steps in chunks of cycleEntryChunk, and the last chunk is repeated step by step. The replays don't count the
+    executions of blocks, as the program took these steps before.
+    :param program: Compiled program
+    :param cycles: Cycle detector that found a cycle
+    :return: The number of steps before the program entered the cycle
+    """
+    codelId, pointers, stack, startSteps = cycles.origin
+    # Nothing is read during the replay, and the output was already written
+    streams = ioStreams("", io.StringIO(), False)
+    trailing = machineState(codelId, pointers, (0, 0), list(stack))
+    leading = copyState(trailing)
+    runProgram(program, leading, cycles.cycleLength, streams, countExecutions=False)
+
+    while True:
+        saved = copyState(trailing), copyState(leading)
+        runProgram(program, trailing, cycleEntryChunk, streams, countExecutions=False)
+        runProgram(program, leading, cycleEntryChunk, streams, countExecutions=False)
+        if isSameState(trailing, leading):
+            break
+
+    trailing, leading = saved
+    while not isSameState(trailing, leading):
+        runProgram(program, trailing, 1, streams, countExecutions=False)
+        runProgram(program, leading, 1, streams, countExecutions=False)
+    return startSteps + trailing.steps
+
+
+def getProgramState(inputGraph: graph, state: machineState) -> programState:
+    """
+    Makes a snapshot of the machine state, in the form used by executeFunctions and the GUI
+    :param inputGraph: The graph the program was compiled from
+    :param state: Machine state
+    :return: A new program state, with a copy of the data stack
+    """
+    return programState(inputGraph, position(state.position), direction((state.pointers // 2, state.pointers % 2)), list(state.dataStack))
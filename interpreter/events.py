@@ -0,0 +1,86 @@
+from typing import List
+
+from interpreter.dataStructures import programState
+
+
+class baseEvent():
+    def __init__(self, eventType: str):
+        self.eventType = eventType
+
+    def __str__(self):
+        return "Event type = {}".format(self.eventType)
+
+    def __repr__(self):
+        return str(self)
+
+
+class outputEvent(baseEvent):
+    """
+    Output the program wrote since the previous event
+    """
+    def __init__(self, text: str):
+        super().__init__("output")
+        self.text = text
+
+    def __str__(self):
+        return "{}, text = {!r}".format(super().__str__(), self.text)
+
+
+class inputEvent(baseEvent):
+    """
+    The program wants to read input, but none is left. The inputType is either "number" or "character"
+    """
+    def __init__(self, inputType: str):
+        super().__init__("input")
+        self.inputType = inputType
+
+    def __str__(self):
+        return "{}, input type = {}".format(super().__str__(), self.inputType)
+
+
+class stepsEvent(baseEvent):
+    """
+    A batch of steps has been taken
+    """
+    def __init__(self, steps: int, totalSteps: int):
+        super().__init__("steps")
+        self.steps = steps
+        self.totalSteps = totalSteps
+
+    def __str__(self):
+        return "{}, steps = {}, total steps = {}".format(super().__str__(), self.steps, self.totalSteps)
+
+
+class terminateEvent(baseEvent):
+    """
+    The program terminated, with the given final state
+    """
+    def __init__(self, finalState: programState):
+        super().__init__("terminate")
+        self.finalState = finalState
+
+
+class cycleEvent(baseEvent):
+    """
+    The program repeats a cycle of steps forever, so it never terminates. It entered the cycle at the given step
+    """
+    def __init__(self, currentState: programState, cycleLength: int, cycleEntry: int):
+        super().__init__("cycle")
+        self.currentState = currentState
+        self.cycleLength = cycleLength
+        self.cycleEntry = cycleEntry
+
+    def __str__(self):
+        return "{}, cycle length = {}, entered at step = {}".format(super().__str__(), self.cycleLength, self.cycleEntry)
+
+
+class errorEvent(baseEvent):
+    """
+    The program could not be lexed (possibly with multiple errors), or stopped with a runtime error
+    """
+    def __init__(self, errors: List[BaseException]):
+        super().__init__("error")
+        self.errors = errors
+
+    def __str__(self):
+        return "{}, errors = {}".format(super().__str__(), self.errors)
@@ -1,94 +1,282 @@
 import copy
-from typing import Union, List, Callable
+import io
+import time
+from typing import Union, List, Callable, Generator
 
 import numpy as np
 
-from interpreter import imageFunctions as imageWrapper
 from interpreter import lexer as lexer
+from interpreter import engine as engine
+from interpreter import optimizer as optimizer
+from interpreter import cacheFunctions as cache
+from interpreter import events as events
+from interpreter import transpiler as transpiler
+from interpreter import compiler as compiler
+from interpreter import imageFunctions as imageWrapper
+from interpreter import profileFunctions as profiler
 from interpreter import tokens as tokens
 from interpreter import movementFunctions as movement
-from interpreter import colors as colors
 from interpreter import tokenFunctions as runner
 from interpreter import errors as errors
-from interpreter.dataStructures import programState, position, direction
+from interpreter.compiler import IN_N
+from interpreter.streams import ioStreams
+from interpreter.cycleFunctions import cycleDetector
+from interpreter.dataStructures import programState, machineState, position, direction
 
 
-def interpret(image: np.ndarray) -> Union[programState, List[BaseException]]:
+def interpret(image: np.ndarray, streams: ioStreams = None, detectCycles: bool = False, lazy: bool = False) -> Union[programState, List[BaseException]]:
     """
     Interprets and executes a Piet image
     :param image: Input image
+    :param streams: Input and output of the program. Defaults to interactive input and output on the console
+    :param detectCycles: Whether to stop the program when it repeats a state, in which case it would never terminate
+    :param lazy: Whether to only lex and compile the codels the program reaches, when it reaches them. The compile
+    cache and the optimizer need the whole program, so they are not used
     :return: Either the final state of the program, or a list of exceptions
     """
-    graph = lexer.graphImage(image)
-    if len(graph[1]) > 0:
-        print("The following exceptions occured while making the graph:\n{}".format("".join(list(map(lambda x: "\t{}\n".format(x), graph[1])))))
-        return graph[1]
+    if lazy:
+        newGraph = lexer.graphImage(image, True)
+        if len(newGraph[1]) > 0:
+            print("The following exceptions occured while making the graph:\n{}".format("".join(list(map(lambda x: "\t{}\n".format(x), newGraph[1])))))
+            return newGraph[1]
+        inputGraph = newGraph[0]
+        program = compiler.compileGraph(inputGraph, True)
+    else:
+        compiled = cache.getCompiledProgram(image)
+        if isinstance(compiled, list):
+            print("The following exceptions occured while making the graph:\n{}".format("".join(list(map(lambda x: "\t{}\n".format(x), compiled)))))
+            return compiled
+        inputGraph, program = compiled
+        program.blocks = optimizer.optimizeProgram(program)
 
-    # This is the default programState.
-    startPosition = position((0, 0))
-    pointers = direction((0, 0))
-    PS = programState(graph[0], startPosition, pointers)
+    # Run the program on the flat tables of the compiled engine, starting from the default state
+    state = engine.initialState(program)
+    result = state
+    if not isinstance(state, BaseException):
+        result = engine.runProgram(program, state, streams=streams, cycles=cycleDetector() if detectCycles else None)
+        # Steps taken by the compiled engine count towards the same step counter as takeStep
+        takeStep.counter += state.steps
+        interpret.removedSteps += optimizer.getRemovedSteps(program)
 
-    result = runProgram(image, PS)
     # Check if executed step had an error
     if isinstance(result, BaseException):
         print("The following exception occured while executing the next step:\n{}".format(result))
         return [result]
-    return result
+    if result.cycleLength is not None:
+        print("\nThe program never terminates: from step {} on, it repeats a cycle of {} steps".format(result.cycleEntry, result.cycleLength))
+    return engine.getProgramState(inputGraph, result)
+
+
+# Number of steps that the optimizer folded away, out of the steps counted by takeStep.counter
+interpret.removedSteps = 0
+
+
+def iterExecute(image: np.ndarray, batchSteps: int = 10000, maxSteps: int = None, detectCycles: bool = False) -> Generator[events.baseEvent, Union[bytes, str, None], None]:
+    """
+    Executes a Piet image step batch by step batch, yielding events while it runs. Output is yielded as it is written,
+    after every batch. When the program wants input and none is left, an inputEvent is yielded, and input can be given
+    by sending it into the generator. Continuing without sending input (for example in a for loop) ends the input.
+    :param image: Input image
+    :param batchSteps: Maximum number of steps between two events
+    :param maxSteps: Maximum number of steps to take, or None to run until the program terminates
+    :param detectCycles: Whether to stop the program when it repeats a state, in which case it would never terminate
+    :return: A generator of outputEvents, inputEvents, stepsEvents, and finally a terminateEvent, a cycleEvent or an
+    errorEvent. If maxSteps is reached, the generator stops after the last stepsEvent
+    """
+    compiled = cache.getCompiledProgram(image)
+    if isinstance(compiled, list):
+        yield events.errorEvent(compiled)
+        return
+
+    inputGraph, program = compiled
+    program.blocks = optimizer.optimizeProgram(program)
+    state = engine.initialState(program)
+    if isinstance(state, BaseException):
+        yield events.errorEvent([state])
+        return
+
+    output = io.StringIO()
+    streams = ioStreams("", output, False)
+    inputEnded = False
+    cycles = cycleDetector() if detectCycles else None
+    while maxSteps is None or state.steps < maxSteps:
+        stepsTaken = state.steps
+        result = engine.runProgram(program, state, batchSteps if maxSteps is None else min(batchSteps, maxSteps - state.steps), streams, not inputEnded, cycles)
+
+        if output.tell() > 0:
+            yield events.outputEvent(output.getvalue())
+            output.seek(0)
+            output.truncate()
+        if state.steps > stepsTaken:
+            yield events.stepsEvent(state.steps - stepsTaken, state.steps)
+
+        if isinstance(result, BaseException):
+            yield events.errorEvent([result])
+            return
+        if state.terminated:
+            yield events.terminateEvent(engine.getProgramState(inputGraph, state))
+            return
+        if state.cycleLength is not None:
+            yield events.cycleEvent(engine.getProgramState(inputGraph, state), state.cycleLength, state.cycleEntry)
+            return
+        if state.waitingForInput:
+            inputType = "number" if program.opcodes[state.codelId * 8 + state.pointers] == IN_N else "character"
+            newInput = yield events.inputEvent(inputType)
+            if newInput:
+                streams.feed(newInput)
+            else:
+                # Without new input, this and all later reads find the end of the input
+                inputEnded = True
+
+
+def interpretProfiled(fileName: str, codelSize: int = None, streams: ioStreams = None, heatmapFile: str = None, detectCycles: bool = False) -> Union[programState, List[BaseException]]:
+    """
+    Interprets and executes a Piet image while profiling it, and prints the profile after the program stops. Every
+    transition is counted and timed, so the program runs without the optimizer, and the compile cache is not used so
+    that lexing and compiling are timed as well.
+    :param fileName: Complete filename of the image
+    :param codelSize: Size of a codel in pixels, or None to detect it
+    :param streams: Input and output of the program. Defaults to interactive input and output on the console
+    :param heatmapFile: If given, a heatmap of the time spent per codel is written to this file
+    :param detectCycles: Whether to stop the program when it repeats a state, in which case it would never terminate
+    :return: Either the final state of the program, or a list of exceptions
+    """
+    startTime = time.perf_counter()
+    original = imageWrapper.getImage(fileName)
+    if codelSize is None:
+        codelSize = imageWrapper.getCodelSize(original)
+    image = imageWrapper.downsampleImage(original, codelSize)
+    decodeTime = time.perf_counter() - startTime
+
+    startTime = time.perf_counter()
+    newGraph = lexer.graphImage(image)
+    lexTime = time.perf_counter() - startTime
+    if len(newGraph[1]) > 0:
+        print("The following exceptions occured while making the graph:\n{}".format("".join(list(map(lambda x: "\t{}\n".format(x), newGraph[1])))))
+        return newGraph[1]
+
+    startTime = time.perf_counter()
+    program = compiler.compileGraph(newGraph[0])
+    profile = profiler.executionProfile(len(program.opcodes))
+    profile.phaseTimes.update(decode=decodeTime, lex=lexTime, compile=time.perf_counter() - startTime)
+
+    state = engine.initialState(program)
+    result = state
+    if not isinstance(state, BaseException):
+        startTime = time.perf_counter()
+        result = engine.runProgram(program, state, streams=streams, cycles=cycleDetector() if detectCycles else None, profile=profile)
+        profile.phaseTimes["run"] = time.perf_counter() - startTime
+        takeStep.counter += state.steps
+
+    if not isinstance(result, BaseException) and result.cycleLength is not None:
+        print("\nThe program never terminates: from step {} on, it repeats a cycle of {} steps".format(result.cycleEntry, result.cycleLength))
+    print("\n{}".format(profiler.getProfileTable(profile, program)))
+    if heatmapFile is not None:
+        # The heatmap has the size of the original image, with every codel as large as it was downsampled from
+        profiler.saveHeatmap(heatmapFile, image, program, profile, max(1, codelSize), original.shape[:2])
+
+    if isinstance(result, BaseException):
+        print("The following exception occured while executing the next step:\n{}".format(result))
+        return [result]
+    return engine.getProgramState(newGraph[0], result)
 
 
-def runProgram(image: np.ndarray, PS: programState) -> Union[programState, BaseException]:
+def interpretTranspiled(image: np.ndarray, sourcePath: str = None, name: str = "image", streams: ioStreams = None) -> Union[programState, List[BaseException]]:
+    """
+    Interprets and executes a Piet image, by transpiling it into a python function first. Transpiled images are cached,
+    so running the same image again skips lexing and compiling.
+    :param image: Input image
+    :param sourcePath: If given, the generated python module is written to this path
+    :param name: Name of the image, used in the header of the generated module
+    :param streams: Input and output of the program. Defaults to interactive input and output on the console
+    :return: Either the final state of the program, or a list of exceptions
     """
-    Executes all steps from the image
+    transpiled = transpiler.transpileImage(image, name)
+    if isinstance(transpiled, list):
+        print("The following exceptions occured while making the graph:\n{}".format("".join(list(map(lambda x: "\t{}\n".format(x), transpiled)))))
+        return transpiled
+
+    inputGraph, source, run = transpiled
+    if sourcePath is not None:
+        with open(sourcePath, "w") as sourceFile:
+            sourceFile.write(source)
+
+    codelId = int(inputGraph.labels[0, 0])
+    if codelId == -1:
+        result = errors.inBlackPixelError("Programstate starts in black pixel at {}".format(position((0, 0))))
+    else:
+        state = machineState(codelId, 0, (0, 0))
+        result = run(state, streams=streams)
+        takeStep.counter += state.steps
+
+    if isinstance(result, BaseException):
+        print("The following exception occured while executing the next step:\n{}".format(result))
+        return [result]
+    return engine.getProgramState(inputGraph, result)
+
+
+def runProgram(image: np.ndarray, PS: programState, maxSteps: int = None) -> Union[programState, BaseException]:
+    """
+    Executes steps from the image until the program terminates, or until maxSteps steps have been taken
     :param image: input image
     :param PS: current program state with which to make the next step
+    :param maxSteps: Maximum number of steps to take, or None to run until the program terminates
     :return: Either the last program state, or a runtime exception
     """
+    # Copy the state once, after which every step mutates the same state and stack
     newState = copy.deepcopy(PS)
 
-    if colors.isBlack(imageWrapper.getPixel(image, newState.position)):
+    if lexer.getCodelId(newState.graph, newState.position) == -1:
         return errors.inBlackPixelError("Programstate starts in black pixel at {}".format(newState.position))
 
-    currentCodel = imageWrapper.getCodel(image, newState.position)
-    newGraph = newState.graph.graph
-    graphNode = newGraph[currentCodel]
-    newToken = graphNode.graphNode[newState.direction][0]
+    stepsTaken = 0
+    while maxSteps is None or stepsTaken < maxSteps:
+        if isTerminated(image, newState):
+            return newState
 
-    if isinstance(newToken, tokens.terminateToken):
-        return newState
+        newState = takeStep(image, newState, inPlace=True)
+        if isinstance(newState, BaseException):
+            return newState
+        stepsTaken += 1
 
-    newState = takeStep(image, newState)
-    if isinstance(newState, BaseException):
-        return newState
+    return newState
 
-    return runProgram(image, newState)
+
+def isTerminated(image: np.ndarray, PS: programState) -> bool:
+    """
+    Checks whether the next token of the program state is a terminate token
+    :param image: input image
+    :param PS: current program state
+    :return: True if the program has finished, False otherwise
+    """
+    graphNode = lexer.getGraphNode(PS.graph, PS.position)
+    newToken = graphNode.graphNode[PS.direction][0]
+    return isinstance(newToken, tokens.terminateToken)
 
 
-def countSteps(f: Callable[[np.ndarray, programState], programState]) -> Callable[[np.ndarray, programState], programState]:
+def countSteps(f: Callable[[np.ndarray, programState, bool], programState]) -> Callable[[np.ndarray, programState, bool], programState]:
     """
     A decorator function to count the steps taken in the program
     :param f: original function to call
     :return: A decorated function
     """
-    def inner(image: np.ndarray, PS: programState) -> programState:
+    def inner(image: np.ndarray, PS: programState, inPlace: bool = False) -> programState:
         inner.counter += 1
-        return f(image, PS)
+        return f(image, PS, inPlace)
     inner.counter = 0
     return inner
 
 @countSteps
-def takeStep(image: np.ndarray, PS: programState) -> Union[programState, BaseException]:
+def takeStep(image: np.ndarray, PS: programState, inPlace: bool = False) -> Union[programState, BaseException]:
     """
     Takes a single step from the programstate
     :param image: input image
     :param PS: input programstate
+    :param inPlace: If True, PS and its stack are updated in place. Otherwise the step is taken on a snapshot of PS
     :return: Returns either the resulting programstate, or an exception that occurred
     """
-    newState = copy.deepcopy(PS)
-    currentCodel = imageWrapper.getCodel(image, newState.position)
-
-    newGraph = newState.graph.graph
-    graphNode = newGraph[currentCodel]
+    newState = PS if inPlace else copy.deepcopy(PS)
+    graphNode = lexer.getGraphNode(newState.graph, newState.position)
     newToken = graphNode.graphNode[newState.direction][0]
 
     edgePosition = graphNode.graphNode[newState.direction][1]
@@ -100,10 +288,12 @@ def takeStep(image: np.ndarray, PS: programState) -> Union[programState, BaseExc
         return type(result)("{}, at position {}, direction {}".format(result.args[0], edgePosition,newState.direction))
         # return result
 
-    # If the next token is either white or color, just move along. If the token was black (or terminate), the direction
-    # is already changed, but the position shouldn't move
-    if isinstance(newToken, (tokens.toWhiteToken, tokens.toColorToken)):
+    # If the next token is color, just move along. A white token moves to where the slide through white ends. If the
+    # token was black (or terminate), the direction is already changed, but the position shouldn't move
+    if isinstance(newToken, tokens.toColorToken):
         newState.position = movement.getNextPosition(edgePosition, newState.direction.pointers[0])
+    if isinstance(newToken, tokens.toWhiteToken):
+        newState.position = position(newToken.exitCoords)
 
     # Use the new direction and stack for the next step
     newState.direction = result[0]
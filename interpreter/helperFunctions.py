@@ -1,4 +1,4 @@
-from typing import Union
+from typing import Union, Tuple
 import numpy as np
 
 from interpreter import imageFunctions as imageWrapper
@@ -6,39 +6,109 @@ from interpreter import colors as colors
 from interpreter import movementFunctions as movement
 from interpreter import tokens as tokens
 from interpreter import errors as errors
-from interpreter.dataStructures import edge
+from interpreter.dataStructures import edge, position, direction
 
 
-def edgeToToken(image: np.ndarray, inputEdge: edge) -> Union[tokens.baseLexerToken, BaseException]:
+def edgeToToken(image: np.ndarray, inputEdge: edge, codelSize: int = None, nextColor: int = None) -> Union[tokens.baseLexerToken, BaseException]:
     """
     This function creates a token based on the given edge
-    :param image: input image
+    :param image: color index array of the image (see colors.classifyImage)
     :param inputEdge: an edge containing (coords, direction)
+    :param codelSize: Number of pixels in the codel the edge belongs to. If not given, the codel is searched for
+    :param nextColor: Color of the pixel after the edge, or -1 if that is outside the image. Looked up if not given
     :return: Either a newly created token, or an exception
     """
     if not imageWrapper.boundsChecker(image, inputEdge.edge[0]):
         return IndexError("Edge position {} is not in image".format(inputEdge.edge[0]))
 
     nextPosition = movement.getNextPosition(inputEdge.edge[0], inputEdge.edge[1].pointers[0])
-    if not imageWrapper.boundsChecker(image, nextPosition):
+    if nextColor is None:
+        nextColor = imageWrapper.getPixel(image, nextPosition) if imageWrapper.boundsChecker(image, nextPosition) else -1
+    if nextColor == -1:
         return tokens.toBlackToken("edge")
 
-    pixel = imageWrapper.getPixel(image, nextPosition)
-
-    if colors.isBlack(pixel):
+    if nextColor == colors.BLACK:
         return tokens.toBlackToken("toBlack")
 
-    if colors.isWhite(pixel):
-        return tokens.toWhiteToken()
+    if nextColor == colors.WHITE:
+        return slideToToken(image, nextPosition, inputEdge.edge[1])
 
-    if not colors.isColor(pixel):
+    if nextColor == colors.UNKNOWN:
         return tokens.toBlackToken("Unknown color")
 
-    colorChange = colors.getPixelChange(imageWrapper.getPixel(image, inputEdge.edge[0]), imageWrapper.getPixel(image, nextPosition))
+    colorChange = colors.getColorChange(imageWrapper.getPixel(image, inputEdge.edge[0]), nextColor)
     if isinstance(colorChange, BaseException):
-        # Modify existing error message with location
-        newText = "{} at position {}".format(colorChange.args[0], nextPosition)
-        return errors.UnknownColorError(newText)
+        # The codel we are leaving has an unknown color, so report its location
+        return errors.UnknownColorError("Color at position {} is not recognized as a correct color".format(inputEdge.edge[0]))
 
     tokenType = tokens.getTokenType(colorChange['hueChange'], colorChange['lightChange'])
-    return tokens.toColorToken(tokenType, len(imageWrapper.getCodel(image, inputEdge.edge[0]).codel))
+    if codelSize is None:
+        codelSize = imageWrapper.getCodel(image, inputEdge.edge[0]).size
+    return tokens.toColorToken(tokenType, codelSize)
+
+
+def slideToToken(image: np.ndarray, startPosition: position, inputDirection: direction) -> tokens.baseLexerToken:
+    """
+    Creates the token for sliding through the white area that contains the start position
+    :param image: color index array of the image (see colors.classifyImage)
+    :param startPosition: White pixel from which the slide starts
+    :param inputDirection: Direction in which the slide starts
+    :return: A toWhiteToken with the end of the slide, or a terminateToken if the slide never leaves the white area
+    """
+    slide = slideThroughWhite(image, startPosition, inputDirection)
+    if slide is None:
+        return tokens.terminateToken()
+    return tokens.toWhiteToken(slide[0].coords, slide[1].pointers)
+
+
+def whiteRunLength(image: np.ndarray, startPosition: position, directionPointer: int) -> int:
+    """
+    Counts the number of consecutive white pixels after the start position, along the direction pointer
+    :param image: color index array of the image
+    :param startPosition: Start position
+    :param directionPointer: Direction pointer
+    :return: The number of white pixels
+    """
+    x = startPosition.coords[0]
+    y = startPosition.coords[1]
+    if directionPointer == 0:
+        line = image[y, x + 1:]
+    elif directionPointer == 1:
+        line = image[y + 1:, x]
+    elif directionPointer == 2:
+        line = image[y, :x][::-1]
+    else:
+        line = image[:y, x][::-1]
+
+    nonWhite = np.flatnonzero(line != colors.WHITE)
+    return int(nonWhite[0]) if len(nonWhite) > 0 else len(line)
+
+
+def slideThroughWhite(image: np.ndarray, startPosition: position, inputDirection: direction) -> Union[Tuple[position, direction], None]:
+    """
+    Slides through a white area in a straight line, according to the Piet specification. Whenever the slide is
+    restricted (by a black pixel, an unknown color or the edge of the image), the CC is toggled and the DP is stepped
+    clockwise, after which the slide continues. If a restriction is hit again at the same pixel with the same DP,
+    the slide will never leave the white area.
+    :param image: color index array of the image (see colors.classifyImage)
+    :param startPosition: White pixel from which the slide starts
+    :param inputDirection: Direction in which the slide starts
+    :return: Either a tuple of the colored pixel where the slide ends and the direction at that point, or None
+    """
+    dp = inputDirection.pointers[0]
+    cc = inputDirection.pointers[1]
+    currentPosition = startPosition
+    # A slide can only loop by repeating its restrictions, so only those are remembered
+    restrictions = set()
+    while True:
+        currentPosition = movement.getPositionAtDistance(currentPosition, dp, whiteRunLength(image, currentPosition, dp))
+
+        nextPosition = movement.getNextPosition(currentPosition, dp)
+        if imageWrapper.boundsChecker(image, nextPosition) and imageWrapper.getPixel(image, nextPosition) < colors.WHITE:
+            return (nextPosition, direction((dp, cc)))
+
+        if (currentPosition, dp) in restrictions:
+            return None
+        restrictions.add((currentPosition, dp))
+        cc = movement.flipCC(cc)
+        dp = movement.flipDP(dp)
@@ -1,10 +1,20 @@
-from typing import Union
+import hashlib
+import os
+from typing import Union, List, Tuple
 from PIL import Image
 import numpy as np
 
-import interpreter.colors as colors
+from interpreter import colors as colors
 from interpreter.dataStructures import position, codel
 
+# Extensions of files that are memory mapped if they are binary PGM or PPM files
+netpbmExtensions = (".ppm", ".pgm", ".pnm")
+# Number of bytes read to find the header of a PGM or PPM file
+netpbmHeaderSize = 4096
+
+# Number of pixels compared at once when detecting the codel size
+codelSizeChunk = 1 << 22
+
 
 def boundsChecker(image: np.ndarray, inputPosition: position) -> bool:
     # Position 0 = x-axis, while matrix[0] = y-axis. This is why we compare coords[0] with matrix[1]
@@ -24,64 +34,296 @@ def getPixel(image: np.ndarray, inputPosition: position) -> Union[np.ndarray, bo
     return False
 
 
+def readNetpbmHeader(fileName: str) -> Union[Tuple[str, int, int, int, int], None]:
+    """
+    Reads the header of a binary PGM (P5) or PPM (P6) file
+    :param fileName: Complete filename of the image
+    :return: A tuple of the magic number, width, height, maximum value and the offset of the pixels, or None if the
+    file is not a binary PGM or PPM file
+    """
+    with open(fileName, "rb") as imageFile:
+        header = imageFile.read(netpbmHeaderSize)
+    if header[:2] not in (b"P5", b"P6"):
+        return None
+
+    # The magic number is followed by the width, height and maximum value, separated by whitespace and comments
+    fields = []
+    offset = 2
+    while len(fields) < 3:
+        while offset < len(header) and (header[offset:offset + 1].isspace() or header[offset:offset + 1] == b"#"):
+            if header[offset:offset + 1] == b"#":
+                offset = header.find(b"\n", offset)
+                if offset == -1:
+                    return None
+            offset += 1
+        start = offset
+        while offset < len(header) and header[offset:offset + 1].isdigit():
+            offset += 1
+        if start == offset:
+            return None
+        fields.append(int(header[start:offset]))
+    # A single whitespace character separates the header from the pixels
+    return header[:2].decode(), fields[0], fields[1], fields[2], offset + 1
+
+
+def normalizeImage(image: np.ndarray, maxValue: int = None) -> np.ndarray:
+    """
+    Brings pixel data to the form the interpreter uses, in a single vectorized step. RGB data is scaled to 8 bits per
+    channel and an alpha channel is dropped, as it does not change the color of a pixel. Grayscale data is mapped
+    straight to color indices. Data that is already 8-bit RGB is returned without copying it.
+    :param image: np.ndarray of shape (height, width), (height, width, channels), of unsigned integers, booleans or
+    floats between 0 and 1
+    :param maxValue: The value of a full channel, by default the maximum of the data type (1 for floats)
+    :return: np.ndarray of shape (height, width, 3) with RGB values, or a color index array (see colors.classifyImage)
+    """
+    if image.ndim == 3 and image.shape[2] in (1, 2):
+        # Grayscale, possibly with alpha
+        image = image[:, :, 0]
+    elif image.ndim == 3:
+        image = image[:, :, :3]
+
+    if image.dtype == np.bool_:
+        image = np.where(image, np.uint8(255), np.uint8(0))
+    elif image.dtype.kind == "f":
+        image = np.rint(np.clip(image * (255 / (1 if maxValue is None else maxValue)), 0, 255)).astype(np.uint8)
+    elif image.dtype != np.uint8 or (maxValue is not None and maxValue != 255):
+        if maxValue is None:
+            maxValue = np.iinfo(image.dtype).max
+        image = (image.astype(np.uint64) * 255 // maxValue).astype(np.uint8)
+
+    if image.ndim == 2:
+        return colors.grayLookup[image]
+    return image
+
+
 def getImage(fileName: str) -> np.ndarray:
     """
-    Returns an np.ndarray of the image found at the given file location
+    Returns an np.ndarray of the image found at the given file location. Binary PGM/PPM files and NumPy (.npy) files are
+    memory mapped instead of read, so 8-bit RGB pixels are not copied at all. Images with a palette (such as GIFs) and
+    grayscale images are mapped straight to color indices, through a lookup table of their 256 possible values.
     :param fileName: Complete filename (including extension)
-    :return: np.ndarray of the image
+    :return: np.ndarray of the image, either of shape (height, width, 3) with RGB values, or a color index array of
+    shape (height, width) (see colors.classifyImage)
     """
+    extension = os.path.splitext(fileName)[1].lower()
+    if extension == ".npy":
+        return normalizeImage(np.load(fileName, mmap_mode="r"))
+    if extension in netpbmExtensions:
+        header = readNetpbmHeader(fileName)
+        if header is not None:
+            magic, width, height, maxValue, offset = header
+            shape = (height, width, 3) if magic == "P6" else (height, width)
+            return normalizeImage(np.memmap(fileName, np.uint8 if maxValue < 256 else ">u2", "r", offset, shape), maxValue)
+
     image = Image.open(fileName)
-    if fileName.split('.')[-1] == "gif":
-        image = image.convert("RGB")
-    return np.array(image)
+    if image.mode == "P":
+        palette = np.array(image.getpalette("RGB") or [], dtype=np.uint8).reshape(-1, 3)
+        return colors.makePaletteLookup(palette)[np.asarray(image)]
+    if image.mode in ("1", "L", "LA", "RGB", "RGBA", "I;16", "I;16B", "I;16L"):
+        return normalizeImage(np.asarray(image))
+    if image.mode == "I":
+        # 32-bit integer images hold 16-bit grayscale values
+        return normalizeImage(np.asarray(image), 65535)
+    return normalizeImage(np.asarray(image.convert("RGB")))
 
 
-def getCodel(image: np.ndarray, inputPosition: position, foundPixels: codel = None) -> codel:
+def getImageHash(image: np.ndarray) -> str:
     """
-    This function finds all adjacent pixels with the same color as the pixel on the given coords
+    Hashes the pixels, the shape and the data type of an image
+    :param image: np.ndarray of image
+    :return: Hexadecimal digest
+    """
+    digest = hashlib.sha256(np.ascontiguousarray(image).data)
+    digest.update(repr((image.shape, image.dtype.str)).encode())
+    return digest.hexdigest()
+
+
+def getCodelSize(image: np.ndarray) -> int:
+    """
+    Detects the size of the codels of an image, as the greatest common divisor of the lengths of all runs of the same
+    color along the rows and columns. Since every run starts at a multiple of the codel size, this is the greatest
+    common divisor of the width, the height and every position where the color changes.
+    :param image: np.ndarray of image
+    :return: The width and height of a codel, in pixels
+    """
+    pixels = image if image.ndim == 3 else image[:, :, np.newaxis]
+    # Compare the image a block of rows at a time, so that large (memory mapped) images are never compared as a whole
+    rowsPerChunk = max(1, codelSizeChunk // max(1, pixels.shape[1] * pixels.shape[2]))
+    xChanged = np.zeros(max(0, pixels.shape[1] - 1), dtype=bool)
+    yChanges = []
+    for start in range(0, pixels.shape[0], rowsPerChunk):
+        # Every block includes the last row of the previous block, to find changes between the blocks
+        rows = np.asarray(pixels[max(0, start - 1):start + rowsPerChunk])
+        xChanged |= np.any(rows[:, 1:] != rows[:, :-1], axis=(0, 2))
+        yChanges.append(np.flatnonzero(np.any(rows[1:] != rows[:-1], axis=(1, 2))) + max(1, start))
+    xChanges = np.flatnonzero(xChanged) + 1
+    return int(np.gcd.reduce(np.concatenate(([image.shape[1], image.shape[0]], xChanges, *yChanges)).astype(np.int64)))
 
-    If you pass a white pixel, this will return a set with only the white pixel in it.
 
-    :param image: The image with all pixel values
-    :param coords: Starting coords
-    :param foundPixels: currently found pixels
-    :return: A Set with all positions of same-colored pixels (Also known as a codel)
+def downsampleImage(image: np.ndarray, codelSize: int = None) -> np.ndarray:
+    """
+    Shrinks the image to one pixel per codel, by taking the top left pixel of each codel
+    :param image: np.ndarray of image
+    :param codelSize: The width and height of a codel in pixels, or None to detect it
+    :return: np.ndarray of the downsampled image
     """
-    if foundPixels is None:
-        foundPixels = codel(set())
+    if codelSize is None:
+        codelSize = getCodelSize(image)
+    if codelSize <= 1:
+        return image
+    return np.ascontiguousarray(image[::codelSize, ::codelSize])
 
-    # If this coords is already in the set, it has already been traversed
-    if inputPosition in foundPixels.codel:
-        return foundPixels
 
-    # Adjacent white colors don't form a codel
-    if colors.isWhite(getPixel(image, inputPosition)):
-        foundPixels.codel.add(inputPosition)
-        return foundPixels
+def getCodel(image: np.ndarray, inputPosition: position) -> codel:
+    """
+    This function finds all adjacent pixels with the same color as the pixel on the given coords
 
-    x = inputPosition.coords[0]
-    y = inputPosition.coords[1]
+    :param image: The color index array of the image (see colors.classifyImage)
+    :param inputPosition: Starting coords
+    :return: The codel of all same-colored pixels, in a label map of its own in which it has id 0
+    """
+    color = image[inputPosition.coords[1]][inputPosition.coords[0]]
+    foundPixels = {inputPosition}
+    # Pixels of which the neighbours still have to be checked, instead of recursing into each of them
+    pixelStack = [inputPosition]
+    while len(pixelStack) > 0:
+        x, y = pixelStack.pop().coords
+        # right, below, left, above
+        for newPosition in (position((x + 1, y)), position((x, y - 1)), position((x - 1, y)), position((x, y + 1))):
+            if newPosition not in foundPixels and boundsChecker(image, newPosition) and \
+                    image[newPosition.coords[1]][newPosition.coords[0]] == color:
+                foundPixels.add(newPosition)
+                pixelStack.append(newPosition)
 
-    foundPixels.codel.add(inputPosition)
+    xs = np.array(list(map(lambda foundPosition: foundPosition.coords[0], foundPixels)))
+    ys = np.array(list(map(lambda foundPosition: foundPosition.coords[1], foundPixels)))
+    labels = np.full(image.shape[:2], -1, dtype=np.int32)
+    labels[ys, xs] = 0
+    return codel(labels, 0, (int(xs.min()), int(ys.min()), int(xs.max()), int(ys.max())), len(foundPixels))
 
-    # right
-    if boundsChecker(image, position((x + 1, y))) and np.all(image[y][x + 1] == image[y][x]):
-        newPosition = position((inputPosition.coords[0] + 1, inputPosition.coords[1]))
-        foundPixels = codel(foundPixels.codel.union(getCodel(image, newPosition, foundPixels).codel))
 
-    # below
-    if boundsChecker(image, position((x, y - 1))) and np.all(image[y - 1][x] == image[y][x]):
-        newPosition = position((inputPosition.coords[0], inputPosition.coords[1] - 1))
-        foundPixels = codel(foundPixels.codel.union(getCodel(image, newPosition, foundPixels).codel))
+def getCodelOutline(inputCodel: codel) -> List[List[Tuple[int, int]]]:
+    """
+    Traces the outline of a codel along the sides of its pixels. Each boundary is followed with the codel on its
+    right, turning right where the codel touches itself at a corner. The outer boundary comes first, followed by the
+    boundary of every hole in the codel.
+    :param inputCodel: The codel
+    :return: List of closed loops, each a list of the corners (x, y) of a boundary that ends at its first corner, in
+    pixel units, where (x, y) is the top left corner of pixel (x, y)
+    """
+    minX, minY = inputCodel.bounds[0], inputCodel.bounds[1]
+    mask = np.pad(inputCodel.getMask(), 1)
+    inside = mask[1:-1, 1:-1]
+    # The sides of every pixel that border a pixel outside the codel, as (start corner, end corner), in the order top,
+    # right, bottom, left, all going clockwise around the pixel
+    sides = {}
+    for outside, start, end in ((mask[:-2, 1:-1], (0, 0), (1, 0)), (mask[1:-1, 2:], (1, 0), (1, 1)),
+                                (mask[2:, 1:-1], (1, 1), (0, 1)), (mask[1:-1, :-2], (0, 1), (0, 0))):
+        ys, xs = np.nonzero(inside & ~outside)
+        for x, y in zip((xs + minX).tolist(), (ys + minY).tolist()):
+            sides.setdefault((x + start[0], y + start[1]), []).append((x + end[0], y + end[1]))
+
+    loops = []
+    while len(sides) > 0:
+        # Start from the top left corner that is left, so the first loop is the outer boundary
+        corner = min(sides, key=lambda lambdaCorner: (lambdaCorner[1], lambdaCorner[0]))
+        loop = [corner]
+        heading = None
+        while corner in sides:
+            ends = sides[corner]
+            nextCorner = ends[0]
+            if heading is not None and len(ends) > 1:
+                # Turn right (towards the codel) where two sides leave the same corner
+                rightTurn = (corner[0] - heading[1], corner[1] + heading[0])
+                nextCorner = rightTurn if rightTurn in ends else nextCorner
+            ends.remove(nextCorner)
+            if len(ends) == 0:
+                del sides[corner]
+            heading = (nextCorner[0] - corner[0], nextCorner[1] - corner[1])
+            corner = nextCorner
+            loop.append(corner)
+        # Only keep the corners where the outline turns. The first corner is the top left one of the loop, where it
+        # always turns
+        corners = [loop[0]]
+        for previous, current, following in zip(loop, loop[1:], loop[2:]):
+            if (current[0] - previous[0], current[1] - previous[1]) != (following[0] - current[0], following[1] - current[1]):
+                corners.append(current)
+        loops.append(corners + [corners[0]])
+    return loops
+
+
+def joinRuns(runCount: int, upper: np.ndarray, lower: np.ndarray) -> np.ndarray:
+    """
+    Joins pairs of runs into areas, working on all pairs at once. Every pass hooks the root of the higher run of every
+    pair that isn't joined yet onto the root of the lower run. The hooked roots then jump to their new root, and every
+    run jumps to the new root of its root. Pairs that are joined are left out of the next pass.
+    :param runCount: Number of runs
+    :param upper: Id of the first run of every pair
+    :param lower: Id of the second run of every pair
+    :return: The lowest run id of the area of every run
+    """
+    roots = np.arange(runCount, dtype=np.int64)
+    while upper.size > 0:
+        upperRoots = roots[upper]
+        lowerRoots = roots[lower]
+        apart = upperRoots != lowerRoots
+        if not apart.any():
+            break
+        upper, lower = upper[apart], lower[apart]
+        upperRoots, lowerRoots = upperRoots[apart], lowerRoots[apart]
+        # Roots only get a lower parent, so the runs always form a forest
+        hooked = np.maximum(upperRoots, lowerRoots)
+        np.minimum.at(roots, hooked, np.minimum(upperRoots, lowerRoots))
+        parents = roots[hooked]
+        while hooked.size > 0:
+            grandparents = roots[parents]
+            moved = grandparents != parents
+            hooked, parents = hooked[moved], grandparents[moved]
+            roots[hooked] = parents
+        roots = roots[roots]
+    return roots
+
+
+def labelImage(image: np.ndarray, ignoredColor: int) -> Tuple[np.ndarray, int]:
+    """
+    Labels the connected areas of same-colored pixels with array operations only. The image is split into runs of the
+    same color along its rows, or along its columns if that gives fewer runs (as in an image of vertical stripes).
+    Runs that touch the run before them in the next row (or column) with the same color are joined by joinRuns. Ids
+    are given in reading order of the first pixel of each area.
+    :param image: The color index array of the image (see colors.classifyImage)
+    :param ignoredColor: Color index of pixels that don't belong to any area (black)
+    :return: A tuple of the label map (-1 for ignored pixels) and the number of areas
+    """
+    height, width = image.shape[0], image.shape[1]
+    transposed = np.count_nonzero(image[1:] != image[:-1]) + width < np.count_nonzero(image[:, 1:] != image[:, :-1]) + height
+    lines = np.ascontiguousarray(image.T) if transposed else image
 
-    # left
-    if boundsChecker(image, position((x - 1, y))) and np.all(image[y][x - 1] == image[y][x]):
-        newPosition = position((inputPosition.coords[0] - 1, inputPosition.coords[1]))
-        foundPixels = codel(foundPixels.codel.union(getCodel(image, newPosition, foundPixels).codel))
+    # A run starts at the start of every line, and wherever the color changes
+    runStarts = np.ones(lines.shape, dtype=bool)
+    runStarts[:, 1:] = lines[:, 1:] != lines[:, :-1]
+    runIds = np.cumsum(runStarts.ravel()).reshape(lines.shape) - 1
+    runCount = int(runIds[-1, -1]) + 1 if runIds.size > 0 else 0
+    firstPixels = np.flatnonzero(runStarts.ravel())
+    runColors = lines.ravel()[firstPixels]
 
-    # above
-    if boundsChecker(image, position((x, y + 1))) and np.all(image[y + 1][x] == image[y][x]):
-        newPosition = position((inputPosition.coords[0], inputPosition.coords[1] + 1))
-        foundPixels = codel(foundPixels.codel.union(getCodel(image, newPosition, foundPixels).codel))
+    # Join touching runs of the same color in consecutive lines. Two touching runs also touch where one of them
+    # starts, so only those pixels have to be checked
+    touching = (lines[1:] == lines[:-1]) & (lines[1:] != ignoredColor) & (runStarts[1:] | runStarts[:-1])
+    roots = joinRuns(runCount, runIds[:-1][touching], runIds[1:][touching])
 
-    return foundPixels
+    # Roots are the first run of their area, so numbering them in order keeps the reading order of the lines
+    isRun = runColors != ignoredColor
+    isArea = (roots == np.arange(runCount)) & isRun
+    areaCount = int(np.count_nonzero(isArea))
+    areaIds = (np.cumsum(isArea) - 1)[roots]
+    if transposed and areaCount > 0:
+        # Every column run starts at its top pixel, so the first pixel of an area is the first start of its runs
+        startIndices = (firstPixels % height) * width + firstPixels // height
+        areaStarts = np.full(areaCount, height * width, dtype=np.int64)
+        np.minimum.at(areaStarts, areaIds[isRun], startIndices[isRun])
+        order = np.empty(areaCount, dtype=np.int64)
+        order[np.argsort(areaStarts)] = np.arange(areaCount)
+        areaIds = order[areaIds]
+    runLabels = np.where(isRun, areaIds, -1).astype(np.int32)
+    labels = runLabels[runIds]
+    return (np.ascontiguousarray(labels.T) if transposed else labels), areaCount
@@ -1,5 +1,4 @@
 from typing import List, Union, Tuple
-import copy
 import numpy as np
 
 import interpreter.colors as colors
@@ -7,7 +6,10 @@ import interpreter.imageFunctions as imageWrapper
 import interpreter.tokens as tokens
 import interpreter.helperFunctions as helperFunctions
 import interpreter.movementFunctions as movement
-from interpreter.dataStructures import position, codel, edge, graphNode, graph, direction
+from interpreter.dataStructures import position, codel, edge, graphNode, graph, direction, lazyList
+
+# Get a list of all possible directions (0,0), (0,1), (1,0) etc...
+edgePointers = list(map(lambda i: direction((i % 4, int(i / 4))), iter(range(8))))
 
 
 def cyclePosition(image: np.ndarray, startPosition: position) -> Union[position, bool]:
@@ -26,40 +28,148 @@ def cyclePosition(image: np.ndarray, startPosition: position) -> Union[position,
     return position((startPosition.coords[0] + 1, startPosition.coords[1]))
 
 
-def getCodels(image: np.ndarray, positionList: List[position]) -> List[codel]:
+def getCodelRuns(labels: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Splits the rows of the label map into runs of the same codel
+    :param labels: Label map, in which each pixel holds the id of its codel (-1 for black pixels)
+    :return: The flat indices of the first and the last pixel of every run, and the codel id of every run, for all runs
+    that belong to a codel in reading order
+    """
+    runStarts = np.ones(labels.shape, dtype=bool)
+    runStarts[:, 1:] = labels[:, 1:] != labels[:, :-1]
+    runEnds = np.ones(labels.shape, dtype=bool)
+    runEnds[:, :-1] = runStarts[:, 1:]
+    starts = np.flatnonzero(runStarts)
+    ends = np.flatnonzero(runEnds)
+    runLabels = labels.ravel()[starts]
+    inCodel = runLabels >= 0
+    return starts[inCodel], ends[inCodel], runLabels[inCodel]
+
+
+def getCodelBounds(labels: np.ndarray, codelCount: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Finds the bounding box and the number of pixels of every codel, from the runs of equal labels along the rows
+    :param labels: Label map, in which each pixel holds the id of its codel (-1 for black pixels)
+    :param codelCount: Number of codels in the label map
+    :return: An array of (minX, minY, maxX, maxY) per codel, and an array of the number of pixels per codel
+    """
+    if codelCount == 0:
+        return np.zeros((0, 4), dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+    height, width = labels.shape
+    starts, ends, runLabels = getCodelRuns(labels)
+    sizes = np.bincount(runLabels, weights=ends - starts + 1, minlength=codelCount).astype(np.int64)
+
+    # Every bound is the minimum or maximum over the runs of a codel, gathered per codel id without sorting the runs
+    bounds = np.empty((codelCount, 4), dtype=np.int64)
+    bounds[:, :2] = (width, height)
+    bounds[:, 2:] = -1
+    np.minimum.at(bounds[:, 0], runLabels, starts % width)
+    np.minimum.at(bounds[:, 1], runLabels, starts // width)
+    np.maximum.at(bounds[:, 2], runLabels, ends % width)
+    np.maximum.at(bounds[:, 3], runLabels, ends // width)
+    return bounds, sizes
+
+
+def getFirstAndLastRuns(selected: np.ndarray, runLabels: np.ndarray, codelCount: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Finds the first and the last selected run of every codel, in reading order
+    :param selected: Whether each run is selected, at least one run of every codel has to be
+    :param runLabels: Codel id of every run
+    :param codelCount: Number of codels
+    :return: The index of the first and of the last selected run, indexed by codel id
+    """
+    indices = np.flatnonzero(selected)
+    selectedLabels = runLabels[indices]
+    firstRuns = np.full(codelCount, len(runLabels), dtype=np.int64)
+    lastRuns = np.full(codelCount, -1, dtype=np.int64)
+    np.minimum.at(firstRuns, selectedLabels, indices)
+    np.maximum.at(lastRuns, selectedLabels, indices)
+    return firstRuns, lastRuns
+
+
+def getCodelEdges(image: np.ndarray, labels: np.ndarray, bounds: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
     """
-    Makes a list of codels from an image and a lits of positions to check
-    :param image: an np.ndarray representing the image
-    :param positionList: A list of positions, for which to find adjacent pixels of the same color
-    :return: A list of codels found in the given image
+    Finds the edge pixel of every codel for all 8 directions at once (see movementFunctions.findEdge), together with
+    the color of the pixel just past it. The furthest column or row of a codel in a direction is a side of its bounding
+    box, so only the runs that touch that side are needed, after which the codel chooser picks the first or the last
+    of them in reading order
+    :param image: The color index array of the image (see colors.classifyImage)
+    :param labels: Label map, in which each pixel holds the id of its codel (-1 for black pixels)
+    :param bounds: Bounding box (minX, minY, maxX, maxY) of every codel, see getCodelBounds
+    :return: An array of the edge pixels (x, y) and an array of the colors of the next pixels (-1 outside the image),
+    both indexed by [codelId, DP * 2 + CC]
     """
-    if len(positionList) == 0:
-        return []
+    height, width = labels.shape
+    edgePixels = np.zeros((len(bounds), 8, 2), dtype=np.int64)
+    if len(bounds) == 0:
+        return edgePixels, np.zeros((0, 8), dtype=np.int64)
 
-    copiedList = positionList.copy()
-    newPosition = copiedList.pop(0)
+    starts, ends, runLabels = getCodelRuns(labels)
+    startXs, endXs, ys = starts % width, ends % width, starts // width
+    minX, minY, maxX, maxY = bounds[:, 0], bounds[:, 1], bounds[:, 2], bounds[:, 3]
 
-    if colors.isBlack(imageWrapper.getPixel(image, newPosition)):
-        return getCodels(image, copiedList)
+    # Right side, from the top down
+    firstRuns, lastRuns = getFirstAndLastRuns(endXs == maxX[runLabels], runLabels, len(bounds))
+    edgePixels[:, 0] = np.stack((maxX, ys[firstRuns]), axis=1)
+    edgePixels[:, 1] = np.stack((maxX, ys[lastRuns]), axis=1)
+    # Bottom side, from the left to the right
+    firstRuns, lastRuns = getFirstAndLastRuns(ys == maxY[runLabels], runLabels, len(bounds))
+    edgePixels[:, 2] = np.stack((endXs[lastRuns], maxY), axis=1)
+    edgePixels[:, 3] = np.stack((startXs[firstRuns], maxY), axis=1)
+    # Left side, from the top down
+    firstRuns, lastRuns = getFirstAndLastRuns(startXs == minX[runLabels], runLabels, len(bounds))
+    edgePixels[:, 4] = np.stack((minX, ys[lastRuns]), axis=1)
+    edgePixels[:, 5] = np.stack((minX, ys[firstRuns]), axis=1)
+    # Top side, from the left to the right
+    firstRuns, lastRuns = getFirstAndLastRuns(ys == minY[runLabels], runLabels, len(bounds))
+    edgePixels[:, 6] = np.stack((startXs[firstRuns], minY), axis=1)
+    edgePixels[:, 7] = np.stack((endXs[lastRuns], minY), axis=1)
 
-    newCodel = imageWrapper.getCodel(image, newPosition)
+    # Step from every edge pixel along the direction pointer
+    offsets = np.repeat(np.array([(1, 0), (0, 1), (-1, 0), (0, -1)]), 2, axis=0)
+    nextXs = edgePixels[:, :, 0] + offsets[:, 0]
+    nextYs = edgePixels[:, :, 1] + offsets[:, 1]
+    inImage = (nextXs >= 0) & (nextXs < width) & (nextYs >= 0) & (nextYs < height)
+    nextColors = np.where(inImage, image[np.clip(nextYs, 0, height - 1), np.clip(nextXs, 0, width - 1)].astype(np.int64), -1)
+    return edgePixels, nextColors
 
-    # Remove found positions from coords list
-    copiedList = list(set(copiedList) - newCodel.codel)
-    codelList = getCodels(image, copiedList)
 
-    codelList.append(newCodel)
-    return codelList
+def getCodels(labels: np.ndarray, codelCount: int) -> List[codel]:
+    """
+    Makes a list of codels from the label map of an image
+    :param labels: Label map, in which each pixel holds the id of its codel (-1 for black pixels)
+    :param codelCount: Number of codels in the label map
+    :return: A list of codels, where the index of each codel is its id
+    """
+    bounds, sizes = getCodelBounds(labels, codelCount)
+    return list(map(lambda codelId, codelBounds, size: codel(labels, codelId, tuple(codelBounds), size), range(codelCount), bounds.tolist(), sizes.tolist()))
+
+
+def getLazyCodels(labels: np.ndarray, codelCount: int) -> lazyList:
+    """
+    Makes a lazy list of codels from the label map of an image, in which each codel is made when it is first used
+    :param labels: Label map, in which each pixel holds the id of its codel (-1 for black pixels)
+    :param codelCount: Number of codels in the label map
+    :return: A lazy list of codels, where the index of each codel is its id
+    """
+    bounds, sizes = getCodelBounds(labels, codelCount)
+    bounds, sizes = bounds.tolist(), sizes.tolist()
+    return lazyList(codelCount, lambda codelId: codel(labels, codelId, tuple(bounds[codelId]), sizes[codelId]))
 
 
-def edgesToGraphNode(image: np.ndarray, edges: List[edge]) -> Tuple[graphNode, List[BaseException]]:
+def edgesToGraphNode(image: np.ndarray, edges: List[edge], codelSize: int = None, nextColors: List[int] = None) -> Tuple[graphNode, List[BaseException]]:
     """
     Constructs a dictionary with each pointer possibility as key and (token, coords) as value
     :param image: Image required to find calculate tokens
     :param edges: List[Tuple[coords, pointers]]
+    :param codelSize: Number of pixels in the codel the edges belong to, if known
+    :param nextColors: Color of the pixel after each edge (-1 outside the image), if known
     :return: A graphNode containing tokens for each edge given, and a list of exceptions occurred during creation
     """
-    node = graphNode(dict(map(lambda x, lambdaImage=image: (x.edge[1], (helperFunctions.edgeToToken(lambdaImage, x), x.edge[0])), edges)))
+    if nextColors is None:
+        nextColors = [None] * len(edges)
+    node = graphNode(dict(map(lambda x, nextColor, lambdaImage=image: (x.edge[1], (helperFunctions.edgeToToken(lambdaImage, x, codelSize, nextColor), x.edge[0])), edges, nextColors)))
     # Extract the exceptions from each edge
     exceptions = list(map(lambda x: x[1][0], filter(lambda graphNodeItem: isinstance(graphNodeItem[1][0], BaseException), node.graphNode.items())))
     return (node, exceptions)
@@ -83,18 +193,35 @@ def graphNodeToTerminate(inputNode: graphNode) -> graphNode:
     return graphNode(dict(map(lambda x: (x[0], (tokens.terminateToken(), x[1][1])), inputNode.graphNode.items())))
 
 
-def codelToGraphNode(image: np.ndarray, inputCodel: codel, edgePointers: List[direction]) -> Tuple[graphNode, List[BaseException]]:
+def codelToGraphNode(image: np.ndarray, inputCodel: codel, edgePointers: List[direction], edgePixels: List[List[int]] = None, nextColors: List[int] = None) -> Tuple[graphNode, List[BaseException]]:
     """
     :param image: image
-    :param inputCodel: set of positions within the same color
+    :param inputCodel: area of adjacent pixels with the same color
     :param edgePointers: list of pointers to find tokens for
+    :param edgePixels: The edge pixel [x, y] of the codel for every direction, indexed by DP * 2 + CC (see
+    getCodelEdges). Found with movementFunctions.findEdge if not given
+    :param nextColors: The color of the pixel after every edge pixel, indexed like edgePixels
     :return: A dictionary with each pointer possibility as key and (token, coords) as value, and a list of exceptions
     """
-    # make codel immutable
-    copiedCodel = copy.copy(inputCodel)
-    # Find all edges along the codel and edgepointers
-    edges = list(map(lambda pointers, lambdaCodel=copiedCodel: edge((movement.findEdge(lambdaCodel, pointers), pointers)), edgePointers))
-    newGraphNode = edgesToGraphNode(image, edges)
+    # White codels are only left by sliding, which is computed from their first pixel (in reading order). The program
+    # can only rest inside a white codel when it starts there, in which case this is the top left pixel
+    firstPosition = inputCodel.getFirstPosition()
+    if imageWrapper.getPixel(image, firstPosition) == colors.WHITE:
+        return (graphNode(dict(map(lambda pointers: (pointers, (helperFunctions.slideToToken(image, firstPosition, pointers), firstPosition)), edgePointers))), [])
+
+    # Find all edges along the codel and edgepointers. Directions often end at the same pixel, which is then only stored
+    # once
+    edgePositions = {}
+    edges = []
+    for pointers in edgePointers:
+        if edgePixels is None:
+            edgePosition = movement.findEdge(inputCodel, pointers)
+        else:
+            edgePosition = position(tuple(edgePixels[pointers.pointers[0] * 2 + pointers.pointers[1]]))
+        edges.append(edge((edgePositions.setdefault(edgePosition.coords, edgePosition), pointers)))
+    if nextColors is not None:
+        nextColors = list(map(lambda pointers: nextColors[pointers.pointers[0] * 2 + pointers.pointers[1]], edgePointers))
+    newGraphNode = edgesToGraphNode(image, edges, inputCodel.size, nextColors)
 
     # If there were exceptions in the graph node, there is no need to terminate them
     if len(newGraphNode[1]) > 0:
@@ -106,43 +233,63 @@ def codelToGraphNode(image: np.ndarray, inputCodel: codel, edgePointers: List[di
 
     return newGraphNode
 
-def codelsToGraph(image: np.ndarray, codels: List[codel]) -> Tuple[graph, List[BaseException]]:
+def codelsToGraph(image: np.ndarray, codels: List[codel], labels: np.ndarray) -> Tuple[graph, List[BaseException]]:
     """
-    Converts a list of codels into a graph
+    Converts a list of codels into a graph, where the index of each codel in the list is used as its id
     :param image: Input image
     :param codels: Input list of codels
+    :param labels: Label map, in which each pixel holds the id of its codel (-1 for black pixels)
     :return: A tuple of a graph and a list of exceptions
     """
-    codels = codels.copy()
-    # Get an iterator of all possible directions (0,0), (0,1), (1,0) etc...
-    edgePointers = list(map(lambda i: direction((i % 4, int(i / 4))), iter(range(8))))
+    # Find the edges of all codels at once
+    bounds = np.array(list(map(lambda lambdaCodel: lambdaCodel.bounds, codels)), dtype=np.int64).reshape(-1, 4)
+    edgePixels, nextColors = getCodelEdges(image, labels, bounds)
+    newNodes = list(map(lambda lambdaCodel, codelId: codelToGraphNode(image, lambdaCodel, edgePointers, edgePixels[codelId].tolist(), nextColors[codelId].tolist()), codels, range(len(codels))))
+    errorList = [error for newNode in newNodes for error in newNode[1]]
 
-    # If no more codels are to be graphed, return
-    if len(codels) == 0:
-        newGraph = graph(dict())
-        return (newGraph, [])
+    newGraph = graph(list(codels), list(map(lambda newNode: newNode[0], newNodes)), labels)
+    return (newGraph, errorList)
 
-    newNode = codelToGraphNode(image, codels[0], edgePointers)
-    newGraph = codelsToGraph(image, codels[1:])
-    newGraph[0].graph[codels[0]] = newNode[0]
 
-    errorList = newNode[1]
-    errorList.extend(newGraph[1])
-    return (newGraph[0], errorList)
+def getCodelId(inputGraph: graph, inputPosition: position) -> int:
+    """
+    Looks up the id of the codel at the given position in the label map of the graph
+    :param inputGraph: Lexed graph
+    :param inputPosition: Position within the image
+    :return: The codel id, or -1 if the position is not part of a codel (black pixels)
+    """
+    return int(inputGraph.labels[inputPosition.coords[1], inputPosition.coords[0]])
 
 
-def graphImage(image: np.ndarray) -> Tuple[graph, List[BaseException]]:
+def getGraphNode(inputGraph: graph, inputPosition: position) -> graphNode:
+    """
+    Finds the graph node of the codel at the given position
+    :param inputGraph: Lexed graph
+    :param inputPosition: Position within the image
+    :return: The graph node of the codel containing the position
     """
-    Returns a dict with hashes of each codel as keys, and a codelDict as value. That codelDict contains hashed pointers (Tuple[int, int]) as keys to tokens as values.
-    :param image:
-    :return:
+    return inputGraph.nodes[getCodelId(inputGraph, inputPosition)]
+
+
+def graphImage(image: np.ndarray, lazy: bool = False) -> Tuple[graph, List[BaseException]]:
     """
-    coords = np.ndindex(image.shape[1], image.shape[0])
-    # Converts tuples of coordinates into position objects
-    positions = map(position, coords)
-    # Makes a list of non-black pixel positions
-    nonBlackPositions = list(filter(lambda pos: not colors.isBlack(imageWrapper.getPixel(image, pos)), positions))
-    # Gets all codels from all non-black pixel positions
-    allCodels = getCodels(image, nonBlackPositions)
+    Lexes the image into a graph of codels. Each codel gets a graphNode, which contains pointers (Tuple[int, int]) as keys to tokens as values.
+    :param image: Input image
+    :param lazy: If True, only the label map is made right away, and the codels and nodes are lazy lists. Only codels
+    of an unknown color can have exceptions, so only those are lexed right away, to return the same exceptions
+    :return: A tuple of the graph (including its label map) and a list of exceptions
+    """
+    # Classify all pixels once, the rest of the lexer only works with color indices
+    colorMap = colors.classifyImage(image)
+    # Label the codels of all non-black pixels
+    labels, codelCount = imageWrapper.labelImage(colorMap, colors.BLACK)
+    if lazy:
+        lazyCodels = getLazyCodels(labels, codelCount)
+        lazyNodes = lazyList(codelCount, lambda codelId: codelToGraphNode(colorMap, lazyCodels[codelId], edgePointers)[0])
+        unknownIds = np.unique(labels[colorMap == colors.UNKNOWN]).tolist()
+        errorList = [error for codelId in unknownIds for error in codelToGraphNode(colorMap, lazyCodels[codelId], edgePointers)[1]]
+        return (graph(lazyCodels, lazyNodes, labels), errorList)
+
+    allCodels = getCodels(labels, codelCount)
     # Makes a graph with the codel as key, and the node as value
-    return codelsToGraph(image, allCodels)
+    return codelsToGraph(colorMap, allCodels, labels)
@@ -1,6 +1,8 @@
 from typing import Union
 import operator
 
+import numpy as np
+
 from interpreter.dataStructures import direction, position, codel
 
 def getDP(directionPointer: int) -> str:
@@ -85,12 +87,15 @@ def flipDP(directionPointer: int) -> int:
     return 0
 
 def flipDPInvert(directionPointer: int, count = 0) -> int:
+    """
+    Cycles the directionpointer counter clockwise -count times: 0 -> 3, 3 -> 2, 2 -> 1, 1 -> 0
+    :param directionPointer: unflipped directionPointer
+    :param count: Negative number of turns. Non-negative counts leave the directionpointer unchanged
+    :return: new DirectionPointer
+    """
     if count >= 0:
         return directionPointer
-    else:
-        if directionPointer != 0:
-            return flipDPInvert(directionPointer - 1, count + 1)
-        return flipDPInvert(3, count + 1)
+    return (directionPointer + count) % 4
 
 def flip(inputDirection: direction) -> direction:
     """
@@ -129,6 +134,18 @@ def getNextPosition(startPosition: position, directionPointer: int) -> Union[pos
     return KeyError("Given key {} is no valid Direction Pointer (0, 1, 2, or 3)".format(directionPointer))
 
 
+def getPositionAtDistance(startPosition: position, directionPointer: int, distance: int) -> position:
+    """
+    Finds the position at a distance along the direction pointer
+    :param startPosition: start position
+    :param directionPointer: direction pointer
+    :param distance: number of pixels to move
+    :return: new position
+    """
+    offsets = [(1, 0), (0, 1), (-1, 0), (0, -1)]
+    return position((startPosition.coords[0] + offsets[directionPointer][0] * distance, startPosition.coords[1] + offsets[directionPointer][1] * distance))
+
+
 def getPreviousPosition(startPosition: position, directionPointer: int) -> position:
     """
     Inverts the directionPointer, and finds the next position
@@ -147,52 +164,35 @@ def getPreviousPosition(startPosition: position, directionPointer: int) -> posit
 
 def findEdge(inputCodel: codel, inputDirection: direction) -> Union[position, bool]:
     """
-    Finds the edge of the codel according to the direction pointer and the codel chooser
-    :param inputCodel: Set of adjacent positions with the same color
-    :param pointers: Tuple where pointers[0] = DP and pointers[1] = CC
+    Finds the edge of the codel according to the direction pointer and the codel chooser. The furthest row or column of
+    the codel is a side of its bounding box, so only that line of the label map is searched
+    :param inputCodel: Area of adjacent pixels with the same color
+    :param inputDirection: Direction, where pointers[0] = DP and pointers[1] = CC
     :return: Position within the codel that is adjacent to the next pixel to go to
     """
     dp = inputDirection.pointers[0]
     cc = inputDirection.pointers[1]
+    minX, minY, maxX, maxY = inputCodel.bounds
+    labels = inputCodel.labels
 
     # Right side
     if dp == 0:
-        edgePosition = max(inputCodel.codel, key=lambda lambdaPos: lambdaPos.coords[0])
-        maxValues = list(filter(lambda lambdaPos: lambdaPos.coords[0] == edgePosition.coords[0], inputCodel.codel))
-        if cc == 0:
-            # -> ^ Right and up
-            return min(maxValues, key=lambda lambdaPos: lambdaPos.coords[1])
-        else:
-            # -> V Right and down
-            return max(maxValues, key=lambda lambdaPos: lambdaPos.coords[1])
+        rows = np.flatnonzero(labels[minY:maxY + 1, maxX] == inputCodel.labelId) + minY
+        # -> ^ Right and up, or -> V Right and down
+        return position((maxX, int(rows[0] if cc == 0 else rows[-1])))
     # Bottom side
     elif dp == 1:
-        edgePosition = max(inputCodel.codel, key=lambda lambdaPos: lambdaPos.coords[1])
-        maxValues = list(filter(lambda lambdaPos: lambdaPos.coords[1] == edgePosition.coords[1], inputCodel.codel))
-        if cc == 0:
-            # V -> Down and right
-            return max(maxValues, key=lambda lambaPos: lambaPos.coords[0])
-        else:
-            # V <- Down and left
-            return min(maxValues, key=lambda lambdaPos: lambdaPos.coords[0])
+        columns = np.flatnonzero(labels[maxY, minX:maxX + 1] == inputCodel.labelId) + minX
+        # V -> Down and right, or V <- Down and left
+        return position((int(columns[-1] if cc == 0 else columns[0]), maxY))
     # Left side
     elif dp == 2:
-        edgePosition = min(inputCodel.codel, key=lambda lambdaPos: lambdaPos.coords[0])
-        minValues = list(filter(lambda lambdaPos: lambdaPos.coords[0] == edgePosition.coords[0], inputCodel.codel))
-        if cc == 0:
-            # <- V Left and down
-            return max(minValues, key=lambda lambaPos: lambaPos.coords[1])
-        else:
-            # <- ^ left and up
-            return min(minValues, key=lambda lambdaPos: lambdaPos.coords[1])
+        rows = np.flatnonzero(labels[minY:maxY + 1, minX] == inputCodel.labelId) + minY
+        # <- V Left and down, or <- ^ left and up
+        return position((minX, int(rows[-1] if cc == 0 else rows[0])))
 
     # Top side
     else: # dp == 3
-        edgePosition = min(inputCodel.codel, key=lambda lambdaPos: lambdaPos.coords[1])
-        maxValues = list(filter(lambda lambdaPos: lambdaPos.coords[1] == edgePosition.coords[1], inputCodel.codel))
-        if cc == 0:
-            # ^ <- Up and left
-            return min(maxValues, key=lambda lambaPos: lambaPos.coords[0])
-        else:
-            # ^ -> Up and right
-            return max(maxValues, key=lambda lambdaPos: lambdaPos.coords[0])
+        columns = np.flatnonzero(labels[minY, minX:maxX + 1] == inputCodel.labelId) + minX
+        # ^ <- Up and left, or ^ -> Up and right
+        return position((int(columns[0] if cc == 0 else columns[-1]), minY))
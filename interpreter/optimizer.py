@@ -0,0 +1,176 @@
+import sys
+from typing import List, Tuple, Union
+
+from interpreter import compiler as compiler
+from interpreter import tokenFunctions as runner
+from interpreter.compiler import NOOP, PUSH, POP, ADD, SUBTRACT, MULTIPLY, DIVIDE, MOD, NOT, GREATER, POINTER, SWITCH, \
+    DUPLICATE, ROLL, IN_N, IN_C, OUT_N, OUT_C, TO_WHITE, TO_BLACK, TERMINATE
+from interpreter.dataStructures import compiledProgram, basicBlock
+
+
+def foldBinaryOperation(opcode: int, first: int, second: int) -> Union[int, None]:
+    """
+    Calculates the result of a binary operation on two constants, the same way the engine does
+    :param opcode: Opcode of the operation
+    :param first: The top value of the stack
+    :param second: The second value of the stack
+    :return: The result, or None if the operation can't be folded (because it would cause an error at runtime)
+    """
+    if opcode == ADD:
+        return second + first
+    if opcode == SUBTRACT:
+        return second - first
+    if opcode == MULTIPLY:
+        return second * first
+    if opcode == GREATER:
+        return int(second > first)
+
+    # Division and modulo by zero leave both values on the stack, which is left to the engine
+    if first == 0:
+        return None
+    if opcode == DIVIDE:
+        try:
+            return int(second / first)
+        except OverflowError:
+            return None
+    return second % first
+
+
+def foldOperation(offset: int, opcode: int, operand: int, constants: List[int], operations: List[Tuple[int, int, int]]):
+    """
+    Folds an operation into the constants that were pushed within the block, or appends it to the operations if it
+    depends on values from before the block. Constants are only written to the operations when an operation needs
+    the stack below them.
+    :param offset: Offset of the transition within the block
+    :param opcode: Opcode of the operation
+    :param operand: Operand of the operation
+    :param constants: Values pushed within the block that are not yet in the operations, changed in place
+    :param operations: Operations of the block, changed in place
+    """
+    if opcode in (NOOP, TO_WHITE):
+        return
+    if opcode == PUSH:
+        constants.append(operand)
+        return
+
+    if opcode in (POP, NOT, DUPLICATE) and len(constants) >= 1:
+        if opcode == POP:
+            constants.pop()
+        elif opcode == NOT:
+            constants[-1] = int(constants[-1] == 0)
+        else:
+            constants.append(constants[-1])
+        return
+
+    if opcode in (ADD, SUBTRACT, MULTIPLY, DIVIDE, MOD, GREATER) and len(constants) >= 2:
+        result = foldBinaryOperation(opcode, constants[-1], constants[-2])
+        if result is not None:
+            del constants[-2:]
+            constants.append(result)
+            return
+
+    # Rolls that stay within the constants can be done right away, and rolls to a negative depth are ignored
+    if opcode == ROLL and len(constants) >= 2 and constants[-2] <= len(constants) - 2:
+        runner.rollStack(constants)
+        return
+
+    # Outputting a constant only needs that constant. Values that aren't characters are not printed, and stay on the
+    # stack
+    if opcode in (OUT_N, OUT_C) and len(constants) >= 1:
+        if opcode == OUT_C and not 0 <= constants[-1] <= sys.maxunicode:
+            return
+        operations.append((offset, PUSH, constants.pop()))
+        operations.append((offset, opcode, 0))
+        return
+
+    operations.extend(map(lambda value: (offset, PUSH, value), constants))
+    constants.clear()
+    operations.append((offset, opcode, operand))
+
+
+def optimizeBlock(program: compiledProgram, startIndex: int) -> basicBlock:
+    """
+    Traces a block from the start index while folding constants. Unlike compiler.traceBlock, the trace continues
+    through black bounces, and through pointer and switch operations of which the value is a known constant.
+    :param program: Compiled program
+    :param startIndex: Table index to start from
+    :return: The optimized block
+    """
+    flipTable = compiler.getFlipTable()
+    instructions = []
+    operations = []
+    constants = []
+    visited = set()
+    index = startIndex
+    while index not in visited and len(instructions) < compiler.maxBlockLength:
+        opcode = program.opcodes[index]
+        operand = program.operands[index]
+        pointers = index % 8
+        nextBase = program.nextCodels[index] * 8
+
+        if opcode in (IN_N, IN_C, TERMINATE):
+            break
+        elif opcode in (POINTER, SWITCH):
+            if len(constants) == 0:
+                break
+            value = constants.pop()
+            if opcode == POINTER:
+                nextIndex = nextBase + ((pointers // 2 + value) % 4) * 2 + pointers % 2
+            else:
+                nextIndex = nextBase + (pointers ^ (abs(value) % 2))
+        elif opcode == TO_BLACK:
+            nextIndex = index - pointers + flipTable[pointers]
+        elif opcode == TO_WHITE:
+            nextIndex = nextBase + operand
+        else:
+            foldOperation(len(instructions), opcode, operand, constants, operations)
+            nextIndex = nextBase + pointers
+
+        visited.add(index)
+        instructions.append((index, opcode, operand))
+        index = nextIndex
+
+    operations.extend(map(lambda value: (len(instructions), PUSH, value), constants))
+    return basicBlock(startIndex, instructions, index, operations)
+
+
+def findOptimizedBlocks(program: compiledProgram) -> List[basicBlock]:
+    """
+    Finds the optimized blocks of the program, starting from every block leader
+    :param program: Compiled program
+    :return: List of optimized blocks with at least two transitions
+    """
+    worklist = compiler.getBlockLeaders(program)
+    traced = set()
+    blocks = []
+    while len(worklist) > 0:
+        startIndex = worklist.pop()
+        if startIndex in traced:
+            continue
+        traced.add(startIndex)
+
+        block = optimizeBlock(program, startIndex)
+        # A block that was cut short continues in a new block
+        if program.opcodes[block.exitIndex] not in (POINTER, SWITCH, IN_N, IN_C, TERMINATE):
+            worklist.append(block.exitIndex)
+        if block.steps >= 2:
+            blocks.append(block)
+    return blocks
+
+
+def optimizeProgram(program: compiledProgram) -> List[Union[basicBlock, None]]:
+    """
+    Finds the optimized blocks of the program, and compiles each of them into a python function
+    :param program: Compiled program
+    :return: A list with the block starting at each table index, or None if no block starts there
+    """
+    return compiler.compileBlockFunctions(findOptimizedBlocks(program), len(program.opcodes))
+
+
+def getRemovedSteps(program: compiledProgram) -> int:
+    """
+    Counts the steps that did not have to be executed, because the optimizer folded or removed them
+    :param program: Compiled program that has been run
+    :return: The number of removed steps, over all executions of all blocks
+    """
+    return sum(map(lambda block: block.executions * (block.steps - len(block.operations)), filter(None, program.blocks or [])))
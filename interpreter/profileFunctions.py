@@ -0,0 +1,163 @@
+import time
+from typing import Tuple
+
+import numpy as np
+from PIL import Image
+
+from interpreter.colors import getRGBImage
+from interpreter.compiler import opcodeNames
+from interpreter.dataStructures import compiledProgram, position, direction
+
+phaseNames = ["decode", "lex", "compile", "run"]
+
+# Number of codels and edges listed in the profile table
+tableRows = 10
+
+# The heatmap colors every codel by the time spent in it, up to this opacity for the codel that took the most time
+heatColor = (255, 0, 0)
+maxHeatOpacity = 0.8
+
+
+class executionProfile():
+    """
+    The counts and times of the transitions a program took, per table index (codelId * 8 + DP * 2 + CC), so per edge
+    of a codel. The time of a transition runs from the moment the engine dispatched on it until the next dispatch.
+    Counts and times per opcode and per codel are summed from these. The time spent in each phase of interpreting the
+    image is kept as well.
+    """
+    def __init__(self, tableSize: int):
+        self.phaseTimes = dict.fromkeys(phaseNames, 0.0)
+        self.counts = [0] * tableSize
+        self.times = [0.0] * tableSize
+        self.currentIndex = -1
+        self.enteredAt = 0.0
+
+    def enter(self, index: int):
+        """
+        Records that the engine dispatches on a table index, which ends the previous transition
+        :param index: Table index
+        """
+        now = time.perf_counter()
+        if self.currentIndex != -1:
+            self.times[self.currentIndex] += now - self.enteredAt
+        self.counts[index] += 1
+        self.currentIndex = index
+        self.enteredAt = now
+
+    def leave(self):
+        """
+        Records that the engine stopped, which ends the current transition
+        """
+        if self.currentIndex != -1:
+            self.times[self.currentIndex] += time.perf_counter() - self.enteredAt
+        self.currentIndex = -1
+
+    def __str__(self):
+        return "Profile of {} transitions, {:.3f}s".format(sum(self.counts), sum(self.phaseTimes.values()))
+
+    def __repr__(self):
+        return str(self)
+
+
+def getOpcodeProfile(profile: executionProfile, program: compiledProgram) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Sums the counts and times per opcode
+    :param profile: Profile of a run of the program
+    :param program: Compiled program
+    :return: Arrays of the counts and the times, indexed by opcode
+    """
+    opcodes = np.array(program.opcodes, dtype=np.intp)
+    return np.bincount(opcodes, np.array(profile.counts), len(opcodeNames)), np.bincount(opcodes, np.array(profile.times), len(opcodeNames))
+
+
+def getCodelProfile(profile: executionProfile) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Sums the counts and times per codel
+    :param profile: Profile of a run of the program
+    :return: Arrays of the counts and the times, indexed by codelId
+    """
+    return np.array(profile.counts).reshape(-1, 8).sum(axis=1), np.array(profile.times).reshape(-1, 8).sum(axis=1)
+
+
+def getCodelPosition(labels: np.ndarray, codelId: int) -> position:
+    """
+    Finds the first pixel of a codel in reading order
+    :param labels: Codel label of every pixel
+    :param codelId: Codel
+    :return: Position of the pixel
+    """
+    rows, columns = np.nonzero(labels == codelId)
+    return position((int(columns[0]), int(rows[0])))
+
+
+def getProfileTable(profile: executionProfile, program: compiledProgram) -> str:
+    """
+    Formats a profile as text tables: the time per phase, the counts and times per opcode, and the codels and edges
+    that took the most time
+    :param profile: Profile of a run of the program
+    :param program: Compiled program
+    :return: The tables
+    """
+    totalTime = max(profile.phaseTimes["run"], 1e-9)
+    lines = ["{:<10} {:>10}".format("Phase", "Time (s)")]
+    lines.extend(map(lambda name: "{:<10} {:>10.6f}".format(name, profile.phaseTimes[name]), phaseNames))
+
+    opcodeCounts, opcodeTimes = getOpcodeProfile(profile, program)
+    lines.extend(["", "{:<10} {:>12} {:>10} {:>7}".format("Opcode", "Count", "Time (s)", "Time %")])
+    for opcode in sorted(np.nonzero(opcodeCounts)[0], key=lambda opcode: -opcodeTimes[opcode]):
+        lines.append("{:<10} {:>12} {:>10.6f} {:>7.1f}".format(opcodeNames[opcode], int(opcodeCounts[opcode]), opcodeTimes[opcode], 100 * opcodeTimes[opcode] / totalTime))
+
+    codelCounts, codelTimes = getCodelProfile(profile)
+    lines.extend(["", "{:<10} {:<12} {:>12} {:>10} {:>7}".format("Codel", "Position", "Count", "Time (s)", "Time %")])
+    for codelId in np.argsort(-codelTimes, kind="stable")[:tableRows]:
+        if codelCounts[codelId] == 0:
+            break
+        lines.append("{:<10} {:<12} {:>12} {:>10.6f} {:>7.1f}".format(int(codelId), str(getCodelPosition(program.labels, codelId)), int(codelCounts[codelId]), codelTimes[codelId], 100 * codelTimes[codelId] / totalTime))
+
+    times = np.array(profile.times)
+    lines.extend(["", "{:<10} {:<12} {:<10} {:>12} {:>10} {:>7}".format("Codel", "Direction", "Opcode", "Count", "Time (s)", "Time %")])
+    for index in np.argsort(-times, kind="stable")[:tableRows]:
+        if profile.counts[index] == 0:
+            break
+        pointers = direction((int(index) % 8 // 2, int(index) % 2))
+        lines.append("{:<10} {:<12} {:<10} {:>12} {:>10.6f} {:>7.1f}".format(int(index) // 8, str(pointers), opcodeNames[program.opcodes[index]], profile.counts[index], times[index], 100 * times[index] / totalTime))
+    return "\n".join(lines)
+
+
+def makeHeatmap(image: np.ndarray, labels: np.ndarray, codelValues: np.ndarray, scale: int = 1, shape: Tuple[int, int] = None) -> np.ndarray:
+    """
+    Overlays the image with a color, of which the opacity of every codel depends on its value. The square root of the
+    values is used, so codels that took little time still show up next to the hottest codels.
+    :param image: Image with one pixel per codel, or its color index array
+    :param labels: Codel label of every pixel, -1 for black pixels
+    :param codelValues: Value of every codel
+    :param scale: Width and height of the codels in the heatmap, in pixels
+    :param shape: Height and width of the heatmap, which cuts off the codels at the right and bottom that only partly
+    fit. Defaults to the size of the scaled image
+    :return: RGB image of the heatmap
+    """
+    heat = np.zeros(labels.shape)
+    inCodel = labels >= 0
+    heat[inCodel] = codelValues[labels[inCodel]]
+    if heat.max() > 0:
+        heat = np.sqrt(heat / heat.max()) * maxHeatOpacity
+
+    pixels = getRGBImage(image).astype(np.float64)
+    overlay = pixels * (1 - heat[:, :, np.newaxis]) + np.array(heatColor) * heat[:, :, np.newaxis]
+    overlay = np.repeat(np.repeat(overlay, scale, axis=0), scale, axis=1)
+    if shape is not None:
+        overlay = overlay[:shape[0], :shape[1]]
+    return np.rint(overlay).astype(np.uint8)
+
+
+def saveHeatmap(fileName: str, image: np.ndarray, program: compiledProgram, profile: executionProfile, scale: int = 1, shape: Tuple[int, int] = None):
+    """
+    Writes a heatmap of the time spent per codel as an image
+    :param fileName: Complete filename of the heatmap, the extension decides the format
+    :param image: Image with one pixel per codel
+    :param program: Compiled program
+    :param profile: Profile of a run of the program
+    :param scale: Width and height of the codels in the heatmap, in pixels
+    :param shape: Height and width of the heatmap, see makeHeatmap
+    """
+    Image.fromarray(makeHeatmap(image, program.labels, getCodelProfile(profile)[1], scale, shape)).save(fileName)
@@ -0,0 +1,140 @@
+import io
+import sys
+from collections import deque
+from typing import Union, List, BinaryIO, TextIO
+
+
+class ioStreams():
+    """
+    The input and output of a running program. Output is collected in a buffer, which is written to the output stream
+    in chunks. In interactive mode input is asked for line by line, with a prompt, like the input() builtin does.
+    Otherwise input is read from a stream (or a bytes or str object) without prompts: inC reads a single character,
+    and inN reads a number after skipping whitespace.
+    """
+    def __init__(self, inputStream: Union[BinaryIO, TextIO, bytes, str] = None, outputStream: Union[BinaryIO, TextIO] = None, interactive: bool = None, bufferSize: int = 8192):
+        """
+        :param inputStream: Stream, bytes or str to read input from. If None, input is read from sys.stdin
+        :param outputStream: Text or binary stream to write output to. If None, output is written to sys.stdout
+        :param interactive: Whether to ask for input with prompts. Defaults to True if no input stream is given
+        :param bufferSize: Number of characters after which the output is written to the output stream
+        """
+        if isinstance(inputStream, bytes):
+            inputStream = io.BytesIO(inputStream)
+        if isinstance(inputStream, str):
+            inputStream = io.StringIO(inputStream)
+        if inputStream is not None and not isinstance(inputStream, io.TextIOBase):
+            inputStream = io.TextIOWrapper(inputStream, encoding="utf-8", errors="replace")
+
+        self.inputStream = inputStream
+        self.outputStream = outputStream
+        self.interactive = inputStream is None if interactive is None else interactive
+        self.bufferSize = bufferSize
+        self.buffer: List[str] = []
+        self.bufferLength = 0
+        # Characters that have been read from the input stream or fed, but not used yet
+        self.pending = deque()
+
+    def write(self, text: str):
+        """
+        Adds text to the output buffer, and flushes the buffer when it is full
+        :param text: Output text
+        """
+        self.buffer.append(text)
+        self.bufferLength += len(text)
+        if self.bufferLength >= self.bufferSize:
+            self.flush()
+
+    def outN(self, value: int):
+        self.write(str(value))
+
+    def outC(self, value: int):
+        """
+        :param value: Code point of the character, from 0 to sys.maxunicode. Callers leave other values on the stack
+        """
+        self.write(chr(value))
+
+    def flush(self):
+        """
+        Writes the output buffer to the output stream
+        """
+        if self.bufferLength == 0:
+            return
+        text = "".join(self.buffer)
+        self.buffer = []
+        self.bufferLength = 0
+
+        outputStream = sys.stdout if self.outputStream is None else self.outputStream
+        if isinstance(outputStream, (io.RawIOBase, io.BufferedIOBase)):
+            outputStream.write(text.encode("utf-8", errors="replace"))
+        else:
+            outputStream.write(text)
+        outputStream.flush()
+
+    def readCharacter(self) -> str:
+        """
+        Reads the next character from the input stream
+        :return: The character, or an empty string at the end of the input
+        """
+        if len(self.pending) > 0:
+            return self.pending.popleft()
+        return (sys.stdin if self.inputStream is None else self.inputStream).read(1)
+
+    def feed(self, data: Union[bytes, str]):
+        """
+        Adds input, which is read before the rest of the input stream
+        :param data: Input text, or UTF-8 encoded input
+        """
+        self.pending.extend(data.decode("utf-8", errors="replace") if isinstance(data, bytes) else data)
+
+    def hasInput(self) -> bool:
+        """
+        Checks whether there is input left to read, without using it
+        :return: False if the input stream has ended and no input has been fed, True otherwise (and in interactive mode)
+        """
+        if self.interactive or len(self.pending) > 0:
+            return True
+        self.pending.extend(self.readCharacter())
+        return len(self.pending) > 0
+
+    def inN(self) -> Union[int, None]:
+        """
+        Reads a number
+        :return: The number, or None if the input doesn't contain a number at this point
+        """
+        if self.interactive:
+            self.flush()
+            newVal = input("Input number: ")
+            return int(newVal) if newVal.isdecimal() else None
+
+        character = self.readCharacter()
+        while character.isspace():
+            character = self.readCharacter()
+
+        sign = ""
+        if character in ("-", "+"):
+            sign = character
+            character = self.readCharacter()
+        # isdigit would also accept characters like superscripts, which int can't read
+        digits = ""
+        while character.isdecimal():
+            digits += character
+            character = self.readCharacter()
+        # The character after the number is left for the next read, and so is a sign without a number after it
+        self.pending.extendleft(character)
+        if digits == "":
+            self.pending.extendleft(sign)
+            return None
+        return int(sign + digits)
+
+    def inC(self) -> Union[int, None]:
+        """
+        Reads a character
+        :return: The unicode code point of the character, or None at the end of the input
+        """
+        if self.interactive:
+            self.flush()
+            newVal = input("Input character")
+            return ord(newVal[0]) if len(newVal) > 0 else None
+
+        character = self.readCharacter()
+        return ord(character) if character != "" else None
@@ -1,5 +1,5 @@
+import sys
 from typing import List, Tuple, Union
-import copy
 
 from interpreter import tokens as lexerTokens
 from interpreter import movementFunctions as movement
@@ -12,14 +12,15 @@ def executeToken(token: lexerTokens.baseLexerToken, inputDirection: direction, d
     Executes the function associated with tokens
     :param token: Input token
     :param inputDirection: Input direction
-    :param dataStack: Input stack
-    :return: Either a combination of a new stack and direction, or a runtime Exception
+    :param dataStack: Input stack, which is modified in place
+    :return: Either a combination of the stack and a new direction, or a runtime Exception
     """
     if isinstance(token, lexerTokens.toBlackToken):
         newPointers = movement.flip(inputDirection)
         return (newPointers, dataStack)
     if isinstance(token, lexerTokens.toWhiteToken):
-        return (inputDirection, dataStack)
+        # Sliding through white may have changed the direction
+        return (direction(token.exitPointers), dataStack)
     if isinstance(token, lexerTokens.toColorToken):
         return executeColorToken(token, inputDirection, dataStack)
     if isinstance(token, lexerTokens.terminateToken):
@@ -33,8 +34,8 @@ def executeColorToken(token: lexerTokens.toColorToken, inputDirection: direction
     Executes the to color operations
     :param token: input token
     :param inputDirection: Input direction
-    :param dataStack: Input data stack
-    :return: either a combination of a new direction and data stack, or a runtime Exception
+    :param dataStack: Input data stack, which is modified in place
+    :return: either a combination of a new direction and the data stack, or a runtime Exception
     """
     if token.tokenType == "noop":
         return noopOperator(inputDirection, dataStack)
@@ -87,9 +88,9 @@ def noopOperator(inputDirection: direction, dataStack: List[int]) -> Tuple[direc
     Does nothing
     :param pointers: The tuple with the direction pointer and codel chooser
     :param dataStack: input dataStack
-    :return: Tuple of a copy of the dataStack and the endpointers of the token
+    :return: Tuple of the dataStack and the endpointers of the token
     """
-    return (copy.deepcopy(inputDirection), dataStack.copy())
+    return (inputDirection, dataStack)
 
 
 def addOperator(inputDirection: direction, dataStack: List[int]) -> Tuple[direction, List[int]]:
@@ -99,39 +100,33 @@ def addOperator(inputDirection: direction, dataStack: List[int]) -> Tuple[direct
     :param dataStack: input datastack
     :return:
     """
-    newStack = dataStack.copy()
-    inputDirection = copy.deepcopy(inputDirection)
-    if len(newStack) < 2:
-        return (inputDirection, newStack)
-    newStack.append(newStack.pop() + newStack.pop())
-    return (inputDirection, newStack)
+    if len(dataStack) < 2:
+        return (inputDirection, dataStack)
+    dataStack.append(dataStack.pop() + dataStack.pop())
+    return (inputDirection, dataStack)
 
 
 def subtractOperator(inputDirection: direction, dataStack: List[int]) -> Tuple[direction, List[int]]:
     """
     Subtracts the second value from the first value of the stack
     """
-    newStack = dataStack.copy()
-    inputDirection = copy.deepcopy(inputDirection)
-    if len(newStack) < 2:
-        return (inputDirection, newStack)
+    if len(dataStack) < 2:
+        return (inputDirection, dataStack)
 
-    first = newStack.pop()
-    second = newStack.pop()
-    newStack.append(second - first)
-    return (inputDirection, newStack)
+    first = dataStack.pop()
+    second = dataStack.pop()
+    dataStack.append(second - first)
+    return (inputDirection, dataStack)
 
 
 def multiplyOperator(inputDirection: direction, dataStack: List[int]) -> Tuple[direction, List[int]]:
     """
     Pops the first 2 values from the stack, and pushes the product of them
     """
-    newStack = list(dataStack)
-    inputDirection = copy.deepcopy(inputDirection)
-    if len(newStack) < 2:
-        return (inputDirection, newStack)
-    newStack.append(newStack.pop() * newStack.pop())
-    return (inputDirection, newStack)
+    if len(dataStack) < 2:
+        return (inputDirection, dataStack)
+    dataStack.append(dataStack.pop() * dataStack.pop())
+    return (inputDirection, dataStack)
 
 
 def divideOperator(inputDirection: direction, dataStack: List[int]) -> Union[Tuple[direction, List[int]], BaseException]:
@@ -141,17 +136,16 @@ def divideOperator(inputDirection: direction, dataStack: List[int]) -> Union[Tup
     :param dataStack: A list of ints as stack. last entry is the top
     :return: Tuple with the new data stack and new pointers
     """
-    newStack = dataStack.copy()
-    newDirection = copy.deepcopy(inputDirection)
-    if len(newStack) < 2:
-        return (newDirection, newStack)
+    if len(dataStack) < 2:
+        return (inputDirection, dataStack)
 
-    first = newStack.pop()
-    second = newStack.pop()
-    if second == 0:
-        return ZeroDivisionError("Division by zero {}/{}".format(first, second))
-    newStack.append(int(second / first))
-    return (newDirection, newStack)
+    # Division by zero is ignored, as the specification recommends
+    if dataStack[-1] == 0:
+        return (inputDirection, dataStack)
+    first = dataStack.pop()
+    second = dataStack.pop()
+    dataStack.append(int(second / first))
+    return (inputDirection, dataStack)
 
 
 def modOperator(inputDirection: direction, dataStack: List[int]) -> Union[Tuple[direction, List[int]], BaseException]:
@@ -161,16 +155,15 @@ def modOperator(inputDirection: direction, dataStack: List[int]) -> Union[Tuple[
     :param dataStack:
     :return: Tuple of direction and new data stack
     """
-    newStack = dataStack.copy()
-    inputDirection = copy.deepcopy(inputDirection)
-    if len(newStack) < 2:
-        return (inputDirection, newStack)
-    valA = newStack.pop()
-    valB = newStack.pop()
-    if valB == 0:
-        return ZeroDivisionError("Second value is 0: {}%{}".format(valA, valB))
-    newStack.append(valB % valA)
-    return (inputDirection, newStack)
+    if len(dataStack) < 2:
+        return (inputDirection, dataStack)
+    # Modulo by zero is ignored, like division by zero
+    if dataStack[-1] == 0:
+        return (inputDirection, dataStack)
+    valA = dataStack.pop()
+    valB = dataStack.pop()
+    dataStack.append(valB % valA)
+    return (inputDirection, dataStack)
 
 
 def greaterOperator(inputDirection: direction, dataStack: List[int]) -> Tuple[direction, List[int]]:
@@ -180,16 +173,14 @@ def greaterOperator(inputDirection: direction, dataStack: List[int]) -> Tuple[di
     :param dataStack: The list of values as the stack, last entry is the top of the stack
     :return: A tuple of pointers and new data stack
     """
-    newStack = dataStack.copy()
-    inputDirection = copy.deepcopy(inputDirection)
-    if len(newStack) < 2:
-        return (inputDirection, newStack)
+    if len(dataStack) < 2:
+        return (inputDirection, dataStack)
 
-    valA = newStack.pop()
-    valB = newStack.pop()
+    valA = dataStack.pop()
+    valB = dataStack.pop()
 
-    newStack.append(int(valB > valA))
-    return (inputDirection, newStack)
+    dataStack.append(int(valB > valA))
+    return (inputDirection, dataStack)
 
 
 def notOperator(inputDirection: direction, dataStack: List[int]) -> Tuple[direction, List[int]]:
@@ -199,14 +190,12 @@ def notOperator(inputDirection: direction, dataStack: List[int]) -> Tuple[direct
     :param dataStack: The input list of ints as stcak. Last entry is the top of the stack
     :return: A tuple of pointers and new data stack
     """
-    newStack = dataStack.copy()
-    inputDirection = copy.deepcopy(inputDirection)
-    if len(newStack) < 1:
-        return (inputDirection, newStack)
+    if len(dataStack) < 1:
+        return (inputDirection, dataStack)
 
-    result = 1 if newStack.pop() == 0 else 0
-    newStack.append(result)
-    return (inputDirection, newStack)
+    result = 1 if dataStack.pop() == 0 else 0
+    dataStack.append(result)
+    return (inputDirection, dataStack)
 
 
 def pointerOperator(inputDirection: direction, dataStack: List[int]) -> Tuple[direction, List[int]]:
@@ -216,21 +205,19 @@ def pointerOperator(inputDirection: direction, dataStack: List[int]) -> Tuple[di
     :param dataStack:
     :return:
     """
-    newStack = dataStack.copy()
-    inputDirection = copy.deepcopy(inputDirection)
-    if len(newStack) < 1:
-        return (inputDirection, newStack)
+    if len(dataStack) < 1:
+        return (inputDirection, dataStack)
 
     dp = inputDirection.pointers[0]
-    dpTurnCount = newStack.pop()
+    dpTurnCount = dataStack.pop()
     # Python module makes negative modulo's positive, so we need to manually flip the DP the required amount of times
     if dpTurnCount < 0:
         dp = movement.flipDPInvert(dp, dpTurnCount)
-        return (direction((dp, inputDirection.pointers[1])), newStack)
+        return (direction((dp, inputDirection.pointers[1])), dataStack)
     else:
         # Cycle the DP forward by using the module operator
         newDP = (inputDirection.pointers[0] + (dpTurnCount % 4)) % 4
-        return (direction((newDP, inputDirection.pointers[1])), newStack)
+        return (direction((newDP, inputDirection.pointers[1])), dataStack)
 
 
 def switchOperator(inputDirection: direction, dataStack: List[int]) -> Tuple[direction, List[int]]:
@@ -240,138 +227,118 @@ def switchOperator(inputDirection: direction, dataStack: List[int]) -> Tuple[dir
     :param dataStack:
     :return:
     """
-    newStack = dataStack.copy()
-    inputDirection = copy.deepcopy(inputDirection)
-    if len(newStack) < 1:
-        return (inputDirection, newStack)
+    if len(dataStack) < 1:
+        return (inputDirection, dataStack)
 
-    ccTurnCount = abs(newStack.pop()) % 2
+    ccTurnCount = abs(dataStack.pop()) % 2
     newCC = (inputDirection.pointers[1] + ccTurnCount) % 2
-    return (direction((inputDirection.pointers[0], newCC)), newStack)
+    return (direction((inputDirection.pointers[0], newCC)), dataStack)
 
 
 def inNOperator(inputDirection: direction, dataStack: List[int]) -> Tuple[direction, List[int]]:
     """
     Add a number from the input. If it isn't a number, nothing is added instead
     """
-    newStack = dataStack.copy()
-    inputDirection = copy.deepcopy(inputDirection)
     newVal = input("Input number: ")
     if newVal.isdigit():
-        newStack.append(int(newVal))
-    return (inputDirection, newStack)
+        dataStack.append(int(newVal))
+    return (inputDirection, dataStack)
 
 
 def inCOperator(inputDirection: direction, dataStack: List[int]) -> Tuple[direction, List[int]]:
     """
     Add a numeric representation of a character to the stack.
     """
-    newStack = dataStack.copy()
-    inputDirection = copy.deepcopy(inputDirection)
     newVal = input("Input character")
     if len(newVal) < 1:
-        return (inputDirection, newStack)
+        return (inputDirection, dataStack)
 
-    newStack.append(ord(newVal[0]))
-    return (inputDirection, newStack)
+    dataStack.append(ord(newVal[0]))
+    return (inputDirection, dataStack)
 
 
 def outNOperator(inputDirection: direction, dataStack: List[int]) -> Tuple[direction, List[int]]:
     """
     Pops the top number from the stack and outputs it as a number
     """
-    newStack = dataStack.copy()
-    inputDirection = copy.deepcopy(inputDirection)
-    if len(newStack) < 1:
-        return (inputDirection, newStack)
-    print(newStack.pop(), end="")
-    return (inputDirection, newStack)
+    if len(dataStack) < 1:
+        return (inputDirection, dataStack)
+    print(dataStack.pop(), end="")
+    return (inputDirection, dataStack)
 
 
 def outCOperator(inputDirection: direction, dataStack: List[int]) -> Tuple[direction, List[int]]:
     """
-    Pops the top number from the stack and outputs it as a number. Does nothing if top value is negative
+    Pops the top number from the stack and outputs it as a character. Does nothing if the top value is negative or
+    beyond the last unicode character
     """
-    newStack = dataStack.copy()
-    inputDirection = copy.deepcopy(inputDirection)
-    if len(newStack) < 1:
-        return (inputDirection, newStack)
-    valA = newStack.pop()
-    if valA < 0:
-        newStack.append(valA)
-        return (inputDirection, newStack)
+    if len(dataStack) < 1:
+        return (inputDirection, dataStack)
+    valA = dataStack.pop()
+    if not 0 <= valA <= sys.maxunicode:
+        dataStack.append(valA)
+        return (inputDirection, dataStack)
 
     print(chr(valA), end="")
-    return (inputDirection, newStack)
+    return (inputDirection, dataStack)
 
 
 def pushOperator(token: lexerTokens.toColorToken, inputDirection: direction, dataStack: List[int]) -> Tuple[direction, List[int]]:
     """
     Pushes the codelsize of the token to the stack
     """
-    newStack = dataStack.copy()
-    inputDirection = copy.deepcopy(inputDirection)
-    newStack.append(token.codelSize)
-    return (inputDirection, newStack)
+    dataStack.append(token.codelSize)
+    return (inputDirection, dataStack)
 
 
 def popOperator(inputDirection: direction, dataStack: List[int]) -> Tuple[direction, List[int]]:
     """
     Pops and discards the top number of the stack
     """
-    newStack = dataStack.copy()
-    inputDirection = copy.deepcopy(inputDirection)
-    if len(newStack) < 1:
-        return (inputDirection, newStack)
-    newStack.pop()
-    return (inputDirection, newStack)
+    if len(dataStack) < 1:
+        return (inputDirection, dataStack)
+    dataStack.pop()
+    return (inputDirection, dataStack)
 
 
 def duplicateOperator(inputDirection: direction, dataStack: List[int]) -> Tuple[direction, List[int]]:
     """
     Duplicates the top value of the stack
     """
-    newStack = dataStack.copy()
-    inputDirection = copy.deepcopy(inputDirection)
-    if len(newStack) < 1:
-        return (inputDirection, newStack)
+    if len(dataStack) < 1:
+        return (inputDirection, dataStack)
 
-    val = newStack.pop()
-    newStack.append(val)
-    newStack.append(val)
-    return (inputDirection, newStack)
+    val = dataStack.pop()
+    dataStack.append(val)
+    dataStack.append(val)
+    return (inputDirection, dataStack)
 
 
 def rollOperator(inputDirection: direction, dataStack: List[int]) -> Tuple[direction, List[int]]:
     """
     Rolls the stack x times, to a depth of y, where x is equal to the top value of the stack, and y is equal to the second value of the stack
     """
-    newStack = dataStack.copy()
-    inputDirection = copy.deepcopy(inputDirection)
-    if len(newStack) < 2:
-        return (inputDirection, newStack)
+    return (inputDirection, rollStack(dataStack))
 
-    rolls = newStack.pop()
-    depth = newStack.pop()
-    insertIndex = len(newStack) - depth
-    newStack = rollStack(newStack, rolls, insertIndex)
 
-    return (inputDirection, newStack)
-
-def rollStack(dataStack: List[int], numberOfRolls: int, insertIndex: int) -> List[int]:
+def rollStack(dataStack: List[int]) -> List[int]:
     """
-    Rolls the stack recursively, and inverted when negative number of rolls
-    :param dataStack: Input stack
-    :param numberOfRolls: Number of rolls
-    :param insertIndex: At which index to either insert new values, or to get values from
+    Pops the number of rolls and the depth, and rolls the values down to that depth in place. A single roll moves the
+    top value down to the depth, and a negative number of rolls rolls the other way. The number of rolls is taken modulo
+    the depth, so a roll takes O(depth) time however many rolls are asked for. Like other operations that can't be
+    performed, a negative depth or a depth larger than the rest of the stack is ignored, and the stack is left unchanged.
+    :param dataStack: Input stack, which is modified in place
     :return: Rolled data stack
     """
-    newStack = dataStack.copy()
-    if numberOfRolls > 0:
-        newStack.insert(insertIndex, newStack.pop())
-        return rollStack(newStack, numberOfRolls - 1, insertIndex)
-    elif numberOfRolls < 0:
-        newStack.append(newStack.pop(insertIndex))
-        return rollStack(newStack, numberOfRolls + 1, insertIndex)
-    else:
-        return newStack
+    if len(dataStack) < 2:
+        return dataStack
+    depth = dataStack[-2]
+    if depth < 0 or depth > len(dataStack) - 2:
+        return dataStack
+
+    rolls = dataStack.pop()
+    dataStack.pop()
+    if depth > 0 and rolls % depth != 0:
+        rolls %= depth
+        dataStack[-depth:] = dataStack[-rolls:] + dataStack[-depth:-rolls]
+    return dataStack
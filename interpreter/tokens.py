@@ -1,4 +1,9 @@
+from typing import Tuple
+
+
 class baseLexerToken():
+    __slots__ = ("tokenType",)
+
     def __init__(self, tokenType: str):
         self.tokenType = tokenType
 
@@ -13,22 +18,34 @@ class toBlackToken(baseLexerToken):
     """
     Used when a transition to black (or edge) occurs
     """
+    __slots__ = ()
+
     def __init__(self, tokenType: str = "toBlack"):
         super().__init__(tokenType)
 
 
 class toWhiteToken(baseLexerToken):
     """
-    Used when a transition to white occurs
+    Used when a transition to white occurs. The whole slide through the white area is a single transition, which ends
+    on the colored pixel at exitCoords (x, y) with the pointers (DP, CC) of exitPointers
     """
-    def __init__(self):
+    __slots__ = ("exitCoords", "exitPointers")
+
+    def __init__(self, exitCoords: Tuple[int, int], exitPointers: Tuple[int, int]):
         super().__init__("toWhite")
+        self.exitCoords = exitCoords
+        self.exitPointers = exitPointers
+
+    def __str__(self):
+        return "{}, exit = {} / {}".format(super().__str__(), self.exitCoords, self.exitPointers)
 
 
 class terminateToken(baseLexerToken):
     """
     Used when a codel has no possible way to escape (8 * toBlack)
     """
+    __slots__ = ()
+
     def __init__(self):
         super().__init__("exit")
 
@@ -37,6 +54,8 @@ class toColorToken(baseLexerToken):
     """
     Used when a transition to a color occurs
     """
+    __slots__ = ("codelSize",)
+
     def __init__(self, tokenType: str, codelSize: int):
         super().__init__(tokenType)
         self.codelSize = codelSize
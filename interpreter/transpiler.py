@@ -0,0 +1,196 @@
+from collections import OrderedDict
+from typing import Dict, List, Tuple, Union, Callable
+
+import numpy as np
+
+from interpreter import imageFunctions as imageWrapper
+from interpreter import cacheFunctions as cache
+from interpreter import compiler as compiler
+from interpreter import optimizer as optimizer
+from interpreter.compiler import NOOP, PUSH, POINTER, SWITCH, IN_N, IN_C, TO_WHITE, TO_BLACK, TERMINATE
+from interpreter.dataStructures import compiledProgram, basicBlock, graph
+
+
+# The most recently used transpiled programs by image hash: the graph, the generated source and the namespace it was
+# executed in. Older programs are dropped when there are more than maxTranspiledPrograms
+transpiledPrograms: Dict[str, Tuple[graph, str, Dict]] = OrderedDict()
+maxTranspiledPrograms = 8
+
+
+def generateTransition(program: compiledProgram, index: int) -> List[str]:
+    """
+    Generates the source for a single transition. Like every case of a codel function, it returns a tuple of the next
+    table index (or -1 if the program terminated), the steps taken, the table index of the last move (or -1) and an
+    exception (or None).
+    :param program: Compiled program
+    :param index: Table index of the transition
+    :return: Lines of python source
+    """
+    opcode = program.opcodes[index]
+    operand = program.operands[index]
+    pointers = index % 8
+    nextBase = program.nextCodels[index] * 8
+
+    if opcode == TERMINATE:
+        return ["return (-1, 0, -1, None)"]
+    if opcode == TO_BLACK:
+        return ["return ({}, 1, -1, None)".format(index - pointers + compiler.getFlipTable()[pointers])]
+    if opcode == TO_WHITE:
+        return ["return ({}, 1, {}, None)".format(nextBase + operand, index)]
+
+    if opcode == POINTER:
+        lines = ["if stack:", "    return ({} + (({} + stack.pop()) % 4) * 2, 1, {}, None)".format(nextBase + pointers % 2, pointers // 2, index)]
+    elif opcode == SWITCH:
+        lines = ["if stack:", "    return ({} + ({} ^ (abs(stack.pop()) % 2)), 1, {}, None)".format(nextBase, pointers, index)]
+    elif opcode == IN_N:
+        lines = ["newVal = streams.inN()", "if newVal is not None:", "    stack.append(newVal)"]
+    elif opcode == IN_C:
+        lines = ["newVal = streams.inC()", "if newVal is not None:", "    stack.append(newVal)"]
+    elif opcode == PUSH:
+        lines = ["stack.append({})".format(operand)]
+    elif opcode == NOOP:
+        lines = []
+    else:
+        lines = compiler.generateInstruction(0, opcode, lambda offset, error: "return ({}, 1, -1, {})".format(index, error))
+    return lines + ["return ({}, 1, {}, None)".format(nextBase + pointers, index)]
+
+
+def generateBlock(block: basicBlock) -> List[str]:
+    """
+    Generates the source running an optimized block, if the remaining steps allow it. A block that ends where it
+    started is repeated within the generated code, for as long as the remaining steps allow it.
+    :param block: Optimized block
+    :return: Lines of python source
+    """
+    lastMove = compiler.getLastMove(block.instructions)
+    if block.exitIndex != block.startIndex:
+        def failure(offset: int, error: str) -> str:
+            return "return ({}, {}, {}, {})".format(block.instructions[offset][0], offset + 1, compiler.getLastMove(block.instructions[:offset]), error)
+
+        lines = ["if remaining >= {}:".format(block.steps)]
+        lines.extend(map(lambda line: "    " + line, compiler.generateInstructions(block.operations, failure)))
+        lines.append("    return ({}, {}, {}, None)".format(block.exitIndex, block.steps, lastMove))
+        return lines
+
+    def loopFailure(offset: int, error: str) -> str:
+        failedMove = compiler.getLastMove(block.instructions[:offset])
+        return "return ({}, taken + {}, {}, {})".format(block.instructions[offset][0], offset + 1, failedMove if failedMove != -1 else "{} if taken else -1".format(lastMove), error)
+
+    lines = ["if remaining >= {}:".format(block.steps), "    taken = 0", "    while remaining - taken >= {}:".format(block.steps)]
+    lines.extend(map(lambda line: "        " + line, compiler.generateInstructions(block.operations, loopFailure)))
+    lines.append("        taken += {}".format(block.steps))
+    lines.append("    return ({}, taken, {}, None)".format(block.exitIndex, lastMove))
+    return lines
+
+
+def generateCodelFunction(program: compiledProgram, codelId: int) -> str:
+    """
+    Generates the function running the program from a codel, with a case for each value of the pointers
+    :param program: Compiled program, with optimized blocks
+    :param codelId: Id of the codel
+    :return: Python source of a function named codel<codelId>
+    """
+    lines = ["def codel{}(stack, pointers, remaining, streams):".format(codelId)]
+    for pointers in range(8):
+        index = codelId * 8 + pointers
+        lines.append("    {} pointers == {}:".format("if" if pointers == 0 else "elif", pointers))
+        case = generateBlock(program.blocks[index]) if program.blocks[index] is not None else []
+        case.extend(generateTransition(program, index))
+        lines.extend(map(lambda line: "        " + line, case))
+    return "\n".join(lines)
+
+
+def generateProgramSource(program: compiledProgram, name: str = "image") -> str:
+    """
+    Generates a python module running the program. The module has a function run(state, maxSteps=None, streams=None),
+    which takes and updates a machineState just like engine.runProgram. Running the module itself runs the program from the start.
+    :param program: Compiled program, with optimized blocks
+    :param name: Name of the image, used in the header of the module
+    :return: Python source of the module
+    """
+    codelCount = len(program.opcodes) // 8
+    startCodel = int(program.labels[0, 0])
+    parts = ["# Piet program {}, transpiled by interpreter.transpiler\nimport sys\n\nfrom interpreter.tokenFunctions import rollStack\nfrom interpreter.streams import ioStreams".format(name),
+             "startCodel = {}".format(startCodel),
+             "entryPositions = {!r}".format(list(map(lambda coords: (int(coords[0]), int(coords[1])), program.entryPositions))),
+             "edgePositions = {!r}".format(list(map(lambda coords: (int(coords[0]), int(coords[1])), program.edgePositions)))]
+    parts.extend(map(lambda codelId: generateCodelFunction(program, codelId), range(codelCount)))
+    parts.append("jumpTable = [{}]".format(", ".join(map(lambda codelId: "codel{}".format(codelId), range(codelCount)))))
+    parts.append('''def run(state, maxSteps=None, streams=None):
+    """
+    Runs the program from the given machine state, which is updated in place
+    :param state: Machine state to continue from
+    :param maxSteps: Maximum number of steps to take, or None to run until the program terminates
+    :param streams: Input and output of the program. Defaults to interactive input and output on the console
+    :return: Either the updated state, or a runtime exception
+    """
+    if streams is None:
+        streams = ioStreams()
+    stack = state.dataStack
+    index = state.codelId * 8 + state.pointers
+    lastMove = -1
+    steps = 0
+    stepLimit = sys.maxsize if maxSteps is None else maxSteps
+    error = None
+    try:
+        while steps < stepLimit:
+            nextIndex, taken, moved, error = jumpTable[index >> 3](stack, index & 7, stepLimit - steps, streams)
+            steps += taken
+            if moved != -1:
+                lastMove = moved
+            if nextIndex == -1:
+                state.terminated = True
+                break
+            index = nextIndex
+            if error is not None:
+                break
+    finally:
+        streams.flush()
+
+    state.steps += steps
+    state.codelId = index // 8
+    state.pointers = index % 8
+    if lastMove != -1:
+        state.position = entryPositions[lastMove]
+    if error is not None:
+        return type(error)("{}, at position {}, direction {}".format(error.args[0], edgePositions[index], (index % 8 // 2, index % 2)))
+    return state''')
+    parts.append('''if __name__ == "__main__":
+    from interpreter.dataStructures import machineState
+    if startCodel == -1:
+        print("Programstate starts in black pixel at (0, 0)")
+    else:
+        result = run(machineState(startCodel, 0, (0, 0)))
+        if isinstance(result, BaseException):
+            print("The following exception occured while executing the next step:\\n{}".format(result))''')
+    return "\n\n\n".join(parts) + "\n"
+
+
+def transpileImage(image: np.ndarray, name: str = "image") -> Union[Tuple[graph, str, Callable], List[BaseException]]:
+    """
+    Lexes, compiles, optimizes and transpiles an image into a python function. The most recent results are kept by image hash.
+    :param image: Input image
+    :param name: Name of the image, used in the header of the generated module
+    :return: Either a tuple of the graph, the generated source and its run function, or a list of lexing exceptions
+    """
+    imageHash = imageWrapper.getImageHash(image)
+    if imageHash in transpiledPrograms:
+        transpiledPrograms.move_to_end(imageHash)
+    else:
+        compiled = cache.getCompiledProgram(image)
+        if isinstance(compiled, list):
+            return compiled
+
+        inputGraph, program = compiled
+        program.blocks = [None] * len(program.opcodes)
+        for block in optimizer.findOptimizedBlocks(program):
+            program.blocks[block.startIndex] = block
+        source = generateProgramSource(program, name)
+        namespace = {"__name__": "piet_{}".format(imageHash[:16])}
+        exec(compile(source, "<piet {}>".format(name), "exec"), namespace)
+        transpiledPrograms[imageHash] = (inputGraph, source, namespace)
+        if len(transpiledPrograms) > maxTranspiledPrograms:
+            transpiledPrograms.popitem(last=False)
+
+    inputGraph, source, namespace = transpiledPrograms[imageHash]
+    return inputGraph, source, namespace["run"]
@@ -1,26 +1,52 @@
 import argparse
+import contextlib
+import os
 import sys
 
-sys.setrecursionlimit(100000)
-
 from interpreter import executeFunctions as executionFunctions
 from interpreter import imageFunctions as imageWrapper
+from interpreter import cacheFunctions as cache
+from interpreter.streams import ioStreams
 from GUI import main as GUIMain
 
 parser = argparse.ArgumentParser(description='Interprets a piet image')
-parser.add_argument("-f", "--file", required=True, type=str, help="complete filepath to a .png or .gif image")
+parser.add_argument("-f", "--file", required=True, type=str, help="complete filepath to an image (.png, .gif, .ppm, .npy, ...)")
 parser.add_argument("-v", "--verbose", action="store_true", help="Outputs number of steps to STDOUT")
+parser.add_argument("--compile-py", nargs="?", const="", metavar="FILE", help="Transpiles the image into python before running it, and writes the python module to FILE if given")
+parser.add_argument("-c", "--codel-size", type=int, help="Size of a codel in pixels. Detected from the image if not given")
+parser.add_argument("--no-cache", action="store_true", help="Always lexes the image, instead of using the compile cache")
+parser.add_argument("-i", "--input", type=str, help="File to read the input of the program from, instead of asking for it")
+parser.add_argument("-n", "--non-interactive", action="store_true", help="Reads the input of the program from STDIN, without prompts")
+parser.add_argument("-p", "--profile", nargs="?", const="", metavar="HEATMAP", help="Counts and times every opcode, codel and edge, prints the profile, and writes a heatmap of the image to HEATMAP (by default the name of the image, ending in _profile.png)")
+parser.add_argument("-d", "--detect-cycles", action="store_true", help="Stops the program when it repeats a state, as it would never terminate")
+parser.add_argument("-l", "--lazy", action="store_true", help="Only lexes and compiles the parts of the image the program reaches, when it reaches them. Starts large images sooner")
 parser.add_argument("-g", "--graphical", action="store_true", help="Opens GUI with the file loaded")
 
 args = parser.parse_args()
 
+if args.no_cache:
+    cache.cacheDirectory = None
+
 if not args.graphical:
-    executionFunctions.interpret(imageWrapper.getImage(args.file))
+    with (open(args.input, "rb") if args.input is not None else contextlib.nullcontext()) as inputFile:
+        streams = ioStreams(inputFile, sys.stdout.buffer, False if args.non_interactive else None)
+        if args.profile is not None:
+            # The profiler loads the image itself, to time the decoding
+            heatmapFile = args.profile if args.profile else "{}_profile.png".format(os.path.splitext(args.file)[0])
+            executionFunctions.interpretProfiled(args.file, args.codel_size, streams, heatmapFile, args.detect_cycles)
+        else:
+            image = imageWrapper.downsampleImage(imageWrapper.getImage(args.file), args.codel_size)
+            if args.compile_py is not None:
+                executionFunctions.interpretTranspiled(image, args.compile_py if args.compile_py else None, args.file, streams)
+            else:
+                executionFunctions.interpret(image, streams, args.detect_cycles, args.lazy)
 
     if args.verbose:
         print("\nTotal steps: {}".format(executionFunctions.takeStep.counter))
+        print("Steps removed by the optimizer: {}".format(executionFunctions.interpret.removedSteps))
 else:
     app = GUIMain.GUI()
+    app.codelSize = args.codel_size
     app.setFileText(args.file)
     app.loadFile()
     app.run()
@@ -0,0 +1,33 @@
+import multiprocessing
+import os
+import unittest
+
+from interpreter import batchFunctions as batch
+
+originalRunImage = batch.runImage
+
+
+def runOrDie(fileName: str, *arguments):
+    # Stands in for an image that kills its worker, like an out of memory kill would
+    if fileName.endswith("Die.png"):
+        os._exit(1)
+    return originalRunImage(fileName, *arguments)
+
+
+@unittest.skipUnless(multiprocessing.get_start_method() == "fork", "workers only see the replaced runImage when forked")
+class runBatchTests(unittest.TestCase):
+    def testDeadWorkerOnlyFailsItsImage(self):
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        fileNames = [os.path.join(root, "Add.png"), os.path.join(root, "Die.png"), os.path.join(root, "HelloWorld.png")]
+        batch.runImage = runOrDie
+        try:
+            results = batch.runBatch(fileNames, 1000, None, useCache=False, workers=2)
+        finally:
+            batch.runImage = originalRunImage
+        self.assertEqual(list(map(lambda result: result["status"], results)), ["terminated", "crash", "terminated"])
+        self.assertIn("BrokenProcessPool", results[1]["error"])
+        self.assertEqual(results[2]["stdout"], "Hello world!")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,99 @@
+import io
+import unittest
+from typing import List
+
+from benchmarks import generatorFunctions as generatorFunctions
+from interpreter import compiler as compiler
+from interpreter import engine as engine
+from interpreter import lexer as lexer
+from interpreter import optimizer as optimizer
+from interpreter import tokenFunctions as runner
+from interpreter import transpiler as transpiler
+from interpreter.compiler import PUSH, POP, NOT, ADD, MULTIPLY, DUPLICATE, DIVIDE, MOD, OUT_C
+from interpreter.cycleFunctions import cycleDetector
+from interpreter.dataStructures import direction, machineState
+from interpreter.streams import ioStreams
+
+
+def runOpcodes(opcodes: List[int], mode: str, streams: ioStreams = None) -> List[int]:
+    """
+    Executes the opcodes once, along the top row of a generated ring
+    :param opcodes: Opcodes to execute, which must not change the direction pointer
+    :param mode: "engine", "blocks" (the engine with optimized blocks) or "transpiled"
+    :param streams: Input and output of the program
+    :return: The data stack after the last opcode
+    """
+    streams = ioStreams("", io.StringIO(), False) if streams is None else streams
+    image = generatorFunctions.makeRing(opcodes, len(opcodes) + 1)
+    if mode == "transpiled":
+        state = machineState(0, 0, (0, 0))
+        transpiler.transpileImage(image)[2](state, len(opcodes), streams)
+        return state.dataStack
+
+    program = compiler.compileGraph(lexer.graphImage(image)[0])
+    if mode == "blocks":
+        program.blocks = optimizer.optimizeProgram(program)
+    state = engine.initialState(program)
+    engine.runProgram(program, state, len(opcodes), streams)
+    return state.dataStack
+
+
+class zeroDivisionTests(unittest.TestCase):
+    modes = ["engine", "blocks", "transpiled"]
+
+    def testDivideByZeroIsIgnored(self):
+        for mode in self.modes:
+            self.assertEqual(runOpcodes([PUSH, PUSH, NOT, DIVIDE], mode), [1, 0], mode)
+        self.assertEqual(runner.divideOperator(direction((0, 0)), [1, 0])[1], [1, 0])
+
+    def testModByZeroIsIgnored(self):
+        for mode in self.modes:
+            self.assertEqual(runOpcodes([PUSH, PUSH, NOT, MOD], mode), [1, 0], mode)
+        self.assertEqual(runner.modOperator(direction((0, 0)), [1, 0])[1], [1, 0])
+
+    def testZeroDividend(self):
+        for mode in self.modes:
+            self.assertEqual(runOpcodes([PUSH, NOT, PUSH, DIVIDE], mode), [0], mode)
+            self.assertEqual(runOpcodes([PUSH, NOT, PUSH, MOD], mode), [0], mode)
+
+    def testDivide(self):
+        for mode in self.modes:
+            self.assertEqual(runOpcodes([PUSH, PUSH, PUSH, ADD, DIVIDE], mode), [0], mode)
+            self.assertEqual(runOpcodes([PUSH, PUSH, ADD, PUSH, DIVIDE], mode), [2], mode)
+
+
+class outCharTests(unittest.TestCase):
+    def testValuesBeyondUnicodeAreNotPrinted(self):
+        # Squaring 2 five times gives 2 ** 32, which is not a character
+        square = [DUPLICATE, MULTIPLY]
+        opcodes = [PUSH, PUSH, ADD] + square * 5 + [OUT_C]
+        for mode in ["engine", "blocks", "transpiled"]:
+            output = io.StringIO()
+            streams = ioStreams("", output, False)
+            self.assertEqual(runOpcodes(opcodes, mode, streams), [2 ** 32], mode)
+            streams.flush()
+            self.assertEqual(output.getvalue(), "", mode)
+        self.assertEqual(runner.outCOperator(direction((0, 0)), [2 ** 32])[1], [2 ** 32])
+
+
+
+class cycleDetectionTests(unittest.TestCase):
+    @staticmethod
+    def runRing(maxSteps: int, cycles: cycleDetector = None):
+        # The first pop has nothing to pop, so the program enters its cycle after the first step
+        program = compiler.compileGraph(lexer.graphImage(generatorFunctions.makeRing([POP, PUSH], 40))[0])
+        program.blocks = optimizer.optimizeProgram(program)
+        state = engine.initialState(program)
+        engine.runProgram(program, state, maxSteps, ioStreams("", io.StringIO(), False), cycles=cycles)
+        return state, optimizer.getRemovedSteps(program)
+
+    def testRemovedStepsMatchRunWithoutDetection(self):
+        detected, removedSteps = self.runRing(100000, cycleDetector())
+        self.assertEqual(detected.cycleEntry, 1)
+        self.assertGreater(removedSteps, 0)
+        # Without detection, the same steps are taken up to where the detecting run stopped
+        self.assertEqual(self.runRing(detected.steps)[1], removedSteps)
+
+
+if __name__ == "__main__":
+    unittest.main()
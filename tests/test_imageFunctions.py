@@ -0,0 +1,53 @@
+import unittest
+
+import numpy as np
+
+from interpreter import colors as colors
+from interpreter import imageFunctions as imageWrapper
+from interpreter.dataStructures import position
+
+
+class labelImageTests(unittest.TestCase):
+    def testRowsAndColumnsGiveReadingOrder(self):
+        # Vertical stripes are labeled along the columns, horizontal stripes along the rows
+        stripes = np.tile(np.array([0, 3], dtype=np.uint8), (5, 3))
+        labels, count = imageWrapper.labelImage(stripes, 19)
+        self.assertEqual(count, 6)
+        self.assertTrue((labels == np.arange(6)).all())
+        labels, count = imageWrapper.labelImage(np.ascontiguousarray(stripes.T), 19)
+        self.assertEqual(count, 6)
+        self.assertTrue((labels == np.arange(6)[:, np.newaxis]).all())
+
+    def testSpiral(self):
+        # A spiral of color 1 on color 0, which joins runs over many passes, with black pixels left out
+        image = np.array([[1, 1, 1, 1, 1, 1],
+                          [0, 0, 0, 0, 0, 1],
+                          [1, 1, 1, 1, 0, 1],
+                          [1, 0, 0, 0, 0, 1],
+                          [1, 0, 19, 19, 0, 1],
+                          [1, 1, 1, 1, 1, 1]], dtype=np.uint8)
+        labels, count = imageWrapper.labelImage(image, 19)
+        self.assertEqual(count, 2)
+        self.assertTrue((labels[image == 1] == 0).all())
+        self.assertTrue((labels[image == 0] == 1).all())
+        self.assertTrue((labels[image == 19] == -1).all())
+        self.assertTrue(labels.flags.c_contiguous)
+
+
+
+class codelOutlineTests(unittest.TestCase):
+    def testHoleIsASeparateLoop(self):
+        # A 5x5 white codel with a black pixel in the middle
+        image = np.full((5, 5), colors.WHITE, dtype=np.uint8)
+        image[2, 2] = colors.BLACK
+        loops = imageWrapper.getCodelOutline(imageWrapper.getCodel(image, position((0, 0))))
+        self.assertEqual(loops, [[(0, 0), (5, 0), (5, 5), (0, 5), (0, 0)], [(2, 2), (2, 3), (3, 3), (3, 2), (2, 2)]])
+
+    def testCodelWithoutHoles(self):
+        image = np.zeros((2, 3), dtype=np.uint8)
+        loops = imageWrapper.getCodelOutline(imageWrapper.getCodel(image, position((1, 1))))
+        self.assertEqual(loops, [[(0, 0), (3, 0), (3, 2), (0, 2), (0, 0)]])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,24 @@
+import unittest
+
+from benchmarks import generatorFunctions as generatorFunctions
+from interpreter import lexer as lexer
+from interpreter.compiler import PUSH, ADD
+
+
+class lazyLexerTests(unittest.TestCase):
+    def testUnknownColorsAreReported(self):
+        image = generatorFunctions.makeRing([PUSH, PUSH, ADD])
+        # A color that is not part of Piet, next to the first codel
+        image[1, 1] = (1, 2, 3)
+        errors = lexer.graphImage(image)[1]
+        lazyErrors = lexer.graphImage(image, True)[1]
+        self.assertGreater(len(errors), 0)
+        self.assertEqual(list(map(str, lazyErrors)), list(map(str, errors)))
+
+    def testValidImageHasNoErrors(self):
+        image = generatorFunctions.makeRing([PUSH, PUSH, ADD])
+        self.assertEqual(lexer.graphImage(image, True)[1], [])
+
+
+if __name__ == "__main__":
+    unittest.main()
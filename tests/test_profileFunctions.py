@@ -0,0 +1,20 @@
+import unittest
+
+import numpy as np
+
+from interpreter import profileFunctions as profiler
+
+
+class heatmapTests(unittest.TestCase):
+    def testPartialCodelsAreCutOff(self):
+        # Codels of 5 pixels in an image of 7 by 12 pixels, of which the last row and column of codels only partly fit
+        image = np.zeros((2, 3), dtype=np.uint8)
+        labels = np.arange(6).reshape(2, 3)
+        heatmap = profiler.makeHeatmap(image, labels, np.arange(6, dtype=np.float64), 5, (7, 12))
+        self.assertEqual(heatmap.shape, (7, 12, 3))
+        self.assertTrue((heatmap[:5, :5] == heatmap[0, 0]).all())
+        self.assertFalse((heatmap[5:, 10:] == heatmap[0, 0]).all())
+
+
+if __name__ == "__main__":
+    unittest.main()
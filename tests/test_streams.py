@@ -0,0 +1,37 @@
+import io
+import unittest
+
+from interpreter.streams import ioStreams
+
+
+class inNumberTests(unittest.TestCase):
+    @staticmethod
+    def makeStreams(text: str) -> ioStreams:
+        return ioStreams(text, io.StringIO(), False)
+
+    def testNumber(self):
+        streams = self.makeStreams("  -12 3")
+        self.assertEqual(streams.inN(), -12)
+        self.assertEqual(streams.inC(), ord(" "))
+        self.assertEqual(streams.inN(), 3)
+        self.assertIsNone(streams.inN())
+
+    def testNonDecimalDigitIsNotANumber(self):
+        # "²" is a digit to isdigit, but int can't read it
+        streams = self.makeStreams("²")
+        self.assertIsNone(streams.inN())
+        self.assertEqual(streams.inC(), ord("²"))
+
+    def testSignWithoutNumberIsLeftForTheNextRead(self):
+        streams = self.makeStreams("-x")
+        self.assertIsNone(streams.inN())
+        self.assertEqual(streams.inC(), ord("-"))
+        self.assertEqual(streams.inC(), ord("x"))
+        streams = self.makeStreams("+")
+        self.assertIsNone(streams.inN())
+        self.assertEqual(streams.inC(), ord("+"))
+        self.assertIsNone(streams.inC())
+
+
+if __name__ == "__main__":
+    unittest.main()